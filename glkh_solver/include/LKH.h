@@ -12,6 +12,7 @@
 #include <float.h>
 #include <limits.h>
 #include <math.h>
+#include <setjmp.h>
 #include <stdlib.h>
 #include <stdio.h>
 #include <string.h>
@@ -189,6 +190,8 @@ int CandidateFiles;     /* Number of CANDIDATE_FILEs */
 int *CostMatrix;        /* Cost matrix */
 int Dimension;  /* Number of nodes in the problem */
 int DimensionSaved;     /* Saved value of Dimension */
+jmp_buf *ErrorJump;     /* If not null, eprintf jumps here instead of 
+                           exiting (used by the shared library) */
 double Excess;  /* Maximum alpha-value allowed for any 
                    candidate edge is set to Excess times the 
                    absolute value of the lower bound of a 
@@ -246,6 +249,8 @@ int PatchingA;  /* Specifies the maximum number of alternating
                    cycles to be used for patching disjunct cycles */
 int PatchingC;  /* Specifies the maximum number of disjoint cycles to be 
                    patched (by one or more alternating cycles) */
+int PostOptimizationThreads; /* Number of threads used for cluster
+                                optimization */
 int Precision;  /* Internal precision in the representation of 
                    transformed distances */
 int PredSucCostAvailable; /* PredCost and SucCost are available */
@@ -257,6 +262,7 @@ short Reversed; /* Boolean used to indicate whether a tour has
 int Run; /* Current run number */
 int Runs;       /* Total number of runs */
 unsigned Seed;  /* Initial seed for random number generation */
+double StartTime;      /* Time when the parameters were read */
 int StopAtOptimum;      /* Specifies whether a run will be terminated if 
                            the tour length becomes equal to Optimum */
 int Subgradient;        /* Specifies whether the Pi-values should be 
@@ -271,6 +277,7 @@ int SubsequentPatching; /* Species whether patching is used for
 SwapRecord *SwapStack;  /* Stack of SwapRecords */
 int Swaps;      /* Number of swaps made during a tentative move */
 double TimeLimit;       /* The time limit in seconds for each run */
+double TotalTimeLimit;  /* The total time limit in seconds */
 int TraceLevel; /* Specifies the level of detail of the output 
                    given during the solution process. 
                    The value 0 signifies a minimum amount of 
@@ -346,8 +353,12 @@ void AllocateStructures(void);
 void eprintf(const char *fmt, ...);
 int fscanint(FILE *f, int *v);
 double GetTime(void);
+double RemainingTime(void);
 void InitializeStatistics(void);
 int IsCandidate(const Node * ta, const Node * tb);
+void LKHFree(void);
+void LKHGetTour(int *Tour);
+int LKHSolve(const char *Parameters, const char *Problem, GainType * Cost);
 void printff(char *fmt, ...);
 void PrintParameters(void);
 void PrintStatistics(void);
@@ -0,0 +1,126 @@
+#include "LKH.h"
+
+GainType SolveGTSP(int *GTour);
+GainType PostOptimize(int *GTour, GainType Cost);
+static void FreeProblem(void);
+
+/*
+ * This file contains the entry points of the GLKH shared library. They have
+ * the same signatures as the ones of the LKH shared library, so that both
+ * libraries can be used interchangeably:
+ *
+ *   n = LKHSolve(Parameters, Problem, &Cost);
+ *   LKHGetTour(GTour);     (GTour must have room for n integers)
+ *   LKHFree();
+ *
+ * GLKH calls LKH through the LKH shared library (see SolveTSP.c). Only the
+ * tours given by INITIAL_TOUR_FILE, INPUT_TOUR_FILE, MERGE_TOUR_FILE and
+ * SUBPROBLEM_TOUR_FILE are passed to LKH through temporary files, which are
+ * written to the TMP directory of the current working directory.
+ */
+
+static int *BestGTour = 0;
+
+/*
+ * The LKHSolve function solves a GTSP instance.
+ *
+ * Parameters
+ *   Parameters: Contents of a parameter file. PROBLEM_FILE is mandatory,
+ *               but it is ignored if Problem is given.
+ *   Problem:    Contents of a problem file in GTSPLIB format, or 0 if the
+ *               problem is to be read from PROBLEM_FILE.
+ *   Cost:       The cost of the best g-tour found.
+ *
+ * The return value is the number of vertices of the g-tour (one per
+ * cluster), or -1 if an error occurred (the error message is printed to
+ * stderr).
+ */
+
+int LKHSolve(const char *Parameters, const char *Problem, GainType * Cost)
+{
+    jmp_buf Jump;
+
+    LKHFree();
+    ParameterFile = ProblemFile = 0;
+    ErrorJump = &Jump;
+    if (setjmp(Jump)) {
+        if (ParameterFile)
+            fclose(ParameterFile);
+        if (ProblemFile)
+            fclose(ProblemFile);
+        ParameterFile = ProblemFile = 0;
+        ErrorJump = 0;
+        return -1;
+    }
+    ParameterFileName = "(memory)";
+    assert(ParameterFile =
+           fmemopen((void *) Parameters, strlen(Parameters), "r"));
+    ReadParameters();
+    if (Problem) {
+        assert(ProblemFile =
+               fmemopen((void *) Problem, strlen(Problem), "r"));
+    }
+    ReadProblem();
+    assert(BestGTour = (int *) malloc((GTSPSets + 1) * sizeof(int)));
+    *Cost = SolveGTSP(BestGTour);
+    *Cost = PostOptimize(BestGTour, *Cost);
+    ErrorJump = 0;
+    return GTSPSets;
+}
+
+/*
+ * The LKHGetTour function copies the best g-tour found by the last call of
+ * LKHSolve into GTour (starting at index 0).
+ */
+
+void LKHGetTour(int *GTour)
+{
+    if (BestGTour)
+        memcpy(GTour, BestGTour + 1, GTSPSets * sizeof(int));
+}
+
+/*
+ * The LKHFree function frees the structures allocated by LKHSolve.
+ */
+
+void LKHFree()
+{
+    free(BestGTour);
+    BestGTour = 0;
+    FreeProblem();
+}
+
+/*
+ * The FreeProblem function frees the structures allocated by ReadProblem.
+ */
+
+#define Free(s) { free(s); s = 0; }
+
+static void FreeProblem()
+{
+    Cluster *Cl, *Next;
+    int i;
+
+    for (Cl = FirstCluster; Cl; Cl = Next) {
+        Next = Cl->Next;
+        free(Cl);
+    }
+    FirstCluster = LastCluster = 0;
+    if (NodeSet) {
+        for (i = 1; i <= Dimension; i++) {
+            Free(NodeSet[i].MergeSuc);
+            Free(NodeSet[i].CandidateSet);
+        }
+        Free(NodeSet);
+    }
+    Free(CostMatrix);
+    Free(Name);
+    Free(Type);
+    Free(EdgeWeightType);
+    Free(EdgeWeightFormat);
+    Free(EdgeDataFormat);
+    Free(NodeCoordType);
+    Free(DisplayDataType);
+    FirstNode = 0;
+    GTSPSets = 0;
+}
@@ -1,8 +1,9 @@
 #include "LKH.h"
+#include <pthread.h>
 #include <unistd.h>
 
-GainType SolveTSP(int Dimension, char *ParFileName,
-                  char *TourFileName, int *Tour, GainType Optimum,
+GainType SolveTSP(int Dimension, char *Parameters, char *Problem,
+                  size_t ProblemSize, int *Tour, GainType Optimum,
                   GainType Displacement);
 
 static GainType KOptimize(int *GTour);
@@ -38,7 +39,7 @@ GainType PostOptimize(int *GTour, GainType Cost)
     if (TraceLevel > 0)
         printff("Post-optimization [Cost = " GainFormat "]\n", Cost);
 
-    while (1) {
+    while (GetTime() - StartTime < TotalTimeLimit) {
         /* Perform K-opt optimization */
         if (Clusters >= 4)
             Cost = KOptimize(GTour);
@@ -85,14 +86,12 @@ static GainType KOptimize(int *GTour)
     int i, j, Clusters = GTSPSets;
     Node *N;
     FILE *ParFile, *ProblemFile;
-    char ParFileName[256], ProblemFileName[256], TourFileName[256],
-        Prefix[256];
+    char *Parameters = 0, *Problem = 0;
+    size_t ParametersSize, ProblemSize;
     GainType Cost;
 
-    /* Create the problem file */
-    sprintf(Prefix, "%s.pid%d", Name, getpid());
-    sprintf(ProblemFileName, "TMP/%s.post.tsp", Prefix);
-    assert(ProblemFile = fopen(ProblemFileName, "w"));
+    /* Create the problem */
+    assert(ProblemFile = open_memstream(&Problem, &ProblemSize));
     fprintf(ProblemFile, "NAME : %s\n", Name);
     fprintf(ProblemFile, "TYPE : %s\n", Type);
     fprintf(ProblemFile, "DIMENSION : %d\n", Clusters);
@@ -125,10 +124,9 @@ static GainType KOptimize(int *GTour)
     fprintf(ProblemFile, "EOF\n");
     fclose(ProblemFile);
 
-    /* Create the parameter file */
-    sprintf(ParFileName, "TMP/%s.post.par", Prefix);
-    assert(ParFile = fopen(ParFileName, "w"));
-    fprintf(ParFile, "PROBLEM_FILE = %s\n", ProblemFileName);
+    /* Create the parameters */
+    assert(ParFile = open_memstream(&Parameters, &ParametersSize));
+    fprintf(ParFile, "PROBLEM_FILE = %s.post.tsp\n", Name);
     fprintf(ParFile, "MAX_TRIALS = %d\n", MaxTrials);
     fprintf(ParFile, "OPTIMUM = " GainFormat "\n", BestCost);
     fprintf(ParFile, "PRECISION = %d\n", Precision);
@@ -136,18 +134,81 @@ static GainType KOptimize(int *GTour)
     fprintf(ParFile, "SEED = %d\n", Seed);
     if (!Subgradient)
         fprintf(ParFile, "SUBGRADIENT = NO\n");
-    sprintf(TourFileName, "TMP/%s.post.tour", Prefix);
-    fprintf(ParFile, "TOUR_FILE = %s\n", TourFileName);
+    if (TotalTimeLimit != DBL_MAX)
+        fprintf(ParFile, "TOTAL_TIME_LIMIT = %0.1f\n",
+                RemainingTime());
+    fprintf(ParFile, "TRACE_LEVEL = %d\n", TraceLevel);
     fclose(ParFile);
 
     /* Solve the problem */
-    Cost =
-        SolveTSP(Clusters, ParFileName, TourFileName, GTour, BestCost, 0);
-    unlink(ParFileName);
-    unlink(ProblemFileName);
+    Cost = SolveTSP(Clusters, Parameters, Problem, ProblemSize, GTour,
+                    BestCost, 0);
+    free(Parameters);
+    free(Problem);
     return Cost;
 }
 
+/*
+ * A ClusterJob describes the work of one thread of cluster optimization:
+ * the shortest paths starting at the vertices Start[Index], 
+ * Start[Index + Step], ... of the first cluster. Every thread has its own 
+ * Cost and Dad tables (indexed by node number), and keeps its best g-tour
+ * in GTour.
+ */
+
+typedef struct ClusterJob {
+    Node **First, **Start;
+    int Index, Step, Starts, Best, Joinable;
+    GainType *Cost, BestCost;
+    int *Dad, *GTour;
+} ClusterJob;
+
+static void *ClusterOptimizeJob(void *Arg)
+{
+    ClusterJob *Job = (ClusterJob *) Arg;
+    Node **First = Job->First, *FirstNode, *From, *To;
+    GainType *Cost = Job->Cost, d;
+    int *Dad = Job->Dad, i, j, s, Clusters = GTSPSets;
+
+    for (s = Job->Index; s < Job->Starts; s += Job->Step) {
+        FirstNode = Job->Start[s];
+        Dad[FirstNode->Id] = 0;
+        To = First[1];
+        do {
+            Cost[To->Id] = ProblemType != ATSP ? Distance(FirstNode, To)
+                : FirstNode->C[To->Id];
+            Dad[To->Id] = FirstNode->Id;
+        } while ((To = To->Next) != First[1]);
+        for (i = 2; i < Clusters; i++) {
+            To = First[i];
+            do {
+                Cost[To->Id] = PLUS_INFINITY;
+                From = First[i - 1];
+                do {
+                    if ((d = Cost[From->Id] +
+                         (ProblemType != ATSP ? Distance(From, To) :
+                          From->C[To->Id])) < Cost[To->Id]) {
+                        Dad[To->Id] = From->Id;
+                        Cost[To->Id] = d;
+                    }
+                } while ((From = From->Next) != First[i - 1]);
+            } while ((To = To->Next) != First[i]);
+        }
+        From = First[Clusters - 1];
+        do {
+            if ((d = Cost[From->Id] +
+                 (ProblemType != ATSP ? Distance(From, FirstNode) :
+                  From->C[FirstNode->Id])) < Job->BestCost) {
+                Job->BestCost = d;
+                Job->Best = s;
+                for (i = Clusters, j = From->Id; j; j = Dad[j])
+                    Job->GTour[i--] = j;
+            }
+        } while ((From = From->Next) != First[Clusters - 1]);
+    }
+    return 0;
+}
+
 /*
  * The ClusterOptimize function attempts to improve a given g-tour, GTour, 
  * using cluster optimization (shortest path in a layered network).
@@ -155,15 +216,22 @@ static GainType KOptimize(int *GTour)
  * generalized traveling salesman problem.
  * Operations Research, 45:378-394, 1997.
  *
+ * A shortest path is computed for every vertex of the smallest cluster. 
+ * These computations are independent, so they are divided among 
+ * POST_OPTIMIZATION_THREADS threads. The resulting g-tour is the same 
+ * for any number of threads.
+ *
  * The return value is the cost of the resulting g-tour.
  */
 
 static GainType ClusterOptimize(int *GTour)
 {
-    int i, j = 1, d, MinSize, MinV, Clusters = GTSPSets;
+    int i, j = 1, MinSize, MinV, Starts, Threads, Clusters = GTSPSets;
     Cluster *Cl;
-    Node **First, *From, *To;
-    GainType Cost = PLUS_INFINITY;
+    Node **First, **Start, *From;
+    ClusterJob *Jobs, *Best;
+    pthread_t *Thread;
+    GainType Cost;
 
     MinSize = MinV = INT_MAX;
     for (Cl = FirstCluster; Cl && MinSize != 1; Cl = Cl->Next) {
@@ -185,42 +253,67 @@ static GainType ClusterOptimize(int *GTour)
         if (++j > Clusters)
             j = 1;
     }
+    assert(Start = (Node **) malloc(MinSize * sizeof(Node *)));
+    Starts = 0;
+    From = First[0];
+    do
+        Start[Starts++] = From;
+    while ((From = From->Next) != First[0]);
+
+    Threads = PostOptimizationThreads;
+    if (Threads == 0)
+        Threads = (int) sysconf(_SC_NPROCESSORS_ONLN);
+    if (Threads > Starts)
+        Threads = Starts;
+    if (Threads < 1)
+        Threads = 1;
+    assert(Jobs = (ClusterJob *) malloc(Threads * sizeof(ClusterJob)));
+    assert(Thread = (pthread_t *) malloc(Threads * sizeof(pthread_t)));
+    for (i = 0; i < Threads; i++) {
+        Jobs[i].First = First;
+        Jobs[i].Start = Start;
+        Jobs[i].Index = i;
+        Jobs[i].Step = Threads;
+        Jobs[i].Starts = Starts;
+        Jobs[i].Best = Starts;
+        Jobs[i].Joinable = 0;
+        Jobs[i].BestCost = PLUS_INFINITY;
+        assert(Jobs[i].Cost =
+               (GainType *) malloc((Dimension + 1) * sizeof(GainType)));
+        assert(Jobs[i].Dad = (int *) malloc((Dimension + 1) * sizeof(int)));
+        assert(Jobs[i].GTour =
+               (int *) malloc((Clusters + 1) * sizeof(int)));
+    }
+    /* The calling thread takes the first job, and the jobs whose thread
+       could not be created */
+    for (i = 1; i < Threads; i++)
+        Jobs[i].Joinable =
+            !pthread_create(&Thread[i], 0, ClusterOptimizeJob, &Jobs[i]);
+    ClusterOptimizeJob(&Jobs[0]);
+    /* Ties are broken as in a sequential run: by the first start vertex */
+    Best = &Jobs[0];
+    for (i = 0; i < Threads; i++) {
+        if (Jobs[i].Joinable)
+            pthread_join(Thread[i], 0);
+        else if (i > 0)
+            ClusterOptimizeJob(&Jobs[i]);
+        if (Jobs[i].BestCost < Best->BestCost ||
+            (Jobs[i].BestCost == Best->BestCost &&
+             Jobs[i].Best < Best->Best))
+            Best = &Jobs[i];
+    }
+    Cost = Best->BestCost;
+    if (Cost != PLUS_INFINITY)
+        memcpy(GTour + 1, Best->GTour + 1, Clusters * sizeof(int));
+    for (i = 0; i < Threads; i++) {
+        free(Jobs[i].Cost);
+        free(Jobs[i].Dad);
+        free(Jobs[i].GTour);
+    }
+    free(Jobs);
+    free(Thread);
+    free(Start);
     FirstNode = First[0];
-    do {
-        FirstNode->Cost = 0;
-        FirstNode->Dad = 0;
-        To = First[1];
-        do {
-            To->Cost = ProblemType != ATSP ? Distance(FirstNode, To)
-                : FirstNode->C[To->Id];
-            To->Dad = FirstNode;
-        } while ((To = To->Next) != First[1]);
-        for (i = 2; i < Clusters; i++) {
-            To = First[i];
-            do {
-                To->Cost = INT_MAX;
-                From = First[i - 1];
-                do {
-                    if ((d = From->Cost +
-                         (ProblemType != ATSP ? Distance(From, To) :
-                          From->C[To->Id])) < To->Cost) {
-                        To->Dad = From;
-                        To->Cost = d;
-                    }
-                } while ((From = From->Next) != First[i - 1]);
-            } while ((To = To->Next) != First[i]);
-        }
-        From = First[Clusters - 1];
-        do {
-            if ((d = From->Cost +
-                 (ProblemType != ATSP ? Distance(From, FirstNode) :
-                  From->C[FirstNode->Id])) < Cost) {
-                Cost = d;
-                for (i = Clusters, To = From; To; To = To->Dad)
-                    GTour[i--] = To->Id;
-            }
-        } while ((From = From->Next) != First[Clusters - 1]);
-    } while ((FirstNode = FirstNode->Next) != First[0]);
     free(First);
     GTour[0] = GTour[Clusters];
     return Cost;
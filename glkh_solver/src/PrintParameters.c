@@ -97,6 +97,7 @@ void PrintParameters()
     if (MaxPopulationSize == 0)
         printff("# ");
     printff("POPULATION_SIZE = %d\n", MaxPopulationSize);
+    printff("POST_OPTIMIZATION_THREADS = %d\n", PostOptimizationThreads);
     printff("PRECISION = %d\n", Precision);
     printff("%sPROBLEM_FILE = %s\n",
             ProblemFileName ? "" : "# ",
@@ -130,6 +131,10 @@ void PrintParameters()
         printff("# TIME_LIMIT =\n");
     else
         printff("TIME_LIMIT = %0.1f\n", TimeLimit);
+    if (TotalTimeLimit == DBL_MAX)
+        printff("# TOTAL_TIME_LIMIT =\n");
+    else
+        printff("TOTAL_TIME_LIMIT = %0.1f\n", TotalTimeLimit);
     printff("%sTOUR_FILE = %s\n",
             TourFileName ? "" : "# ", TourFileName ? TourFileName : "");
     printff("TRACE_LEVEL = %d\n\n", TraceLevel);
@@ -224,6 +224,13 @@
  * Specifies the maximum size of the population in the genetic algorithm.
  * Default: 0.
  *
+ * POST_OPTIMIZATION_THREADS = <integer>
+ * The number of threads used for cluster optimization during post
+ * optimization. The shortest paths starting at the vertices of the
+ * smallest cluster are divided among the threads. The value 0 signifies
+ * that one thread per online processor is used.
+ * Default: 0.
+ *
  * PRECISION = <integer>
  * The internal precision in the representation of transformed distances: 
  *    d[i][j] = PRECISION*c[i][j] + pi[i] + pi[j], 
@@ -301,6 +308,11 @@
  * Specifies a time limit in seconds for each run.
  * Default: value of DBL_MAX. 
  *
+ * TOTAL_TIME_LIMIT = <real>
+ * Specifies a total time limit in seconds, counted from the moment the
+ * parameters are read. No trial (or run) is started once it is exceeded.
+ * Default: value of DBL_MAX.
+ *
  * TOUR_FILE = <string>
  * Specifies the name of a file where the best tour is to be written.
  * When a run has produced a new best tour, the tour is written to 
@@ -356,8 +368,10 @@ void ReadParameters()
     char *Line, *Keyword, *Token, *Name;
     unsigned int i;
 
+    StartTime = GetTime();
     ProblemFileName = PiFileName = InputTourFileName =
-        OutputTourFileName = TourFileName = 0;
+        OutputTourFileName = TourFileName = InitialTourFileName =
+        SubproblemTourFileName = 0;
     CandidateFiles = MergeTourFiles = 0;
     AscentCandidates = 50;
     BackboneTrials = 0;
@@ -396,6 +410,7 @@ void ReadParameters()
     PatchingARestricted = 0;
     PatchingCExtended = 0;
     PatchingCRestricted = 0;
+    PostOptimizationThreads = 0;
     Precision = 100;
     RestrictedSearch = 1;
     RohePartitioning = 0;
@@ -410,9 +425,12 @@ void ReadParameters()
     SubsequentMoveType = 0;
     SubsequentPatching = 1;
     TimeLimit = DBL_MAX;
+    TotalTimeLimit = DBL_MAX;
     TraceLevel = 1;
 
-    if (ParameterFileName) {
+    if (ParameterFile) {
+        /* Stream opened by the caller, e.g. the LKHSolve function */
+    } else if (ParameterFileName) {
         if (!(ParameterFile = fopen(ParameterFileName, "r")))
             eprintf("Cannot open PARAMETER_FILE: \"%s\"",
                     ParameterFileName);
@@ -720,6 +738,12 @@ void ReadParameters()
             if (!(Token = strtok(0, Delimiters)) ||
                 !sscanf(Token, "%d", &MaxPopulationSize))
                 eprintf("POPULATION_SIZE: integer expected");
+        } else if (!strcmp(Keyword, "POST_OPTIMIZATION_THREADS")) {
+            if (!(Token = strtok(0, Delimiters)) ||
+                !sscanf(Token, "%d", &PostOptimizationThreads))
+                eprintf("POST_OPTIMIZATION_THREADS: integer expected");
+            if (PostOptimizationThreads < 0)
+                eprintf("POST_OPTIMIZATION_THREADS: >= 0 expected");
         } else if (!strcmp(Keyword, "PRECISION")) {
             if (!(Token = strtok(0, Delimiters)) ||
                 !sscanf(Token, "%d", &Precision))
@@ -810,6 +834,12 @@ void ReadParameters()
                 eprintf("TIME_LIMIT: real expected");
             if (TimeLimit < 0)
                 eprintf("TIME_LIMIT: >= 0 expected");
+        } else if (!strcmp(Keyword, "TOTAL_TIME_LIMIT")) {
+            if (!(Token = strtok(0, Delimiters)) ||
+                !sscanf(Token, "%lf", &TotalTimeLimit))
+                eprintf("TOTAL_TIME_LIMIT: real expected");
+            if (TotalTimeLimit < 0)
+                eprintf("TOTAL_TIME_LIMIT: >= 0 expected");
         } else if (!strcmp(Keyword, "TOUR_FILE")) {
             if (!(TourFileName = GetFileName(0)))
                 eprintf("TOUR_FILE: string expected");
@@ -829,6 +859,7 @@ void ReadParameters()
     if (SubproblemSize > 0 && SubproblemTourFileName == 0)
         eprintf("SUBPROBLEM_TOUR_FILE specification is missing");
     fclose(ParameterFile);
+    ParameterFile = 0;
     free(LastLine);
     LastLine = 0;
 }
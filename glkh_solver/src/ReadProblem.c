@@ -2,7 +2,9 @@
 
 /*      
  * The ReadProblem function reads the problem data in TSPLIB format from the 
- * file specified in the parameter file (PROBLEM_FILE).
+ * file specified in the parameter file (PROBLEM_FILE). If ProblemFile has 
+ * already been opened by the caller (e.g. the LKHSolve function), the data 
+ * are read from that stream instead.
  *
  * The following description of the file format is extracted from the TSPLIB 
  * documentation.  
@@ -232,7 +234,7 @@ void ReadProblem()
     int i, K;
     char *Line, *Keyword;
 
-    if (!(ProblemFile = fopen(ProblemFileName, "r")))
+    if (!ProblemFile && !(ProblemFile = fopen(ProblemFileName, "r")))
         eprintf("Cannot open PROBLEM_FILE: \"%s\"", ProblemFileName);
     if (TraceLevel >= 1)
         printff("Reading PROBLEM_FILE: \"%s\" ... ", ProblemFileName);
@@ -384,6 +386,7 @@ void ReadProblem()
         printff("PROBLEM_FILE = %s\n",
                 ProblemFileName ? ProblemFileName : "");
     fclose(ProblemFile);
+    ProblemFile = 0;
     if (InitialTourFileName)
         ReadTour(InitialTourFileName, &InitialTourFile);
     if (InputTourFileName)
@@ -3,8 +3,8 @@
 #include <sys/time.h>
 #include <sys/resource.h>
 
-GainType SolveTSP(int Dimension, char *ParFileName,
-                  char *TourFileName, int *Tour, GainType Optimum,
+GainType SolveTSP(int Dimension, char *Parameters, char *Problem,
+                  size_t ProblemSize, int *Tour, GainType Optimum,
                   GainType Deduction);
 
 enum TourType { INITIAL, INPUT, MERGE, SUBPROBLEM };
@@ -18,21 +18,28 @@ static void WriteFullTour(enum TourType Type, int Dimension,
  *
  * The algorithm is as follows:
  *. 1. Transform the E-GTSP instance into an asymmetric TSP instance.
- *  2. Write the TSP instance to a problem file.
- *  3. Write suitable parameter values to a parameter file.
- *  4. Execute LKH given these two files (by calling solveTSP).
+ *     If the distances are given by a function of the node coordinates,
+ *     only the coordinates and the clusters are written (GTSP_SET_SECTION),
+ *     and LKH computes the transformed costs when they are needed. 
+ *     Otherwise, the full cost matrix is written as raw integers
+ *     (EDGE_WEIGHT_BINARY_SECTION), which LKH uses without parsing it.
+ *  2. Write the TSP instance to a problem buffer in memory.
+ *  3. Write suitable parameter values to a parameter buffer.
+ *  4. Execute LKH in-process given these two buffers (by calling
+ *     SolveTSP).
  *  5. Extract the g-tour from the TSP solution tour by picking the 
  *     first vertex from each cluster in the TSP tour.
  */
 
 GainType SolveGTSP(int *GTour)
 {
-    int i, j, Dist, Clusters = 0;
+    int i, j, Dist, Clusters = 0, Lazy, *Row = 0;
     Cluster *Cl;
     Node *From, *To;
     FILE *ParFile, *ProblemFile;
-    char ParFileName[256], ProblemFileName[256], TourFileName[256],
-        NewInitialTourFileName[256] = { 0 }, 
+    char *Parameters = 0, *Problem = 0;
+    size_t ParametersSize, ProblemSize;
+    char NewInitialTourFileName[256] = { 0 }, 
         NewInputTourFileName[256] = { 0 }, 
         NewSubproblemTourFileName[256] = { 0 },
         **NewMergeTourFileName, 
@@ -53,36 +60,98 @@ GainType SolveGTSP(int *GTour)
     }
     assert(Clusters == GTSPSets);
 
+    Lazy = ProblemType != ATSP && WeightType != EXPLICIT &&
+        CoordType != NO_COORDS;
+    if (Lazy && Clusters >= 2) {
+        /* Estimate the largest distance by the distance between the
+           corners of the bounding box. LKH stops if a distance exceeds
+           the M-value of the transformation */
+        Node Low, High;
+        memset(&Low, 0, sizeof(Node));
+        memset(&High, 0, sizeof(Node));
+        Low.X = Low.Y = Low.Z = DBL_MAX;
+        High.X = High.Y = High.Z = -DBL_MAX;
+        for (i = 1; i <= Dimension; i++) {
+            From = &NodeSet[i];
+            if (From->X < Low.X)
+                Low.X = From->X;
+            if (From->Y < Low.Y)
+                Low.Y = From->Y;
+            if (From->Z < Low.Z)
+                Low.Z = From->Z;
+            if (From->X > High.X)
+                High.X = From->X;
+            if (From->Y > High.Y)
+                High.Y = From->Y;
+            if (From->Z > High.Z)
+                High.Z = From->Z;
+        }
+        Dist = Distance(&Low, &High);
+        while (Dist > INT_MAX / 4 / Precision && Precision > 1) {
+            printff("*** PRECISION (= %d) is too large. ", Precision);
+            if ((Precision /= 10) < 1)
+                Precision = 1;
+            printff("Changed to %d.\n", Precision);
+        }
+    }
+
     M = Clusters < 2 ? 0 : INT_MAX / 4 / Precision;
 
     sprintf(Prefix, "%s.pid%d", Name, getpid());
 
-    /* Create the problem file */
-    sprintf(ProblemFileName, "TMP/%s.atsp", Prefix);
-    assert(ProblemFile = fopen(ProblemFileName, "w"));
+    /* Create the problem */
+    assert(ProblemFile = open_memstream(&Problem, &ProblemSize));
     fprintf(ProblemFile, "NAME : %s.gtsp\n", Prefix);
     fprintf(ProblemFile, "TYPE : ATSP\n");
     if (ProblemType != ATSP)
         fprintf(ProblemFile, "DIMENSION : %d\n", Dimension);
     else
         fprintf(ProblemFile, "DIMENSION : %d\n", DimensionSaved);
-    fprintf(ProblemFile, "EDGE_WEIGHT_TYPE : EXPLICIT\n");
-    fprintf(ProblemFile, "EDGE_WEIGHT_FORMAT : FULL_MATRIX\n");
-    fprintf(ProblemFile, "EDGE_WEIGHT_SECTION\n");
+    if (Lazy) {
+        fprintf(ProblemFile, "EDGE_WEIGHT_TYPE : %s\n", EdgeWeightType);
+        fprintf(ProblemFile, "GTSP_SETS : %d\n", Clusters);
+        fprintf(ProblemFile, "NODE_COORD_SECTION\n");
+        for (i = 1; i <= Dimension; i++) {
+            From = &NodeSet[i];
+            if (CoordType == THREED_COORDS)
+                fprintf(ProblemFile, "%d %0.17g %0.17g %0.17g\n", i,
+                        From->X, From->Y, From->Z);
+            else
+                fprintf(ProblemFile, "%d %0.17g %0.17g\n", i,
+                        From->X, From->Y);
+        }
+        /* The clusters are written in the order of their Next lists */
+        fprintf(ProblemFile, "GTSP_SET_SECTION\n");
+        for (Cl = FirstCluster; Cl; Cl = Cl->Next) {
+            From = Cl->First;
+            fprintf(ProblemFile, "%d", From->V);
+            do
+                fprintf(ProblemFile, " %d", From->Id);
+            while ((From = From->Next) != Cl->First);
+            fprintf(ProblemFile, " -1\n");
+        }
+    } else {
+        fprintf(ProblemFile, "EDGE_WEIGHT_TYPE : EXPLICIT\n");
+        fprintf(ProblemFile, "EDGE_WEIGHT_FORMAT : FULL_MATRIX\n");
+        /* Pad the keyword line so that the matrix is 8-byte aligned */
+        fprintf(ProblemFile, "EDGE_WEIGHT_BINARY_SECTION%*s\n",
+                (int) ((-(ftell(ProblemFile) + 28)) & 7) + 1, "");
+        assert(Row = (int *) malloc(DimensionSaved * sizeof(int)));
+    }
 
     /* Transform the GTSP into an ATSP */
-    for (i = 1; i <= DimensionSaved; i++) {
+    for (i = 1; i <= DimensionSaved && !Lazy; i++) {
         From = &NodeSet[i];
         for (j = 1; j <= DimensionSaved; j++) {
             if (i == j)
-                fprintf(ProblemFile, "999999 ");
+                Row[j - 1] = 999999;
             else {
                 To = &NodeSet[j];
                 Dist = To == From->Next ? (GainType) 0 :
                     To->V == From->V ? 2 * M :
                     (ProblemType != ATSP ? Distance(From->Next, To) :
                      From->Next->C[j]) + M;
-                fprintf(ProblemFile, "%d ", Dist);
+                Row[j - 1] = Dist;
                 while (Dist * Precision / Precision != Dist) {
                     printff("*** PRECISION (= %d) is too large. ",
                             Precision);
@@ -92,15 +161,18 @@ GainType SolveGTSP(int *GTour)
                 }
             }
         }
+        fwrite(Row, sizeof(int), DimensionSaved, ProblemFile);
+    }
+    if (!Lazy) {
         fprintf(ProblemFile, "\n");
+        free(Row);
     }
     fprintf(ProblemFile, "EOF\n");
     fclose(ProblemFile);
 
-    /* Create the parameter file */
-    sprintf(ParFileName, "TMP/%s.par", Prefix);
-    assert(ParFile = fopen(ParFileName, "w"));
-    fprintf(ParFile, "PROBLEM_FILE = TMP/%s.atsp\n", Prefix);
+    /* Create the parameters */
+    assert(ParFile = open_memstream(&Parameters, &ParametersSize));
+    fprintf(ParFile, "PROBLEM_FILE = %s.atsp\n", Prefix);
     fprintf(ParFile, "ASCENT_CANDIDATES = %d\n", AscentCandidates);
     fprintf(ParFile, "BACKBONE_TRIALS = %d\n", BackboneTrials);
     if (Backtracking)
@@ -186,19 +258,19 @@ GainType SolveGTSP(int *GTour)
         fprintf(ParFile, "SUBSEQUENT_PATCHING = NO\n");
     if (TimeLimit != DBL_MAX)
         fprintf(ParFile, "TIME_LIMIT = %0.1f\n", TimeLimit);
-    sprintf(TourFileName, "TMP/%s.tour", Prefix);
-    fprintf(ParFile, "TOUR_FILE = %s\n", TourFileName);
-    fprintf(ParFile, "TRACE_LEVEL = %d\n",
-            TraceLevel == 0 ? 1 : TraceLevel);
+    if (TotalTimeLimit != DBL_MAX)
+        fprintf(ParFile, "TOTAL_TIME_LIMIT = %0.1f\n",
+                RemainingTime());
+    fprintf(ParFile, "TRACE_LEVEL = %d\n", TraceLevel);
     fclose(ParFile);
 
     /* Solve the ATSP */
     assert(Tour = (int *) malloc((DimensionSaved + 1) * sizeof(int)));
     Cost =
-        SolveTSP(DimensionSaved, ParFileName, TourFileName,
-                 Tour, Optimum, Clusters * M);
-    unlink(ParFileName);
-    unlink(ProblemFileName);
+        SolveTSP(DimensionSaved, Parameters, Problem, ProblemSize, Tour,
+                 Optimum, Clusters * M);
+    free(Parameters);
+    free(Problem);
     unlink(NewInitialTourFileName);
     unlink(NewInputTourFileName);
     for (i = 0; i < MergeTourFiles; i++)
@@ -1,13 +1,27 @@
+#ifndef _GNU_SOURCE
+#define _GNU_SOURCE
+#endif
 #include "LKH.h"
+#include <dlfcn.h>
+#include <fcntl.h>
 #include <unistd.h>
 
 /*
- * The SolveTSP function solves a TSP instancei using LKH.
+ * The SolveTSP function solves a TSP instance using LKH.
+ *
+ * LKH is called in-process through its shared library (liblkh.so), so
+ * neither a new process is spawned nor the instance and the tour are passed
+ * through files. The library is loaded with RTLD_DEEPBIND because LKH and
+ * GLKH define global variables (and library entry points) with the same
+ * names. The deep binding makes LKH use its own definitions instead of the
+ * ones of GLKH.
  *
  * Parameters
  *   Dimension:    The number of nodes in the instance.
- *   ParFileName:  Name of the paramter file.
- *   TourFileName: Name of a temporary tour file.
+ *   Parameters:   Contents of the parameter file.
+ *   Problem:      Contents of the problem file.
+ *   ProblemSize:  The size of the contents of the problem file (which may
+ *                 contain binary sections).
  *   Tour:         The solution tour.
  *   Optimum:      A known optimum.
  *   Deduction:    Value to be subtracted from the tour cost found by LKH.
@@ -15,86 +29,98 @@
  * The return value is the cost of the solution tour.
  */
 
-GainType SolveTSP(int Dimension, char *ParFileName,
-                  char *TourFileName, int *Tour, GainType Optimum,
-                  GainType Deduction)
+typedef int (*LKHSolveFunction) (const char *, const char *, size_t,
+                                 GainType *);
+typedef void (*LKHTourFunction) (int *);
+typedef void (*LKHFreeFunction) (void);
+
+static void *Library = 0;
+static LKHSolveFunction LKHSolveTSP;
+static LKHTourFunction LKHGetTSPTour;
+static LKHFreeFunction LKHFreeTSP;
+static int *LKHRun, *LKHRuns;
+
+static void LoadLibrary(void);
+
+GainType SolveTSP(int Dimension, char *Parameters, char *Problem,
+                  size_t ProblemSize, int *Tour, GainType Optimum, GainType Deduction)
 {
     GainType Cost;
-    FILE *p, *TourFile;
-    int i;
-    char Command[256], Key[256], Buffer[256], *Line, *Keyword;
-    char Delimiters[] = " :=\n\t\r\f\v\xef\xbb\xbf";
+    double StartTime = GetTime();
+    int i, n, Stdout = -1, Null;
 
-    sprintf(Command, "rosrun lkh_solver lkh_solver %s", ParFileName);
-    assert(p = popen(Command, "r"));
-    Cost = PLUS_INFINITY;
-    while (fgets(Buffer, sizeof(Buffer), p)) {
-        if (TraceLevel > 1)
-            printff("%s", Buffer);
-        if (sscanf(Buffer, "%s", Key) > 0) {
-            GainType LocalCost;
-            int LocalTrial;
-            double LocalTime;
-            if (!strcmp(Key, "Cost.min")) {
-                char *cp = strchr(Buffer + strlen(Key), '=');
-                sscanf(cp + 1, GainInputFormat, &Cost);
-                Cost -= Deduction;
-            } else if (TraceLevel > 0 && Dimension != GTSPSets) {
-                if (!strcmp(Key, "Run")) {
-                    char *cp = Buffer + strlen(Key);
-                    sscanf(cp + 1, "%d", &Run);
-                    sscanf(cp + 1, "%d", &LocalTrial);
-                    cp = strchr(cp + 1, '=');
-                    sscanf(cp + 1, GainInputFormat, &LocalCost);
-                    LocalCost -= Deduction;
-                    cp = strchr(cp + 1, 'T');
-                    cp = strchr(cp + 1, '=');
-                    sscanf(cp + 1, "%lf", &LocalTime);
-                    printff("Run %d: Cost = " GainFormat ", ",
-                            Run, LocalCost);
-                    if (Optimum != MINUS_INFINITY && Optimum != 0)
-                        printf("Gap = %0.4f%%, ",
-                               100.0 * (LocalCost - Optimum) / Optimum);
-                    printff("Time = %0.2f sec.\n\n", LocalTime);
-                } else if (!strcmp(Key, "*")) {
-                    char *cp = Buffer + strlen(Key);
-                    if (sscanf(cp + 1, "%d", &LocalTrial) > 0) {
-                        cp = strchr(cp + 1, '=');
-                        sscanf(cp + 1, GainInputFormat, &LocalCost);
-                        LocalCost -= Deduction;
-                        cp = strchr(cp + 1, 'T');
-                        cp = strchr(cp + 1, '=');
-                        sscanf(cp + 1, "%lf", &LocalTime);
-                        printff("# %d: Cost = " GainFormat ", ",
-                                LocalTrial, LocalCost);
-                        if (Optimum != MINUS_INFINITY && Optimum != 0)
-                            printf("Gap = %0.4f%%, ",
-                                   100.0 * (LocalCost - Optimum) / Optimum);
-                        printff("Time = %0.2f sec.\n", LocalTime);
-                    }
-                }
-            } else if (!strcmp(Key, "Run")) {
-                char *cp = Buffer + strlen(Key);
-                sscanf(cp + 1, "%d", &Run);
-            }
+    LoadLibrary();
+    if (TraceLevel <= 1) {
+        /* Discard the output of LKH (the statistics are always printed) */
+        fflush(stdout);
+        if ((Null = open("/dev/null", O_WRONLY)) >= 0) {
+            Stdout = dup(STDOUT_FILENO);
+            dup2(Null, STDOUT_FILENO);
+            close(Null);
         }
     }
-    pclose(p);
-    TourFile = fopen(TourFileName, "r");
-    if (!TourFile)
-        return PLUS_INFINITY;
-    while ((Line = ReadLine(TourFile))) {
-        if (!(Keyword = strtok(Line, Delimiters)))
-            continue;
-        for (i = 0; i < strlen(Keyword); i++)
-            Keyword[i] = (char) toupper(Keyword[i]);
-        if (!strcmp(Keyword, "TOUR_SECTION"))
-            break;
+    n = LKHSolveTSP(Parameters, Problem, ProblemSize, &Cost);
+    if (n == Dimension) {
+        LKHGetTSPTour(Tour + 1);
+        Tour[0] = Tour[Dimension];
+    }
+    /* The number of the last run performed by LKH */
+    Run = *LKHRun > *LKHRuns ? *LKHRuns : *LKHRun;
+    LKHFreeTSP();
+    if (Stdout >= 0) {
+        fflush(stdout);
+        dup2(Stdout, STDOUT_FILENO);
+        close(Stdout);
+    }
+    if (n != Dimension)
+        eprintf("LKH failed to solve the TSP instance");
+    Cost -= Deduction;
+    if (TraceLevel == 1 && Dimension != GTSPSets) {
+        printff("Run %d: Cost = " GainFormat ", ", Run, Cost);
+        if (Optimum != MINUS_INFINITY && Optimum != 0)
+            printff("Gap = %0.4f%%, ", 100.0 * (Cost - Optimum) / Optimum);
+        printff("Time = %0.2f sec.\n\n", fabs(GetTime() - StartTime));
     }
     for (i = 1; i <= Dimension; i++)
-        fscanf(TourFile, "%d", &Tour[i]);
-    Tour[0] = Tour[Dimension];
-    fclose(TourFile);
-    unlink(TourFileName);
+        if (Tour[i] < 1 || Tour[i] > Dimension)
+            eprintf("LKH returned an illegal tour");
     return Cost;
 }
+
+/*
+ * The LoadLibrary function loads the LKH shared library the first time it
+ * is called. The library is searched in the directories of the dynamic
+ * linker (e.g. LD_LIBRARY_PATH, which includes the catkin devel and install
+ * spaces).
+ */
+
+static void LoadLibrary()
+{
+    if (Library)
+        return;
+    if (!(Library = dlopen("liblkh.so", RTLD_NOW | RTLD_LOCAL |
+                           RTLD_DEEPBIND)))
+        eprintf("Cannot load the LKH library: %s", dlerror());
+    if (!(LKHSolveTSP = (LKHSolveFunction) dlsym(Library,
+                                                    "LKHSolveBuffer")) ||
+        !(LKHGetTSPTour = (LKHTourFunction) dlsym(Library, "LKHGetTour")) ||
+        !(LKHFreeTSP = (LKHFreeFunction) dlsym(Library, "LKHFree")) ||
+        !(LKHRun = (int *) dlsym(Library, "Run")) ||
+        !(LKHRuns = (int *) dlsym(Library, "Runs"))) {
+        dlclose(Library);
+        Library = 0;
+        eprintf("Invalid LKH library: %s", dlerror());
+    }
+}
+
+/*
+ * The RemainingTime function returns the time left (in seconds) of the
+ * TOTAL_TIME_LIMIT. It is passed to LKH, whose time is counted from the
+ * moment it reads its parameters.
+ */
+
+double RemainingTime()
+{
+    double Time = TotalTimeLimit - (GetTime() - StartTime);
+    return Time > 0 ? Time : 0;
+}
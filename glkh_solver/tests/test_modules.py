@@ -2,6 +2,7 @@
 from __future__ import print_function
 import os
 import unittest
+import numpy as np
 import resource_retriever
 # Tested module
 import lkh_solver as lkh
@@ -23,3 +24,46 @@ class Test_glkh_solver(unittest.TestCase):
     params.trace_level = 0
     for problem_file in files:
       tour, info = lkh.solver.lkh_solver(problem_file, params, pkg, rosnode)
+
+  def test_glkh_solver_total_time_limit(self):
+    # A total time limit shorter than the ascent still yields a tour
+    folder = 'package://glkh_solver/gtsplib'
+    path = resource_retriever.get_filename(folder, use_protocol=False)
+    problem_file = os.path.join(path, '5ulysses22.gtsp')
+    params = lkh.solver.SolverParameters()
+    params.trace_level = 0
+    params.total_time_limit = 0.
+    tour, info = lkh.solver.lkh_solver(problem_file, params, 'glkh_solver',
+                                      'glkh_solver', exact_threshold=0)
+    self.assertEqual(info['returncode'], 0)
+    self.assertEqual(len(tour[0]), 5)
+
+  def test_solve_gtsp(self):
+    np.random.seed(1)
+    coords = 1000*np.random.rand(40, 2)
+    clusters = np.random.choice(['a', 'b', 'c', 'd', 'e'], 40)
+    params = lkh.solver.SolverParameters()
+    params.trace_level = 0
+    tour, info = lkh.solver.solve_gtsp(clusters, params, coords=coords)
+    self.assertEqual(len(tour), 5)
+    self.assertEqual(sorted(info['cluster_tour'].tolist()), list('abcde'))
+    np.testing.assert_array_equal(clusters[info['selected']], info['labels'])
+
+  def test_cluster_optimize(self):
+    np.random.seed(1)
+    coords = 1000*np.random.rand(60, 2)
+    clusters = np.random.randint(0, 6, 60)
+    params = lkh.solver.SolverParameters()
+    params.trace_level = 0
+    tour, info = lkh.solver.solve_gtsp(clusters, params, coords=coords)
+    cost = lkh.evaluate.tour_costs(tour, coords=coords)
+    # GLKH already optimized the nodes of the clusters
+    _, optimized = lkh.solver.cluster_optimize(tour, clusters, coords=coords)
+    self.assertEqual(optimized, cost)
+    # Same cluster order, from the first node of every cluster
+    tour = [np.flatnonzero(clusters == c)[0] for c in clusters[tour]]
+    optimized_tour, optimized = lkh.solver.cluster_optimize(tour, clusters,
+                                                                coords=coords)
+    self.assertEqual(optimized, cost)
+    self.assertEqual(lkh.evaluate.tour_costs(optimized_tour, coords=coords),
+                                                                        cost)
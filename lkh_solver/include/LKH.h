@@ -12,6 +12,7 @@
 #include <float.h>
 #include <limits.h>
 #include <math.h>
+#include <setjmp.h>
 #include <stdlib.h>
 #include <stdio.h>
 #include <string.h>
@@ -85,6 +86,7 @@ struct Node {
     int BestPi; /* Currently best pi-value found during the ascent */
     int Beta;   /* Beta-value (used for computing alpha-values) */
     int Subproblem;  /* Number of the subproblem the node is part of */
+    int GTSPSet;     /* Number of the GTSP set the node is part of */
     int Sons;   /* Number of sons in the minimum spanning tree */
     int *C;     /* A row in the cost matrix */
     Node *Pred, *Suc;  /* Predecessor and successor node in 
@@ -99,6 +101,8 @@ struct Node {
     Node *Prev; /* Auxiliary pointer, usually to the previous node 
                    in a list of nodes */
     Node *Mark; /* Visited mark */
+    Node *GTSPSuc; /* Successor of the node in its GTSP set (when a GTSP 
+                      instance is given as an ATSP with GTSP_SET_SECTION) */
     Node *FixedTo1,    /* Pointers to the opposite end nodes of fixed edges. */
          *FixedTo2;    /* A maximum of two fixed edges can be incident
                           to a node */
@@ -180,10 +184,19 @@ int CacheMask;  /* Mask for indexing the cache */
 int *CacheVal;  /* Table of cached distances */
 int *CacheSig;  /* Table of the signatures of cached 
                    distances */
+#ifdef LKH_PROFILE
+long long CacheLookups; /* Number of lookups in the cache */
+long long CacheHits;    /* Number of lookups that found the distance */
+#endif
 int CandidateFiles;     /* Number of CANDIDATE_FILEs */
 int *CostMatrix;        /* Cost matrix */
+void *CostMatrixMapping;        /* Memory mapping of the cost matrix (if it is
+                                   used in place from the problem file) */
+size_t CostMatrixMappingSize;   /* Size of the mapping */
 int Dimension;  /* Number of nodes in the problem */
 int DimensionSaved;     /* Saved value of Dimension */
+jmp_buf *ErrorJump;     /* If not null, eprintf jumps here instead of 
+                           exiting (used by the shared library) */
 double Excess;  /* Maximum alpha-value allowed for any 
                    candidate edge is set to Excess times the 
                    absolute value of the lower bound of a 
@@ -218,6 +231,9 @@ int Kicks;      /* Specifies the number of K-swap-kicks */
 int KickType;   /* Specifies K for a K-swap-kick */
 int M;          /* The M-value is used when solving an ATSP-
                    instance by transforming it to a STSP-instance */
+int GTSPOffset; /* The M-value of the Noon-Bean transformation of a GTSP
+                   instance into an ATSP instance */
+int GTSPSets;   /* Number of GTSP sets (GTSP_SETS) */
 int MaxBreadth; /* The maximum number of candidate edges 
                    considered at each level of the search for
                    a move */
@@ -256,6 +272,7 @@ short Reversed; /* Boolean used to indicate whether a tour has
 int Run; /* Current run number */
 int Runs;       /* Total number of runs */
 unsigned Seed;  /* Initial seed for random number generation */
+double StartTime;      /* Time when the parameters were read */
 int StopAtOptimum;      /* Specifies whether a run will be terminated if 
                            the tour length becomes equal to Optimum */
 int Subgradient;        /* Specifies whether the Pi-values should be 
@@ -270,6 +287,7 @@ int SubsequentPatching; /* Species whether patching is used for
 SwapRecord *SwapStack;  /* Stack of SwapRecords */
 int Swaps;      /* Number of swaps made during a tentative move */
 double TimeLimit;       /* The time limit in seconds for each run */
+double TotalTimeLimit;  /* The total time limit in seconds */
 int TraceLevel; /* Specifies the level of detail of the output 
                    given during the solution process. 
                    The value 0 signifies a minimum amount of 
@@ -301,12 +319,15 @@ int CandidateSetSymmetric, CandidateSetType,
 FILE *ParameterFile, *ProblemFile, *PiFile, *InputTourFile,
     *TourFile, *InitialTourFile, *SubproblemTourFile, **MergeTourFile;
 CostFunction Distance, D, C, c;
+CostFunction GTSPDistance;     /* Distance function of the GTSP instance 
+                                  underlying a transformed ATSP instance */
 MoveFunction BestMove, BacktrackMove, BestSubsequentMove;
 
 /* Function prototypes: */
 
 int Distance_1(Node * Na, Node * Nb);
 int Distance_ATSP(Node * Na, Node * Nb);
+int Distance_GTSP(Node * Na, Node * Nb);
 int Distance_ATT(Node * Na, Node * Nb);
 int Distance_CEIL_2D(Node * Na, Node * Nb);
 int Distance_CEIL_3D(Node * Na, Node * Nb);
@@ -346,6 +367,7 @@ int AddCandidate(Node * From, Node * To, int Cost, int Alpha);
 void AddExtraCandidates(int K, int CandidateSetType, int Symmetric);
 void AddTourCandidates(void);
 void AdjustCandidateSet(void);
+void AdjustMoveType(void);
 void AllocateSegments(void);
 void AllocateStructures(void);
 GainType Ascent(void);
@@ -371,6 +393,7 @@ void CreateQuadrantCandidateSet(int K);
 void eprintf(const char *fmt, ...);
 int Excludable(Node * ta, Node * tb);
 void Exclude(Node * ta, Node * tb);
+GainType FindLocalOptima(void);
 GainType FindTour(void);
 void Flip(Node * t1, Node * t2, Node * t3);
 void Flip_SL(Node * t1, Node * t2, Node * t3);
@@ -390,6 +413,13 @@ int IsCandidate(const Node * ta, const Node * tb);
 int IsCommonEdge(const Node * ta, const Node * tb);
 int IsPossibleCandidate(Node * From, Node * To);
 void KSwapKick(int K);
+void LKHFree(void);
+void LKHGetTour(int *Tour);
+int LKHLoad(const char *Parameters, const char *Problem);
+int LKHSolve(const char *Parameters, const char *Problem, GainType * Cost);
+int LKHSolveBuffer(const char *Parameters, const char *Problem,
+                   size_t ProblemSize, GainType * Cost);
+int LKHSolveLoaded(const char *Parameters, GainType * Cost);
 GainType LinKernighan(void);
 void Make2OptMove(Node * t1, Node * t2, Node * t3, Node * t4);
 void Make3OptMove(Node * t1, Node * t2, Node * t3, Node * t4, 
@@ -424,7 +454,10 @@ void RecordBestTour(void);
 void RecordBetterTour(void);
 Node *RemoveFirstActive(void);
 void ResetCandidateSet(void);
+void ResetGain23(void);
+void ResetPenalties(void);
 void RestoreTour(void);
+GainType RunLKH(void);
 int SegmentSize(Node *ta, Node *tb);
 GainType SFCTour(int CurveType);
 void SolveCompressedSubproblem(int CurrentSubproblem, int Subproblems, 
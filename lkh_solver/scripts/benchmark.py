@@ -0,0 +1,98 @@
+#! /usr/bin/env python
+"""
+Benchmark the LKH/GLKH solvers and check for regressions.
+
+Examples
+--------
+Times depend on the machine (and on the startup of `rosrun`), therefore no
+baseline is shipped with the package. Record one on the target machine::
+
+  rosrun lkh_solver benchmark.py --sizes 1000 --save-baseline
+
+Run the bundled instances plus the synthetic 1000 nodes instances and compare
+them against the stored baseline::
+
+  rosrun lkh_solver benchmark.py --sizes 1000
+
+Record it again after an intended change.
+"""
+import os
+import sys
+import argparse
+import lkh_solver as lkh
+
+
+DEFAULT_BASELINE = os.path.join(os.environ.get('ROS_HOME',
+            os.path.join(os.path.expanduser('~'), '.ros')), 'lkh_solver',
+            'benchmark_baseline.json')
+
+def print_result(name, result):
+  values = [name, result['dimension'], result['cost'],
+            '-' if result['gap'] is None else '{:.2f}%'.format(result['gap'])]
+  values += ['-' if result[key] is None else '{:.3f}'.format(result[key])
+             for key in ('wall_time', 'startup_time', 'ascent_time',
+                         'time_to_best', 'peak_rss_mb')]
+  print('{:>20} {:>7} {:>12} {:>7} {:>9} {:>9} {:>9} {:>9} {:>9}'.format(
+                                                                    *values))
+  sys.stdout.flush()
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+  parser.add_argument('--sizes', type=int, nargs='*', default=[],
+            help='Sizes of the synthetic instances (e.g. 1000 10000 100000)')
+  parser.add_argument('--distributions', nargs='*',
+            default=['uniform', 'clustered'], help='Synthetic distributions')
+  parser.add_argument('--no-bundled', action='store_true',
+            help='Skip the instances bundled with the packages')
+  parser.add_argument('--preset', default='fast', help='Solver preset')
+  parser.add_argument('--seed', type=int, default=1,
+            help='Seed of the synthetic instances and of the solver')
+  parser.add_argument('--working-path', default='/tmp/lkh/benchmark',
+            help='Directory for the intermediate files')
+  parser.add_argument('--output', help='Write the results to this JSON file')
+  parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+            help='Baseline JSON file')
+  parser.add_argument('--save-baseline', action='store_true',
+            help='Store the results as the new baseline')
+  parser.add_argument('--time-tolerance', type=float, default=0.25,
+            help='Allowed relative increase of the times')
+  parser.add_argument('--rss-tolerance', type=float, default=0.25,
+            help='Allowed relative increase of the peak memory')
+  args = parser.parse_args()
+  # Instances
+  instances = [] if args.no_bundled else lkh.benchmark.bundled_instances()
+  instances += lkh.benchmark.synthetic_instances(args.sizes,
+              args.distributions, seed=args.seed,
+              path=os.path.join(args.working_path, 'instances'))
+  print('{:>20} {:>7} {:>12} {:>7} {:>9} {:>9} {:>9} {:>9} {:>9}'.format(
+                    'instance', 'n', 'cost', 'gap', 'wall', 'startup',
+                    'ascent', 'to best', 'rss (MB)'))
+  results = lkh.benchmark.run_benchmark(instances, preset=args.preset,
+          seed=args.seed, working_path=args.working_path,
+          callback=print_result)
+  if args.output:
+    lkh.benchmark.save_results(args.output, results)
+  if args.save_baseline:
+    if not os.path.isdir(os.path.dirname(os.path.abspath(args.baseline))):
+      os.makedirs(os.path.dirname(os.path.abspath(args.baseline)))
+    lkh.benchmark.save_results(args.baseline, results)
+    print('Baseline saved to {}'.format(args.baseline))
+    return 0
+  if not os.path.isfile(args.baseline):
+    print('No baseline found at {}, record one with --save-baseline'.format(
+                                                              args.baseline))
+    return 0
+  baseline = lkh.benchmark.load_results(args.baseline)
+  regressions = lkh.benchmark.compare(results, baseline,
+                                      time_tolerance=args.time_tolerance,
+                                      rss_tolerance=args.rss_tolerance)
+  for regression in regressions:
+    print('REGRESSION {instance}: {metric} {baseline} -> {value}'.format(
+                                                                **regression))
+  if not regressions:
+    print('No regressions against {}'.format(args.baseline))
+  return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -58,6 +58,11 @@ int C_FUNCTION(Node * Na, Node * Nb)
         j = k;
     }
     Index = ((i << 8) + i + j) & CacheMask;
+#ifdef LKH_PROFILE
+    CacheLookups++;
+    if (CacheSig[Index] == i)
+        CacheHits++;
+#endif
     if (CacheSig[Index] == i)
         return CacheVal[Index];
     CacheSig[Index] = i;
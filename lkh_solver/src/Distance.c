@@ -21,6 +21,37 @@ int Distance_ATSP(Node * Na, Node * Nb)
     return Na->Id <= n ? Na->C[Nb->Id - n] : Nb->C[Na->Id - n];
 }
 
+/*
+ * The Distance_GTSP function computes the costs of the ATSP instance that
+ * results from the Noon-Bean transformation of a GTSP instance, without
+ * storing them. The arc from i to j costs 0 if j is the successor of i in
+ * its set, 2 * GTSPOffset if i and j belong to the same set, and otherwise
+ * the GTSP distance from the successor of i to j plus GTSPOffset. The ATSP
+ * instance is in turn transformed into a symmetric one as in Distance_ATSP.
+ */
+
+int Distance_GTSP(Node * Na, Node * Nb)
+{
+    int n = DimensionSaved, d;
+    if ((Na->Id <= n) == (Nb->Id <= n))
+        return M;
+    if (abs(Na->Id - Nb->Id) == n)
+        return 0;
+    if (Na->Id > n) {
+        Node *N = Na;
+        Na = Nb;
+        Nb = N;
+    }
+    Nb = &NodeSet[Nb->Id - n];
+    if (Nb == Na->GTSPSuc)
+        return 0;
+    if (Nb->GTSPSet == Na->GTSPSet)
+        return 2 * GTSPOffset;
+    if ((d = GTSPDistance(Na->GTSPSuc, Nb)) > GTSPOffset)
+        eprintf("PRECISION (= %d) is too large", Precision);
+    return d + GTSPOffset;
+}
+
 int Distance_ATT(Node * Na, Node * Nb)
 {
     double xd = Na->X - Nb->X, yd = Na->Y - Nb->Y;
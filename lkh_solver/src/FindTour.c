@@ -47,7 +47,9 @@ GainType FindTour()
     }
 
     for (Trial = 1; Trial <= MaxTrials; Trial++) {
-        if (GetTime() - EntryTime >= TimeLimit) {
+        /* At least one trial is made, so that a tour is always found */
+        if (GetTime() - EntryTime >= TimeLimit ||
+            (Trial > 1 && GetTime() - StartTime >= TotalTimeLimit)) {
             if (TraceLevel >= 1)
                 printff("*** Time limit exceeded ***\n");
             break;
@@ -1,6 +1,7 @@
 #include "LKH.h"
 #include "Sequence.h"
 #include "Genetic.h"
+#include <sys/mman.h>
 
 /*      
  * The FreeStructures function frees all allocated structures.
@@ -21,7 +22,12 @@ void FreeStructures()
         }
         Free(NodeSet);
     }
-    Free(CostMatrix);
+    if (CostMatrixMapping) {
+        munmap(CostMatrixMapping, CostMatrixMappingSize);
+        CostMatrixMapping = 0;
+        CostMatrix = 0;
+    } else
+        Free(CostMatrix);
     Free(BestTour);
     Free(BetterTour);
     Free(SwapStack);
@@ -34,10 +34,11 @@
    A detailed description of the different cases can be found after the code.
  */
 
+static Node *s1 = 0;
+static short OldReversed = 0;
+
 GainType Gain23()
 {
-    static  Node *s1 = 0;
-    static short OldReversed = 0;
     Node *s2, *s3, *s4, *s5, *s6 = 0, *s7, *s8 = 0, *s1Stop;
     Candidate *Ns2, *Ns4, *Ns6;
     GainType G0, G1, G2, G3, G4, G5, G6, Gain, Gain6;
@@ -248,6 +249,18 @@ GainType Gain23()
     return 0;
 }
 
+/*
+ * The ResetGain23 function forgets the node where the previous search 
+ * stopped. It must be called before a new problem is solved in the same 
+ * process.
+ */
+
+void ResetGain23()
+{
+    s1 = 0;
+    OldReversed = 0;
+}
+
 /*
     Below is shown the use of the variables X4, Case6 and Case8 to 
     discriminate between cases considered by the algorithm. 
@@ -0,0 +1,347 @@
+#include "LKH.h"
+#include "Genetic.h"
+
+/*
+ * This file contains the entry points of the LKH shared library. They allow
+ * LKH to be called in-process, i.e. without spawning a new process and
+ * without writing the parameter and problem files to disk.
+ *
+ * The library keeps its state in the global variables of LKH.h. Therefore
+ * only one problem can be solved at a time. The sequence of calls is:
+ *
+ *   n = LKHSolve(Parameters, Problem, &Cost);
+ *   LKHGetTour(Tour);      (Tour must have room for n integers)
+ *   LKHFree();
+ *
+ * A problem may also be loaded once and solved several times with different
+ * search parameters. The problem, the Pi-values and the candidate sets are
+ * then computed only once:
+ *
+ *   n = LKHLoad(Parameters, Problem);
+ *   LKHSolveLoaded(Parameters, &Cost);
+ *   LKHGetTour(Tour);
+ *   ...                    (more calls of LKHSolveLoaded)
+ *   LKHFree();
+ */
+
+static int TourDimension = 0;
+static int LoadedDimension = 0;
+static int SavedDimension = 0;
+static Node *SavedNodeSet = 0, *SavedFirstNode = 0;
+static Candidate **SavedCandidateSets = 0;
+
+static void SaveNodes(void);
+static void RestoreNodes(void);
+static void FreeSavedNodes(void);
+static void AdjustParameters(void);
+
+/*
+ * The LKHSolve function solves a problem.
+ *
+ * Parameters
+ *   Parameters: Contents of a parameter file. PROBLEM_FILE is mandatory,
+ *               but it is ignored if Problem is given.
+ *   Problem:    Contents of a problem file in TSPLIB format, or 0 if the
+ *               problem is to be read from PROBLEM_FILE.
+ *   Cost:       The cost of the best tour found.
+ *
+ * The return value is the number of nodes of the tour, or -1 if an error
+ * occurred (the error message is printed to stderr).
+ */
+
+int LKHSolve(const char *Parameters, const char *Problem, GainType * Cost)
+{
+    return LKHSolveBuffer(Parameters, Problem,
+                          Problem ? strlen(Problem) : 0, Cost);
+}
+
+/*
+ * The LKHSolveBuffer function is like LKHSolve, but the size of Problem is
+ * given by ProblemSize. Hence the problem may contain binary sections
+ * (e.g. EDGE_WEIGHT_BINARY_SECTION), see ReadProblem.
+ */
+
+int LKHSolveBuffer(const char *Parameters, const char *Problem,
+                   size_t ProblemSize, GainType * Cost)
+{
+    jmp_buf Jump;
+
+    LKHFree();
+    ResetGain23();
+    ResetPenalties();
+    Trial = 0;
+    ParameterFile = ProblemFile = 0;
+    ErrorJump = &Jump;
+    if (setjmp(Jump)) {
+        if (ParameterFile)
+            fclose(ParameterFile);
+        if (ProblemFile)
+            fclose(ProblemFile);
+        ParameterFile = ProblemFile = 0;
+        /* The node list may be incomplete. Do not traverse it */
+        FirstNode = 0;
+        ErrorJump = 0;
+        return -1;
+    }
+    ParameterFileName = "(memory)";
+    assert(ParameterFile =
+           fmemopen((void *) Parameters, strlen(Parameters), "r"));
+    ReadParameters();
+    MaxMatrixDimension = 10000;
+    if (Problem) {
+        assert(ProblemFile =
+               fmemopen((void *) Problem, ProblemSize, "r"));
+    }
+    ReadProblem();
+    *Cost = RunLKH();
+    TourDimension = ProblemType != ATSP ? Dimension : Dimension / 2;
+    ErrorJump = 0;
+    return TourDimension;
+}
+
+/*
+ * The LKHLoad function reads a problem and creates its candidate sets (which
+ * includes the ascent), but does not search for tours. The state of the
+ * nodes is saved so that the problem can be solved several times by
+ * LKHSolveLoaded.
+ *
+ * Parameters
+ *   Parameters: Contents of a parameter file. The parameters that affect
+ *               the preprocessing (e.g. PRECISION, MAX_CANDIDATES or
+ *               INITIAL_PERIOD) are fixed by this call.
+ *   Problem:    Contents of a problem file in TSPLIB format, or 0 if the
+ *               problem is to be read from PROBLEM_FILE.
+ *
+ * The return value is the number of nodes of the tour, or -1 if an error
+ * occurred (the error message is printed to stderr).
+ */
+
+int LKHLoad(const char *Parameters, const char *Problem)
+{
+    jmp_buf Jump;
+
+    LKHFree();
+    ResetGain23();
+    ResetPenalties();
+    Trial = 0;
+    ParameterFile = ProblemFile = 0;
+    ErrorJump = &Jump;
+    if (setjmp(Jump)) {
+        if (ParameterFile)
+            fclose(ParameterFile);
+        if (ProblemFile)
+            fclose(ProblemFile);
+        ParameterFile = ProblemFile = 0;
+        FirstNode = 0;
+        ErrorJump = 0;
+        return -1;
+    }
+    ParameterFileName = "(memory)";
+    assert(ParameterFile =
+           fmemopen((void *) Parameters, strlen(Parameters), "r"));
+    ReadParameters();
+    MaxMatrixDimension = 10000;
+    if (Problem) {
+        assert(ProblemFile =
+               fmemopen((void *) Problem, strlen(Problem), "r"));
+    }
+    ReadProblem();
+    if (SubproblemSize > 0)
+        eprintf("SUBPROBLEM_SIZE is not supported by LKHLoad");
+    AllocateStructures();
+    CreateCandidateSet();
+    SaveNodes();
+    LoadedDimension = ProblemType != ATSP ? Dimension : Dimension / 2;
+    ErrorJump = 0;
+    return LoadedDimension;
+}
+
+/*
+ * The LKHSolveLoaded function solves the problem loaded by LKHLoad. Each call
+ * starts from the state saved by LKHLoad, therefore the result is the same as
+ * the one of LKHSolve with the same parameters.
+ *
+ * Parameters
+ *   Parameters: Contents of a parameter file. Only the parameters of the
+ *               search (e.g. RUNS, MAX_TRIALS, MOVE_TYPE or SEED) may differ
+ *               from those given to LKHLoad.
+ *   Cost:       The cost of the best tour found.
+ *
+ * The return value is the number of nodes of the tour, or -1 if an error
+ * occurred (the error message is printed to stderr). After an error, the
+ * problem must be loaded again.
+ */
+
+int LKHSolveLoaded(const char *Parameters, GainType * Cost)
+{
+    jmp_buf Jump;
+
+    TourDimension = 0;
+    ParameterFile = 0;
+    ErrorJump = &Jump;
+    if (setjmp(Jump)) {
+        if (ParameterFile)
+            fclose(ParameterFile);
+        ParameterFile = 0;
+        ErrorJump = 0;
+        LKHFree();
+        return -1;
+    }
+    if (!LoadedDimension)
+        eprintf("No problem has been loaded");
+    /* The population is sized by the previous MAX_POPULATION_SIZE */
+    FreePopulation();
+    ParameterFileName = "(memory)";
+    assert(ParameterFile =
+           fmemopen((void *) Parameters, strlen(Parameters), "r"));
+    ReadParameters();
+    AdjustParameters();
+    RestoreNodes();
+    ResetGain23();
+    Trial = 0;
+    Swaps = 0;
+    AllocateStructures();
+    *Cost = FindLocalOptima();
+    TourDimension = LoadedDimension;
+    ErrorJump = 0;
+    return TourDimension;
+}
+
+/*
+ * The LKHGetTour function copies the best tour found by the last call of
+ * LKHSolve (or LKHSolveLoaded) into Tour (starting at index 0).
+ */
+
+void LKHGetTour(int *Tour)
+{
+    if (BestTour && TourDimension > 0)
+        memcpy(Tour, BestTour + 1, TourDimension * sizeof(int));
+}
+
+/*
+ * The LKHFree function frees the structures allocated by LKHSolve or
+ * LKHLoad.
+ */
+
+void LKHFree()
+{
+    FreeSavedNodes();
+    FreeStructures();
+    FirstNode = 0;
+    TourDimension = LoadedDimension = 0;
+}
+
+/*
+ * The AdjustParameters function repeats the adjustments of the search
+ * parameters made by ReadProblem, since ReadParameters resets them.
+ */
+
+static void AdjustParameters()
+{
+    if (Seed == 0)
+        Seed = (unsigned) time(0);
+    if (Precision == 0)
+        Precision = 100;
+    if (InitialStepSize == 0)
+        InitialStepSize = 1;
+    if (MaxSwaps < 0)
+        MaxSwaps = Dimension;
+    if (KickType > Dimension / 2)
+        KickType = Dimension / 2;
+    if (Runs == 0)
+        Runs = 10;
+    if (MaxCandidates > Dimension - 1)
+        MaxCandidates = Dimension - 1;
+    if (ExtraCandidates > Dimension - 1)
+        ExtraCandidates = Dimension - 1;
+    if (AscentCandidates > Dimension - 1)
+        AscentCandidates = Dimension - 1;
+    if (InitialPeriod < 0) {
+        InitialPeriod = Dimension / 2;
+        if (InitialPeriod < 100)
+            InitialPeriod = 100;
+    }
+    if (Excess < 0)
+        Excess = 1.0 / Dimension;
+    if (MaxTrials == -1)
+        MaxTrials = Dimension;
+    AdjustMoveType();
+    if (ProblemType == HCP || ProblemType == HPP)
+        MaxCandidates = 0;
+}
+
+/*
+ * The SaveNodes function saves the nodes and their candidate sets as they
+ * are after the creation of the candidate sets. The search changes them
+ * (e.g. the candidate sets are extended with tour edges).
+ */
+
+static void SaveNodes()
+{
+    Candidate *NN;
+    int i, Count;
+
+    FreeSavedNodes();
+    assert(SavedNodeSet = (Node *) malloc((1 + Dimension) * sizeof(Node)));
+    memcpy(SavedNodeSet, NodeSet, (1 + Dimension) * sizeof(Node));
+    assert(SavedCandidateSets =
+           (Candidate **) calloc(1 + Dimension, sizeof(Candidate *)));
+    for (i = 1; i <= Dimension; i++) {
+        if (!NodeSet[i].CandidateSet)
+            continue;
+        for (NN = NodeSet[i].CandidateSet, Count = 1; NN->To; NN++)
+            Count++;
+        assert(SavedCandidateSets[i] =
+               (Candidate *) malloc(Count * sizeof(Candidate)));
+        memcpy(SavedCandidateSets[i], NodeSet[i].CandidateSet,
+               Count * sizeof(Candidate));
+    }
+    SavedFirstNode = FirstNode;
+    SavedDimension = Dimension;
+}
+
+/*
+ * The RestoreNodes function restores the nodes and the candidate sets saved
+ * by SaveNodes.
+ */
+
+static void RestoreNodes()
+{
+    Candidate *NN;
+    int i, Count;
+
+    for (i = 1; i <= Dimension; i++)
+        free(NodeSet[i].CandidateSet);
+    memcpy(NodeSet, SavedNodeSet, (1 + Dimension) * sizeof(Node));
+    for (i = 1; i <= Dimension; i++) {
+        NodeSet[i].CandidateSet = 0;
+        if (!SavedCandidateSets[i])
+            continue;
+        for (NN = SavedCandidateSets[i], Count = 1; NN->To; NN++)
+            Count++;
+        assert(NodeSet[i].CandidateSet =
+               (Candidate *) malloc(Count * sizeof(Candidate)));
+        memcpy(NodeSet[i].CandidateSet, SavedCandidateSets[i],
+               Count * sizeof(Candidate));
+    }
+    FirstNode = SavedFirstNode;
+}
+
+/*
+ * The FreeSavedNodes function frees the nodes saved by SaveNodes.
+ */
+
+static void FreeSavedNodes()
+{
+    int i;
+
+    if (SavedCandidateSets) {
+        for (i = 1; i <= SavedDimension; i++)
+            free(SavedCandidateSets[i]);
+        free(SavedCandidateSets);
+        SavedCandidateSets = 0;
+    }
+    free(SavedNodeSet);
+    SavedNodeSet = SavedFirstNode = 0;
+    SavedDimension = 0;
+}
@@ -131,6 +131,10 @@ void PrintParameters()
         printff("# TIME_LIMIT =\n");
     else
         printff("TIME_LIMIT = %0.1f\n", TimeLimit);
+    if (TotalTimeLimit == DBL_MAX)
+        printff("# TOTAL_TIME_LIMIT =\n");
+    else
+        printff("TOTAL_TIME_LIMIT = %0.1f\n", TotalTimeLimit);
     printff("%sTOUR_FILE = %s\n",
             TourFileName ? "" : "# ", TourFileName ? TourFileName : "");
     printff("TRACE_LEVEL = %d\n\n", TraceLevel);
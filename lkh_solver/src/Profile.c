@@ -0,0 +1,118 @@
+#include "LKH.h"
+#include "Genetic.h"
+
+/*
+ * This file contains the profiling counters of the instrumented build of
+ * LKH (the lkh_solver_profile node). It is only compiled when LKH_PROFILE
+ * is defined.
+ *
+ * The hot functions are wrapped by the linker (option --wrap=Function), so
+ * their sources are left untouched: every call from another source file
+ * goes to __wrap_Function, which counts the call, measures its (inclusive)
+ * wall time and calls the original function, __real_Function. The hits of
+ * the distance cache are counted by C_FUNCTION (see C.c).
+ *
+ * The counters are printed at exit in the following block, one line per
+ * function followed by one line for the cache:
+ *
+ *   PROFILE_SECTION
+ *   FUNCTION <name> <calls> <seconds>
+ *   CACHE <lookups> <hits> <size>
+ *   END_PROFILE_SECTION
+ */
+
+#ifdef LKH_PROFILE
+
+#include <time.h>
+
+typedef struct ProfileCounter {
+    const char *Name;
+    long long Calls;
+    double Time;
+} ProfileCounter;
+
+enum {
+    PROFILE_ASCENT, PROFILE_LIN_KERNIGHAN, PROFILE_BEST_2_OPT_MOVE,
+    PROFILE_BEST_3_OPT_MOVE, PROFILE_BEST_4_OPT_MOVE,
+    PROFILE_BEST_5_OPT_MOVE, PROFILE_BEST_K_OPT_MOVE, PROFILE_FLIP,
+    PROFILE_FLIP_SL, PROFILE_FLIP_SSL, PROFILE_ERXT, PROFILE_COUNTERS
+};
+
+static ProfileCounter Counter[PROFILE_COUNTERS] = {
+    {"Ascent"}, {"LinKernighan"}, {"Best2OptMove"}, {"Best3OptMove"},
+    {"Best4OptMove"}, {"Best5OptMove"}, {"BestKOptMove"}, {"Flip"},
+    {"Flip_SL"}, {"Flip_SSL"}, {"ERXT"}
+};
+
+static double WallTime()
+{
+    struct timespec Now;
+    clock_gettime(CLOCK_MONOTONIC, &Now);
+    return Now.tv_sec + Now.tv_nsec / 1000000000.0;
+}
+
+static void PrintProfile(void)
+{
+    int i;
+
+    printf("PROFILE_SECTION\n");
+    for (i = 0; i < PROFILE_COUNTERS; i++)
+        printf("FUNCTION %s %lld %f\n", Counter[i].Name, Counter[i].Calls,
+               Counter[i].Time);
+    printf("CACHE %lld %lld %d\n", CacheLookups, CacheHits,
+           CacheSig ? CacheMask + 1 : 0);
+    printf("END_PROFILE_SECTION\n");
+    fflush(stdout);
+}
+
+static void __attribute__ ((constructor)) InitializeProfile(void)
+{
+    atexit(PrintProfile);
+}
+
+#define PROFILE_RETURN(Type, Function, Index, Parameters, Arguments)\
+Type __real_##Function Parameters;\
+Type __wrap_##Function Parameters\
+{\
+    Type Value;\
+    double StartTime = WallTime();\
+    Value = __real_##Function Arguments;\
+    Counter[Index].Time += WallTime() - StartTime;\
+    Counter[Index].Calls++;\
+    return Value;\
+}
+
+#define PROFILE_VOID(Function, Index, Parameters, Arguments)\
+void __real_##Function Parameters;\
+void __wrap_##Function Parameters\
+{\
+    double StartTime = WallTime();\
+    __real_##Function Arguments;\
+    Counter[Index].Time += WallTime() - StartTime;\
+    Counter[Index].Calls++;\
+}
+
+#define MOVE_PARAMETERS\
+    (Node * t1, Node * t2, GainType * G0, GainType * Gain)
+#define MOVE_ARGUMENTS (t1, t2, G0, Gain)
+#define FLIP_PARAMETERS (Node * t1, Node * t2, Node * t3)
+#define FLIP_ARGUMENTS (t1, t2, t3)
+
+PROFILE_RETURN(GainType, Ascent, PROFILE_ASCENT, (void), ())
+PROFILE_RETURN(GainType, LinKernighan, PROFILE_LIN_KERNIGHAN, (void), ())
+PROFILE_RETURN(Node *, Best2OptMove, PROFILE_BEST_2_OPT_MOVE,
+               MOVE_PARAMETERS, MOVE_ARGUMENTS)
+PROFILE_RETURN(Node *, Best3OptMove, PROFILE_BEST_3_OPT_MOVE,
+               MOVE_PARAMETERS, MOVE_ARGUMENTS)
+PROFILE_RETURN(Node *, Best4OptMove, PROFILE_BEST_4_OPT_MOVE,
+               MOVE_PARAMETERS, MOVE_ARGUMENTS)
+PROFILE_RETURN(Node *, Best5OptMove, PROFILE_BEST_5_OPT_MOVE,
+               MOVE_PARAMETERS, MOVE_ARGUMENTS)
+PROFILE_RETURN(Node *, BestKOptMove, PROFILE_BEST_K_OPT_MOVE,
+               MOVE_PARAMETERS, MOVE_ARGUMENTS)
+PROFILE_VOID(Flip, PROFILE_FLIP, FLIP_PARAMETERS, FLIP_ARGUMENTS)
+PROFILE_VOID(Flip_SL, PROFILE_FLIP_SL, FLIP_PARAMETERS, FLIP_ARGUMENTS)
+PROFILE_VOID(Flip_SSL, PROFILE_FLIP_SSL, FLIP_PARAMETERS, FLIP_ARGUMENTS)
+PROFILE_VOID(ERXT, PROFILE_ERXT, (void), ())
+
+#endif
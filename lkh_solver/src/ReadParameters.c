@@ -302,6 +302,11 @@
  * Specifies a time limit in seconds for each run.
  * Default: value of DBL_MAX. 
  *
+ * TOTAL_TIME_LIMIT = <real>
+ * Specifies a total time limit in seconds, counted from the moment the
+ * parameters are read. No trial (or run) is started once it is exceeded.
+ * Default: value of DBL_MAX.
+ *
  * TOUR_FILE = <string>
  * Specifies the name of a file where the best tour is to be written.
  * When a run has produced a new best tour, the tour is written to 
@@ -357,8 +362,10 @@ void ReadParameters()
     char *Line, *Keyword, *Token, *Name;
     unsigned int i;
 
+    StartTime = GetTime();
     ProblemFileName = PiFileName = InputTourFileName =
-        OutputTourFileName = TourFileName = 0;
+        OutputTourFileName = TourFileName = InitialTourFileName =
+        SubproblemTourFileName = 0;
     CandidateFiles = MergeTourFiles = 0;
     AscentCandidates = 50;
     BackboneTrials = 0;
@@ -412,9 +419,14 @@ void ReadParameters()
     SubsequentMoveType = 0;
     SubsequentPatching = 1;
     TimeLimit = DBL_MAX;
+    TotalTimeLimit = DBL_MAX;
     TraceLevel = 1;
 
-    if (ParameterFileName) {
+    if (ParameterFile) {
+        /* Stream opened by the caller, e.g. the LKHSolve function */
+        printff("PARAMETER_FILE = %s\n",
+                ParameterFileName ? ParameterFileName : "");
+    } else if (ParameterFileName) {
         if (!(ParameterFile = fopen(ParameterFileName, "r")))
             eprintf("Cannot open PARAMETER_FILE: \"%s\"",
                     ParameterFileName);
@@ -812,6 +824,12 @@ void ReadParameters()
                 eprintf("TIME_LIMIT: real expected");
             if (TimeLimit < 0)
                 eprintf("TIME_LIMIT: >= 0 expected");
+        } else if (!strcmp(Keyword, "TOTAL_TIME_LIMIT")) {
+            if (!(Token = strtok(0, Delimiters)) ||
+                !sscanf(Token, "%lf", &TotalTimeLimit))
+                eprintf("TOTAL_TIME_LIMIT: real expected");
+            if (TotalTimeLimit < 0)
+                eprintf("TOTAL_TIME_LIMIT: >= 0 expected");
         } else if (!strcmp(Keyword, "TOUR_FILE")) {
             if (!(TourFileName = GetFileName(0)))
                 eprintf("TOUR_FILE: string expected");
@@ -831,6 +849,7 @@ void ReadParameters()
     if (SubproblemSize > 0 && SubproblemTourFileName == 0)
         eprintf("SUBPROBLEM_TOUR_FILE specification is missing");
     fclose(ParameterFile);
+    ParameterFile = 0;
     free(LastLine);
     LastLine = 0;
 }
@@ -16,11 +16,12 @@
  * The function is called from the CreateCandidateSet function. 
  */
 
+static int PenaltiesRead = 0;
+
 int ReadPenalties()
 {
     int i, Id;
     Node *Na, *Nb = 0;
-    static int PenaltiesRead = 0;
 
     if (PiFileName == 0)
         return 0;
@@ -53,3 +54,14 @@ int ReadPenalties()
         printff("done\n");
     return PenaltiesRead = 1;
 }
+
+/*
+ * The ResetPenalties function forces the penalties to be read again by the 
+ * next call of ReadPenalties. It must be called before a new problem is 
+ * solved in the same process.
+ */
+
+void ResetPenalties()
+{
+    PenaltiesRead = 0;
+}
@@ -1,9 +1,14 @@
 #include "LKH.h"
 #include "Heap.h"
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
 
 /*      
  * The ReadProblem function reads the problem data in TSPLIB format from the 
- * file specified in the parameter file (PROBLEM_FILE).
+ * file specified in the parameter file (PROBLEM_FILE). If ProblemFile has 
+ * already been opened by the caller (e.g. the LKHSolve function), the data 
+ * are read from that stream instead.
  *
  * The following description of the file format is extracted from the TSPLIB 
  * documentation.  
@@ -69,6 +74,13 @@
  * SPECIAL      There is a special distance function implemented in 
  *              the Distance_SPECIAL function.
  *
+ * GTSP_SETS : <integer>
+ * Specifies the number of sets of an ATSP instance that is the Noon-Bean
+ * transformation of a GTSP instance. The transformed costs are computed 
+ * from the node coordinates and the GTSP_SET_SECTION when they are needed, 
+ * instead of being given in an EDGE_WEIGHT_SECTION (not available in 
+ * TSPLIB).
+ *
  * EDGE-WEIGHT_FORMAT : <string>
  * Describes the format of the edge weights if they are given explicitly. 
  * The values are
@@ -143,6 +155,16 @@
  * if NODE_COORD_TYPE is THREED_COORDS. The integers give the number of the 
  * respective nodes. The real numbers are the associated coordinates.
  *
+ * GTSP_SET_SECTION :
+ * This section is used when GTSP_SETS is given. Each set is specified by
+ *
+ *      <integer> <integer> <integer> ... <integer> -1
+ *
+ * where the first integer is the number of the set and the following ones
+ * the nodes of the set. The nodes of a set are visited in the given 
+ * (cyclic) order by the transformed instance. TYPE must be ATSP and 
+ * EDGE_WEIGHT_TYPE must be given by a function of the node coordinates.
+ *
  * EDGE_DATA_SECTION :
  * Edges of the graph are specified in either of the two formats allowed in 
  * the EDGE_DATA_FORAT entry. If a type is EDGE_LIST, then the edges are given 
@@ -194,9 +216,23 @@
  * The edge weights are given in the format specifies by the EDGE_WEIGHT_FORMAT 
  * entry. At present, all explicit data are integral and is given in one of the
  * (self-explanatory) matrix formats, with explicitly known lengths.
+ *
+ * NODE_COORD_BINARY_SECTION :
+ * EDGE_WEIGHT_BINARY_SECTION :
+ * Binary versions of NODE_COORD_SECTION and EDGE_WEIGHT_SECTION (not part of
+ * TSPLIB). The line of the keyword is followed directly by the raw data in
+ * little-endian byte order: 8-byte reals with the coordinates of the nodes
+ * 1, 2, ... (the node numbers are omitted), or 4-byte integers with the 
+ * weights in the order given by EDGE_WEIGHT_FORMAT. The keyword line may 
+ * be padded with blanks so that the data are aligned. If the problem is a 
+ * regular file, the data are mapped into memory instead of being parsed. 
+ * The weights of an ATSP in FULL_MATRIX format, or of a symmetric problem
+ * in LOWER_ROW format, are used in place as the cost matrix.
  */
 
 static const char Delimiters[] = " :=\n\t\r\f\v\xef\xbb\xbf";
+static char *WeightData;   /* Weights of an EDGE_WEIGHT_BINARY_SECTION that
+                              have not been read yet */
 static void CheckSpecificationPart(void);
 static char *Copy(char *S);
 static void CreateNodes(void);
@@ -206,23 +242,32 @@ static void Read_DISPLAY_DATA_TYPE(void);
 static void Read_EDGE_DATA_FORMAT(void);
 static void Read_EDGE_DATA_SECTION(void);
 static void Read_EDGE_WEIGHT_FORMAT(void);
+static void Read_EDGE_WEIGHT_BINARY_SECTION(void);
 static void Read_EDGE_WEIGHT_SECTION(void);
 static void Read_EDGE_WEIGHT_TYPE(void);
 static void Read_FIXED_EDGES_SECTION(void);
+static void Read_GTSP_SETS(void);
+static void Read_GTSP_SET_SECTION(void);
 static void Read_NAME(void);
+static void Read_NODE_COORD_BINARY_SECTION(void);
 static void Read_NODE_COORD_SECTION(void);
 static void Read_NODE_COORD_TYPE(void);
 static void Read_TOUR_SECTION(FILE ** File);
 static void Read_TYPE(void);
 static int TwoDWeightType(void);
 static int ThreeDWeightType(void);
+static char *ReadBinaryData(size_t Size, void **Mapping,
+                            size_t * MappingSize);
+static void FreeBinaryData(char *Data, void *Mapping, size_t MappingSize);
+static void ReadWeights(int Binary);
+static int ReadWeight(int *W);
 
 void ReadProblem()
 {
-    int i, K;
+    int i;
     char *Line, *Keyword;
 
-    if (!(ProblemFile = fopen(ProblemFileName, "r")))
+    if (!ProblemFile && !(ProblemFile = fopen(ProblemFileName, "r")))
         eprintf("Cannot open PROBLEM_FILE: \"%s\"", ProblemFileName);
     if (TraceLevel >= 1)
         printff("Reading PROBLEM_FILE: \"%s\" ... ", ProblemFileName);
@@ -236,6 +281,8 @@ void ReadProblem()
     Distance = 0;
     C = 0;
     c = 0;
+    GTSPSets = 0;
+    WeightData = 0;
     while ((Line = ReadLine(ProblemFile))) {
         if (!(Keyword = strtok(Line, Delimiters)))
             continue;
@@ -256,6 +303,8 @@ void ReadProblem()
             Read_EDGE_DATA_FORMAT();
         else if (!strcmp(Keyword, "EDGE_DATA_SECTION"))
             Read_EDGE_DATA_SECTION();
+        else if (!strcmp(Keyword, "EDGE_WEIGHT_BINARY_SECTION"))
+            Read_EDGE_WEIGHT_BINARY_SECTION();
         else if (!strcmp(Keyword, "EDGE_WEIGHT_FORMAT"))
             Read_EDGE_WEIGHT_FORMAT();
         else if (!strcmp(Keyword, "EDGE_WEIGHT_SECTION"))
@@ -266,8 +315,14 @@ void ReadProblem()
             break;
         else if (!strcmp(Keyword, "FIXED_EDGES_SECTION"))
             Read_FIXED_EDGES_SECTION();
+        else if (!strcmp(Keyword, "GTSP_SETS"))
+            Read_GTSP_SETS();
+        else if (!strcmp(Keyword, "GTSP_SET_SECTION"))
+            Read_GTSP_SET_SECTION();
         else if (!strcmp(Keyword, "NAME"))
             Read_NAME();
+        else if (!strcmp(Keyword, "NODE_COORD_BINARY_SECTION"))
+            Read_NODE_COORD_BINARY_SECTION();
         else if (!strcmp(Keyword, "NODE_COORD_SECTION"))
             Read_NODE_COORD_SECTION();
         else if (!strcmp(Keyword, "NODE_COORD_TYPE"))
@@ -286,6 +341,18 @@ void ReadProblem()
         Seed = (unsigned) time(0);
     if (Precision == 0)
         Precision = 100;
+    if (GTSPSets > 0) {
+        /* Compute the costs of the transformed GTSP instance lazily */
+        for (i = 1; i <= DimensionSaved; i++)
+            if (!NodeSet[i].GTSPSet)
+                eprintf("(GTSP_SET_SECTION) Node %d is not in any set", i);
+        GTSPOffset = GTSPSets < 2 ? 0 : INT_MAX / 4 / Precision;
+        M = 2 * GTSPOffset;
+        GTSPDistance = Distance;
+        Distance = Distance_GTSP;
+        WeightType = -1;
+        c = 0;
+    }
     if (InitialStepSize == 0)
         InitialStepSize = 1;
     if (MaxSwaps < 0)
@@ -316,7 +383,8 @@ void ReadProblem()
     }
 
     if (CostMatrix == 0 && Dimension <= MaxMatrixDimension && Distance != 0
-        && Distance != Distance_1 && Distance != Distance_ATSP) {
+        && Distance != Distance_1 && Distance != Distance_ATSP
+        && Distance != Distance_GTSP) {
         Node *Ni, *Nj;
         assert(CostMatrix =
                (int *) calloc((size_t) Dimension * (Dimension - 1) / 2,
@@ -336,7 +404,8 @@ void ReadProblem()
         WeightType = EXPLICIT;
         c = 0;
     }
-    if (Precision > 1 && (WeightType == EXPLICIT || ProblemType == ATSP)) {
+    if (Precision > 1 && (WeightType == EXPLICIT || ProblemType == ATSP) &&
+        Distance != Distance_GTSP) {
         int j, n = ProblemType == ATSP ? Dimension / 2 : Dimension;
         for (i = 2; i <= n; i++) {
             Node *N = &NodeSet[i];
@@ -347,34 +416,7 @@ void ReadProblem()
     }
     C = WeightType == EXPLICIT ? C_EXPLICIT : C_FUNCTION;
     D = WeightType == EXPLICIT ? D_EXPLICIT : D_FUNCTION;
-    if (SubsequentMoveType == 0)
-        SubsequentMoveType = MoveType;
-    K = MoveType >= SubsequentMoveType
-        || !SubsequentPatching ? MoveType : SubsequentMoveType;
-    if (PatchingC > K)
-        PatchingC = K;
-    if (PatchingA > 1 && PatchingA >= PatchingC)
-        PatchingA = PatchingC > 2 ? PatchingC - 1 : 1;
-    if (NonsequentialMoveType == -1 ||
-        NonsequentialMoveType > K + PatchingC + PatchingA - 1)
-        NonsequentialMoveType = K + PatchingC + PatchingA - 1;
-    if (PatchingC >= 1 && NonsequentialMoveType >= 4) {
-        BestMove = BestSubsequentMove = BestKOptMove;
-        if (!SubsequentPatching && SubsequentMoveType <= 5) {
-            MoveFunction BestOptMove[] =
-                { 0, 0, Best2OptMove, Best3OptMove,
-                Best4OptMove, Best5OptMove
-            };
-            BestSubsequentMove = BestOptMove[SubsequentMoveType];
-        }
-    } else {
-        MoveFunction BestOptMove[] = { 0, 0, Best2OptMove, Best3OptMove,
-            Best4OptMove, Best5OptMove
-        };
-        BestMove = MoveType <= 5 ? BestOptMove[MoveType] : BestKOptMove;
-        BestSubsequentMove = SubsequentMoveType <= 5 ?
-            BestOptMove[SubsequentMoveType] : BestKOptMove;
-    }
+    AdjustMoveType();
     if (ProblemType == HCP || ProblemType == HPP)
         MaxCandidates = 0;
     if (TraceLevel >= 1) {
@@ -384,6 +426,7 @@ void ReadProblem()
         printff("PROBLEM_FILE = %s\n",
                 ProblemFileName ? ProblemFileName : "");
     fclose(ProblemFile);
+    ProblemFile = 0;
     if (InitialTourFileName)
         ReadTour(InitialTourFileName, &InitialTourFile);
     if (InputTourFileName)
@@ -436,10 +479,16 @@ static void CheckSpecificationPart()
         && WeightType != -1 && WeightFormat != -1
         && WeightFormat != FUNCTION)
         eprintf("Conflicting EDGE_WEIGHT_TYPE and EDGE_WEIGHT_FORMAT");
-    if (ProblemType == ATSP && WeightType != EXPLICIT && WeightType != -1)
+    if (ProblemType == ATSP && WeightType != EXPLICIT && WeightType != -1
+        && GTSPSets == 0)
         eprintf("Conflicting TYPE and EDGE_WEIGHT_TYPE");
-    if (ProblemType == ATSP && WeightFormat != FULL_MATRIX)
+    if (ProblemType == ATSP && WeightFormat != FULL_MATRIX
+        && GTSPSets == 0)
         eprintf("Conflicting TYPE and EDGE_WEIGHT_FORMAT");
+    if (GTSPSets > 0 && ProblemType != ATSP)
+        eprintf("Conflicting TYPE and GTSP_SETS");
+    if (GTSPSets > 0 && (WeightType == EXPLICIT || WeightType == -1))
+        eprintf("Conflicting EDGE_WEIGHT_TYPE and GTSP_SETS");
     if (CandidateSetType == DELAUNAY && !TwoDWeightType()
         && MaxCandidates > 0)
         eprintf
@@ -529,6 +578,64 @@ static void CreateNodes()
     Link(N, FirstNode);
 }
 
+static void Read_GTSP_SETS()
+{
+    char *Token = strtok(0, Delimiters);
+
+    if (!Token || !sscanf(Token, "%d", &GTSPSets) || GTSPSets <= 0)
+        eprintf("GTSP_SETS: positive integer expected");
+}
+
+static void Read_GTSP_SET_SECTION()
+{
+    Node *N, *First, *Last;
+    int Id, Set, i, n;
+
+    if (GTSPSets == 0)
+        eprintf("GTSP_SETS is missing");
+    CheckSpecificationPart();
+    if (!FirstNode)
+        CreateNodes();
+    n = Dimension / 2;
+    for (i = 1; i <= GTSPSets; i++) {
+        if (!fscanint(ProblemFile, &Set))
+            eprintf("Missing sets in GTSP_SET_SECTION");
+        if (Set <= 0 || Set > GTSPSets)
+            eprintf("(GTSP_SET_SECTION) Set number out of range: %d", Set);
+        First = Last = 0;
+        while (fscanint(ProblemFile, &Id) && Id != -1) {
+            if (Id <= 0 || Id > n)
+                eprintf("(GTSP_SET_SECTION) Node number out of range: %d",
+                        Id);
+            N = &NodeSet[Id];
+            if (N->GTSPSet)
+                eprintf("(GTSP_SET_SECTION) Node %d occurs in more than "
+                        "one set", Id);
+            N->GTSPSet = Set;
+            if (!First)
+                First = N;
+            else
+                Last->GTSPSuc = N;
+            Last = N;
+        }
+        if (!First)
+            eprintf("(GTSP_SET_SECTION) Empty set: %d", Set);
+        Last->GTSPSuc = First;
+    }
+    /* Fix the edges between each node and its twin (as for any ATSP) */
+    for (i = 1; i <= n; i++) {
+        Node *Ni = &NodeSet[i], *Nj = &NodeSet[i + n];
+        if (!Ni->FixedTo1)
+            Ni->FixedTo1 = Nj;
+        else if (!Ni->FixedTo2)
+            Ni->FixedTo2 = Nj;
+        if (!Nj->FixedTo1)
+            Nj->FixedTo1 = Ni;
+        else if (!Nj->FixedTo2)
+            Nj->FixedTo2 = Ni;
+    }
+}
+
 static void Read_NAME()
 {
     if (!(Name = Copy(strtok(0, Delimiters))))
@@ -803,17 +910,74 @@ static void Read_EDGE_WEIGHT_FORMAT()
 }
 
 static void Read_EDGE_WEIGHT_SECTION()
+{
+    ReadWeights(0);
+}
+
+static void Read_EDGE_WEIGHT_BINARY_SECTION()
+{
+    ReadWeights(1);
+}
+
+/*
+ * The ReadWeight function reads the next weight of an EDGE_WEIGHT_SECTION,
+ * or of an EDGE_WEIGHT_BINARY_SECTION if WeightData is not null.
+ */
+
+static int ReadWeight(int *W)
+{
+    if (!WeightData)
+        return fscanint(ProblemFile, W);
+    memcpy(W, WeightData, sizeof(int));
+    WeightData += sizeof(int);
+    return 1;
+}
+
+/*
+ * The ReadWeights function reads an EDGE_WEIGHT_SECTION (Binary = 0) or an
+ * EDGE_WEIGHT_BINARY_SECTION (Binary = 1).
+ */
+
+static void ReadWeights(int Binary)
 {
     Node *Ni, *Nj;
-    int i, j, n, W;
+    int i, j, n, W, InPlace = 0;
+    size_t Count = 0;
+    char *Data = 0;
+    void *Mapping = 0;
+    size_t MappingSize = 0;
 
     CheckSpecificationPart();
     if (!FirstNode)
         CreateNodes();
+    if (Binary) {
+        n = ProblemType == ATSP ? Dimension / 2 :
+            ProblemType == HPP ? Dimension - 1 : Dimension;
+        Count = WeightFormat == FULL_MATRIX ? (size_t) n * n :
+            WeightFormat == UPPER_DIAG_ROW || WeightFormat == LOWER_DIAG_ROW
+            || WeightFormat == UPPER_DIAG_COL
+            || WeightFormat == LOWER_DIAG_COL ? (size_t) n * (n + 1) / 2 :
+            (size_t) n * (n - 1) / 2;
+        Data = ReadBinaryData(Count * sizeof(int), &Mapping, &MappingSize);
+        /* The data have the layout of the cost matrix */
+        InPlace = (size_t) Data % sizeof(int) == 0 &&
+            (ProblemType == ATSP ? WeightFormat == FULL_MATRIX :
+             ProblemType != HPP && WeightFormat == LOWER_ROW);
+        if (!InPlace)
+            WeightData = Data;
+    }
+    if (InPlace) {
+        CostMatrix = (int *) Data;
+        CostMatrixMapping = Mapping;
+        CostMatrixMappingSize = MappingSize;
+        Mapping = 0;
+        Data = 0;
+    }
     if (ProblemType != ATSP) {
-        assert(CostMatrix =
-               (int *) calloc((size_t) Dimension * (Dimension - 1) / 2,
-                              sizeof(int)));
+        if (!InPlace)
+            assert(CostMatrix =
+                   (int *) calloc((size_t) Dimension * (Dimension - 1) / 2,
+                                  sizeof(int)));
         Ni = FirstNode->Suc;
         do {
             Ni->C =
@@ -822,7 +986,9 @@ static void Read_EDGE_WEIGHT_SECTION()
         while ((Ni = Ni->Suc) != FirstNode);
     } else {
         n = Dimension / 2;
-        assert(CostMatrix = (int *) calloc((size_t) n * n, sizeof(int)));
+        if (!InPlace)
+            assert(CostMatrix =
+                   (int *) calloc((size_t) n * n, sizeof(int)));
         for (Ni = FirstNode; Ni->Id <= n; Ni = Ni->Suc)
             Ni->C = &CostMatrix[(size_t) (Ni->Id - 1) * n] - 1;
     }
@@ -835,9 +1001,12 @@ static void Read_EDGE_WEIGHT_SECTION()
             for (i = 1; i <= n; i++) {
                 Ni = &NodeSet[i];
                 for (j = 1; j <= n; j++) {
-                    if (!fscanint(ProblemFile, &W))
+                    if (InPlace)
+                        W = Ni->C[j];
+                    else if (!ReadWeight(&W))
                         eprintf("Missing weight in EDGE_WEIGHT_SECTION");
-                    Ni->C[j] = W;
+                    else
+                        Ni->C[j] = W;
                     if (i != j && W > M)
                         M = W;
                 }
@@ -856,7 +1025,7 @@ static void Read_EDGE_WEIGHT_SECTION()
         } else
             for (i = 1, Ni = FirstNode; i <= Dimension; i++, Ni = Ni->Suc) {
                 for (j = 1; j <= Dimension; j++) {
-                    if (!fscanint(ProblemFile, &W))
+                    if (!ReadWeight(&W))
                         eprintf("Missing weight in EDGE_WEIGHT_SECTION");
                     if (j < i)
                         Ni->C[j] = W;
@@ -867,16 +1036,18 @@ static void Read_EDGE_WEIGHT_SECTION()
         for (i = 1, Ni = FirstNode; i < Dimension; i++, Ni = Ni->Suc) {
             for (j = i + 1, Nj = Ni->Suc; j <= Dimension;
                  j++, Nj = Nj->Suc) {
-                if (!fscanint(ProblemFile, &W))
+                if (!ReadWeight(&W))
                     eprintf("Missing weight in EDGE_WEIGHT_SECTION");
                 Nj->C[i] = W;
             }
         }
         break;
     case LOWER_ROW:
+        if (InPlace)
+            break;
         for (i = 2, Ni = FirstNode->Suc; i <= Dimension; i++, Ni = Ni->Suc) {
             for (j = 1; j < i; j++) {
-                if (!fscanint(ProblemFile, &W))
+                if (!ReadWeight(&W))
                     eprintf("Missing weight in EDGE_WEIGHT_SECTION");
                 Ni->C[j] = W;
             }
@@ -885,7 +1056,7 @@ static void Read_EDGE_WEIGHT_SECTION()
     case UPPER_DIAG_ROW:
         for (i = 1, Ni = FirstNode; i <= Dimension; i++, Ni = Ni->Suc) {
             for (j = i, Nj = Ni; j <= Dimension; j++, Nj = Nj->Suc) {
-                if (!fscanint(ProblemFile, &W))
+                if (!ReadWeight(&W))
                     eprintf("Missing weight in EDGE_WEIGHT_SECTION");
                 if (i != j)
                     Nj->C[i] = W;
@@ -895,7 +1066,7 @@ static void Read_EDGE_WEIGHT_SECTION()
     case LOWER_DIAG_ROW:
         for (i = 1, Ni = FirstNode; i <= Dimension; i++, Ni = Ni->Suc) {
             for (j = 1; j <= i; j++) {
-                if (!fscanint(ProblemFile, &W))
+                if (!ReadWeight(&W))
                     eprintf("Missing weight in EDGE_WEIGHT_SECTION");
                 if (j != i)
                     Ni->C[j] = W;
@@ -905,7 +1076,7 @@ static void Read_EDGE_WEIGHT_SECTION()
     case UPPER_COL:
         for (j = 2, Nj = FirstNode->Suc; j <= Dimension; j++, Nj = Nj->Suc) {
             for (i = 1; i < j; i++) {
-                if (!fscanint(ProblemFile, &W))
+                if (!ReadWeight(&W))
                     eprintf("Missing weight in EDGE_WEIGHT_SECTION");
                 Nj->C[i] = W;
             }
@@ -915,7 +1086,7 @@ static void Read_EDGE_WEIGHT_SECTION()
         for (j = 1, Nj = FirstNode; j < Dimension; j++, Nj = Nj->Suc) {
             for (i = j + 1, Ni = Nj->Suc; i <= Dimension;
                  i++, Ni = Ni->Suc) {
-                if (!fscanint(ProblemFile, &W))
+                if (!ReadWeight(&W))
                     eprintf("Missing weight in EDGE_WEIGHT_SECTION");
                 Ni->C[j] = W;
             }
@@ -924,7 +1095,7 @@ static void Read_EDGE_WEIGHT_SECTION()
     case UPPER_DIAG_COL:
         for (j = 1, Nj = FirstNode; j <= Dimension; j++, Nj = Nj->Suc) {
             for (i = 1; i <= j; i++) {
-                if (!fscanint(ProblemFile, &W))
+                if (!ReadWeight(&W))
                     eprintf("Missing weight in EDGE_WEIGHT_SECTION");
                 if (i != j)
                     Nj->C[i] = W;
@@ -934,7 +1105,7 @@ static void Read_EDGE_WEIGHT_SECTION()
     case LOWER_DIAG_COL:
         for (j = 1, Nj = FirstNode; j <= Dimension; j++, Nj = Nj->Suc) {
             for (i = j, Ni = Nj; i <= Dimension; i++, Ni = Ni->Suc) {
-                if (!fscanint(ProblemFile, &W))
+                if (!ReadWeight(&W))
                     eprintf("Missing weight in EDGE_WEIGHT_SECTION");
                 if (i != j)
                     Ni->C[j] = W;
@@ -944,6 +1115,10 @@ static void Read_EDGE_WEIGHT_SECTION()
     }
     if (ProblemType == HPP)
         Dimension++;
+    if (Binary) {
+        WeightData = 0;
+        FreeBinaryData(Data, Mapping, MappingSize);
+    }
 }
 
 static void Read_EDGE_WEIGHT_TYPE()
@@ -1091,7 +1266,7 @@ static void Read_FIXED_EDGES_SECTION()
 static void Read_NODE_COORD_SECTION()
 {
     Node *N;
-    int Id, i;
+    int Id, i, n;
 
     CheckSpecificationPart();
     if (CoordType != TWOD_COORDS && CoordType != THREED_COORDS)
@@ -1105,10 +1280,11 @@ static void Read_NODE_COORD_SECTION()
     while ((N = N->Suc) != FirstNode);
     if (ProblemType == HPP)
         Dimension--;
-    for (i = 1; i <= Dimension; i++) {
+    n = ProblemType == ATSP ? Dimension / 2 : Dimension;
+    for (i = 1; i <= n; i++) {
         if (!fscanint(ProblemFile, &Id))
             eprintf("Missing nodes in NODE_COORD_SECTION");
-        if (Id <= 0 || Id > Dimension)
+        if (Id <= 0 || Id > n)
             eprintf("(NODE_COORD_SECTION) Node number out of range: %d",
                     Id);
         N = &NodeSet[Id];
@@ -1130,16 +1306,112 @@ static void Read_NODE_COORD_SECTION()
     }
     N = FirstNode;
     do
-        if (!N->V && N->Id <= Dimension)
+        if (!N->V && N->Id <= n)
             break;
     while ((N = N->Suc) != FirstNode);
-    if (!N->V)
+    if (!N->V && N->Id <= n)
         eprintf("(NODE_COORD_SECTION) No coordinates given for node %d",
                 N->Id);
     if (ProblemType == HPP)
         Dimension++;
 }
 
+static void Read_NODE_COORD_BINARY_SECTION()
+{
+    Node *N;
+    int i, n, k;
+    char *Data, *Value;
+    void *Mapping;
+    size_t MappingSize;
+
+    CheckSpecificationPart();
+    if (CoordType != TWOD_COORDS && CoordType != THREED_COORDS)
+        eprintf
+            ("NODE_COORD_BINARY_SECTION conflicts with NODE_COORD_TYPE: %s",
+             NodeCoordType);
+    if (!FirstNode)
+        CreateNodes();
+    n = ProblemType == ATSP ? Dimension / 2 :
+        ProblemType == HPP ? Dimension - 1 : Dimension;
+    k = CoordType == THREED_COORDS ? 3 : 2;
+    Data = ReadBinaryData((size_t) n * k * sizeof(double), &Mapping,
+                          &MappingSize);
+    for (i = 1, Value = Data; i <= n; i++, Value += k * sizeof(double)) {
+        N = &NodeSet[i];
+        memcpy(&N->X, Value, sizeof(double));
+        memcpy(&N->Y, Value + sizeof(double), sizeof(double));
+        if (k == 3)
+            memcpy(&N->Z, Value + 2 * sizeof(double), sizeof(double));
+        if (Name && !strcmp(Name, "d657")) {
+            N->X = (float) N->X;
+            N->Y = (float) N->Y;
+        }
+    }
+    FreeBinaryData(Data, Mapping, MappingSize);
+}
+
+/*
+ * The ReadBinaryData function returns the Size bytes of binary data that
+ * follow the current line of the problem file, and skips them.
+ *
+ * If the problem file is a regular file, the data are mapped into memory
+ * (privately, i.e., changes are not written back to the file). Mapping and
+ * MappingSize are then set to the mapped region. Otherwise (e.g., if the
+ * problem is given in memory), the data are read into an allocated buffer
+ * and Mapping is set to 0. The data are released by FreeBinaryData.
+ */
+
+static char *ReadBinaryData(size_t Size, void **Mapping,
+                            size_t * MappingSize)
+{
+    long Offset;
+    size_t Start;
+    struct stat Status;
+    char *Data;
+    int Fd, One = 1;
+
+    if (*(char *) &One != 1)
+        eprintf("Binary sections require a little-endian machine");
+    *Mapping = 0;
+    *MappingSize = 0;
+    if ((Offset = ftell(ProblemFile)) < 0)
+        eprintf("Cannot locate the binary data of the PROBLEM_FILE");
+    if ((Fd = fileno(ProblemFile)) >= 0 && !fstat(Fd, &Status) &&
+        S_ISREG(Status.st_mode)) {
+        if ((size_t) Status.st_size < (size_t) Offset + Size)
+            eprintf("Missing binary data in PROBLEM_FILE");
+        Start = (size_t) Offset / sysconf(_SC_PAGESIZE) *
+            sysconf(_SC_PAGESIZE);
+        *MappingSize = (size_t) Offset - Start + Size;
+        *Mapping = mmap(0, *MappingSize, PROT_READ | PROT_WRITE,
+                        MAP_PRIVATE, Fd, (off_t) Start);
+        if (*Mapping != MAP_FAILED) {
+            fseek(ProblemFile, Offset + (long) Size, SEEK_SET);
+            return (char *) *Mapping + (Offset - Start);
+        }
+        *Mapping = 0;
+        *MappingSize = 0;
+    }
+    assert(Data = (char *) malloc(Size + 1));
+    if (fread(Data, 1, Size, ProblemFile) != Size) {
+        free(Data);
+        eprintf("Missing binary data in PROBLEM_FILE");
+    }
+    return Data;
+}
+
+/*
+ * The FreeBinaryData function releases the data returned by ReadBinaryData.
+ */
+
+static void FreeBinaryData(char *Data, void *Mapping, size_t MappingSize)
+{
+    if (Mapping)
+        munmap(Mapping, MappingSize);
+    else
+        free(Data);
+}
+
 static void Read_NODE_COORD_TYPE()
 {
     unsigned int i;
@@ -1377,3 +1649,45 @@ void ReadTour(char *FileName, FILE ** File)
         eprintf("Missing TOUR_SECTION in tour file: \"%s\"", FileName);
     fclose(*File);
 }
+
+/*
+ * The AdjustMoveType function adjusts the parameters of the move types and
+ * chooses the corresponding move functions (BestMove and BestSubsequentMove).
+ *
+ * The function is called from ReadProblem and from the LKHSolveLoaded
+ * function of the shared library.
+ */
+
+void AdjustMoveType()
+{
+    int K;
+
+    if (SubsequentMoveType == 0)
+        SubsequentMoveType = MoveType;
+    K = MoveType >= SubsequentMoveType
+        || !SubsequentPatching ? MoveType : SubsequentMoveType;
+    if (PatchingC > K)
+        PatchingC = K;
+    if (PatchingA > 1 && PatchingA >= PatchingC)
+        PatchingA = PatchingC > 2 ? PatchingC - 1 : 1;
+    if (NonsequentialMoveType == -1 ||
+        NonsequentialMoveType > K + PatchingC + PatchingA - 1)
+        NonsequentialMoveType = K + PatchingC + PatchingA - 1;
+    if (PatchingC >= 1 && NonsequentialMoveType >= 4) {
+        BestMove = BestSubsequentMove = BestKOptMove;
+        if (!SubsequentPatching && SubsequentMoveType <= 5) {
+            MoveFunction BestOptMove[] =
+                { 0, 0, Best2OptMove, Best3OptMove,
+                Best4OptMove, Best5OptMove
+            };
+            BestSubsequentMove = BestOptMove[SubsequentMoveType];
+        }
+    } else {
+        MoveFunction BestOptMove[] = { 0, 0, Best2OptMove, Best3OptMove,
+            Best4OptMove, Best5OptMove
+        };
+        BestMove = MoveType <= 5 ? BestOptMove[MoveType] : BestKOptMove;
+        BestSubsequentMove = SubsequentMoveType <= 5 ?
+            BestOptMove[SubsequentMoveType] : BestKOptMove;
+    }
+}
@@ -9,6 +9,10 @@
  * neighbor.
  * 
  * Nothing happens if FileName is 0. 
+ *
+ * The tour is first written to a temporary file, which is then renamed. 
+ * Therefore a process that reads the file (or kills the solver) while it 
+ * is being written always sees a complete tour.
  */
 
 static char *FullName(char *Name, GainType Cost);
@@ -17,7 +21,7 @@ void WriteTour(char *FileName, int *Tour, GainType Cost)
 {
     FILE *TourFile;
     int i, j, n, Forwards;
-    char *FullFileName;
+    char *FullFileName, *TmpFileName;
     time_t Now;
 
     if (FileName == 0)
@@ -29,7 +33,9 @@ void WriteTour(char *FileName, int *Tour, GainType Cost)
                 FileName == TourFileName ? " TOUR_FILE" :
                 FileName == OutputTourFileName ? " OUTPUT_TOUR_FILE" : "",
                 FullFileName);
-    assert(TourFile = fopen(FullFileName, "w"));
+    assert(TmpFileName = (char *) malloc(strlen(FullFileName) + 5));
+    sprintf(TmpFileName, "%s.tmp", FullFileName);
+    assert(TourFile = fopen(TmpFileName, "w"));
     fprintf(TourFile, "NAME : %s." GainFormat ".tour\n", Name, Cost);
     fprintf(TourFile, "COMMENT : Length = " GainFormat "\n", Cost);
     fprintf(TourFile, "COMMENT : Found by LKH [Keld Helsgaun] %s", ctime(&Now));
@@ -51,8 +57,10 @@ void WriteTour(char *FileName, int *Tour, GainType Cost)
     }
     fprintf(TourFile, "-1\nEOF\n");
     fclose(TourFile);
+    assert(rename(TmpFileName, FullFileName) == 0);
     if (TraceLevel >= 1)
         printff("done\n");
+    free(TmpFileName);
     free(FullFileName);
 }
 
@@ -2,7 +2,9 @@
 #include <stdarg.h>
 
 /* 
- * The eprintf function prints an error message and exits.
+ * The eprintf function prints an error message and exits. If ErrorJump is 
+ * set (LKH is running as a shared library), control is returned to the 
+ * caller instead.
  */
 
 void eprintf(const char *fmt, ...)
@@ -16,5 +18,7 @@ void eprintf(const char *fmt, ...)
     vfprintf(stderr, fmt, args);
     va_end(args);
     fprintf(stderr, "\n");
+    if (ErrorJump)
+        longjmp(*ErrorJump, 1);
     exit(EXIT_FAILURE);
 }
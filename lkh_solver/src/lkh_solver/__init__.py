@@ -1,3 +1,12 @@
 #!/usr/bin/env python
-import parser
-import solver
+import sys
+from . import benchmark
+from . import cache
+from . import evaluate
+from . import exact
+from . import library
+from . import parser
+from . import solver
+# The asyncio interface requires Python 3.6
+if sys.version_info >= (3, 6):
+  from . import aio
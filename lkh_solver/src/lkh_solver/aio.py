@@ -0,0 +1,188 @@
+#! /usr/bin/env python
+"""
+Asyncio interface of the LKH solver. It requires Python 3.6 or newer.
+"""
+import os
+import copy
+import time
+import shutil
+import asyncio
+import tempfile
+import multiprocessing
+# Own modules
+from . import parser
+from . import solver
+
+
+class AsyncSolver(object):
+  """
+  Asyncio-native LKH (or GLKH) solver. Every solve runs the solver as a
+  subprocess in its own scratch directory inside `working_path` and parses
+  its trace into progress events while it runs. At most `concurrency` solves
+  run at the same time, the others wait for a free slot.
+
+  Parameters
+  ----------
+  concurrency: int
+    Maximum number of concurrent solver processes. By default, the number of
+    CPUs.
+  pkg: str
+    ROS package where the solver is available
+  rosnode: str
+    ROS node of the solver
+  working_path: str
+    Path where the scratch directories of the solves are created
+  """
+  def __init__(self, concurrency=None, pkg='lkh_solver', rosnode='lkh_solver',
+                                                    working_path='/tmp/lkh'):
+    if concurrency is None:
+      concurrency = multiprocessing.cpu_count()
+    self.concurrency = concurrency
+    self.pkg = pkg
+    self.rosnode = rosnode
+    self.working_path = working_path
+    self._semaphore = None
+
+  def _get_semaphore(self):
+    # Created lazily so that it belongs to the running event loop
+    if self._semaphore is None:
+      self._semaphore = asyncio.Semaphore(self.concurrency)
+    return self._semaphore
+
+  async def events(self, problem_file, params, timeout=None, **kwargs):
+    """
+    Solve a problem and yield its progress events as they are printed by the
+    solver. The last event contains the result.
+
+    Cancelling the task that iterates over the events (or closing the
+    iterator) kills the solver.
+
+    Parameters
+    ----------
+    problem_file: str
+      The problem file using the TSPLIB format
+    params: SolverParameters
+      Parameters to be pased to the LKH solver. A `trace_level` of 0 is raised
+      to 1 because the events are parsed from the trace.
+    timeout: float
+      Hard wall-clock budget in seconds, measured once the solve gets a free
+      slot. See :func:`solver.lkh_solver`.
+    kwargs:
+      Additional arguments passed to :func:`solver.lkh_solver`: `pi_cache`,
+      `pi_file`, `merge_tour_files`, `initial_tour_file`, `input_tour_file`,
+      `candidate_files`, `candidate_cache` and `exact_threshold`. A problem
+      solved exactly only yields the result event.
+
+    Returns
+    -------
+    events: async iterator
+      Yields the events returned by :func:`parser.parse_trace_line`. The
+      `'trial'` events also include the `run`. The last event is
+      `{'event': 'result', 'tour': tour, 'info': info}`, see
+      :func:`solver.lkh_solver` for details about `tour` and `info`.
+    """
+    exact_threshold = kwargs.pop('exact_threshold', None)
+    if kwargs.get('pi_file') is None and not kwargs.get('candidate_files'):
+      # Held-Karp may take a while, do not block the event loop
+      loop = asyncio.get_event_loop()
+      result = await loop.run_in_executor(None, solver._solve_exact,
+                                      problem_file, exact_threshold, timeout)
+      if result is not None:
+        yield dict(event='result', tour=result[0], info=result[1])
+        return
+    if params.trace_level < 1:
+      params = copy.copy(params)
+      params.trace_level = 1
+    async with self._get_semaphore():
+      if not os.path.isdir(self.working_path):
+        os.makedirs(self.working_path, exist_ok=True)
+      job_path = tempfile.mkdtemp(prefix='async_', dir=self.working_path)
+      process = None
+      stderr_task = None
+      try:
+        job = solver._prepare_solve(problem_file, params, job_path,
+                                              timeout=timeout, **kwargs)
+        monitor = solver._TraceMonitor()
+        process = await asyncio.create_subprocess_exec('rosrun', self.pkg,
+                      self.rosnode, job['basename']+'.par', cwd=job_path,
+                      stdout=asyncio.subprocess.PIPE,
+                      stderr=asyncio.subprocess.PIPE)
+        monitor.pid = process.pid
+        stderr_task = asyncio.ensure_future(process.stderr.read())
+        deadline = None
+        if timeout is not None:
+          deadline = job['starttime'] + timeout
+        timed_out = False
+        run = 1
+        while True:
+          try:
+            if deadline is None:
+              line = await process.stdout.readline()
+            else:
+              line = await asyncio.wait_for(process.stdout.readline(),
+                                            max(0., deadline - time.time()))
+          except asyncio.TimeoutError:
+            timed_out = True
+            process.kill()
+            break
+          if not line:
+            monitor.sample()
+            break
+          line = monitor.append(line.decode(errors='replace'))
+          event = parser.parse_trace_line(line)
+          if event is None:
+            continue
+          if event['event'] == 'trial':
+            event['run'] = run
+          elif event['event'] == 'run':
+            run = event['run'] + 1
+          yield event
+        await process.wait()
+        stderr = (await stderr_task).decode(errors='replace')
+        tour, info = solver._finish_solve(job, process.returncode,
+                    ''.join(monitor.lines), stderr, timed_out, monitor=monitor)
+        process = None
+        yield dict(event='result', tour=tour, info=info)
+      finally:
+        if process is not None and process.returncode is None:
+          # Cancelled or closed before the solver finished
+          process.kill()
+          await process.wait()
+        if stderr_task is not None and not stderr_task.done():
+          stderr_task.cancel()
+        shutil.rmtree(job_path, ignore_errors=True)
+
+  async def solve(self, problem_file, params, progress=None, **kwargs):
+    """
+    Solve a problem without blocking the event loop.
+
+    Parameters
+    ----------
+    problem_file: str
+      The problem file using the TSPLIB format
+    params: SolverParameters
+      Parameters to be pased to the LKH solver. See
+      :class:`solver.SolverParameters` for details.
+    progress: callable
+      If given, it is called with every progress event. See :meth:`events`.
+    kwargs:
+      Additional arguments passed to :meth:`events`
+
+    Returns
+    -------
+    tour: list
+      The near-optimal tour found using the LKH heuristics.
+    info: dict
+      Extra information about the solver call. See :func:`solver.lkh_solver`.
+    """
+    result = None
+    events = self.events(problem_file, params, **kwargs)
+    try:
+      async for event in events:
+        if event['event'] == 'result':
+          result = event
+        elif progress is not None:
+          progress(event)
+    finally:
+      await events.aclose()
+    return result['tour'], result['info']
@@ -0,0 +1,340 @@
+#! /usr/bin/env python
+"""
+Benchmark of the LKH (and GLKH) solvers over the bundled TSPLIB/GTSPLIB
+instances and synthetic instances, with regression tracking against a stored
+baseline.
+"""
+import os
+import copy
+import json
+import time
+import platform
+import numpy as np
+from subprocess import Popen, PIPE, STDOUT
+# Own modules
+from . import evaluate
+from . import parser
+from . import solver
+
+
+# Optimal tour lengths of the bundled TSPLIB and GTSPLIB instances
+OPTIMA = {'berlin52': 7542, 'burma14': 3323, 'dantzig42': 699, 'eil51': 426,
+          'hk48': 11461, '3burma14': 1805, '4gr17': 1309, '5gr21': 1740,
+          '5ulysses22': 5307}
+
+# Metrics compared against the baseline and whether they are times
+METRICS = (('wall_time', True), ('startup_time', True),
+          ('time_to_best', True), ('peak_rss_mb', False), ('cost', False))
+
+def bundled_instances():
+  """
+  List the instances bundled with the `lkh_solver` (`tsplib/*.tsp`) and
+  `glkh_solver` (`gtsplib/*.gtsp`) packages. The packages are located using
+  `resource_retriever`. Missing packages are skipped.
+
+  Returns
+  -------
+  instances: list
+    One dictionary per instance with the `name`, `problem_file`, `pkg`,
+    `rosnode` and `optimum` (`None` if unknown)
+  """
+  import resource_retriever
+  instances = []
+  for pkg, folder, extension in [('lkh_solver', 'tsplib', '.tsp'),
+                                  ('glkh_solver', 'gtsplib', '.gtsp')]:
+    try:
+      path = resource_retriever.get_filename('package://{}/{}'.format(pkg,
+                                                folder), use_protocol=False)
+    except Exception:
+      continue
+    if not os.path.isdir(path):
+      continue
+    for filename in sorted(os.listdir(path)):
+      if not filename.endswith(extension):
+        continue
+      name = os.path.splitext(filename)[0]
+      instances.append(dict(name=name, pkg=pkg, rosnode=pkg,
+                    problem_file=os.path.join(path, filename),
+                    optimum=OPTIMA.get(name)))
+  return instances
+
+def synthetic_coords(n, distribution='uniform', seed=1, clusters=None):
+  """
+  Generate random points in the square `[0, 1e6)^2`.
+
+  Parameters
+  ----------
+  n: int
+    Number of points
+  distribution: str
+    `'uniform'` or `'clustered'`. Clustered points are normally distributed
+    around uniformly distributed centers.
+  seed: int
+    Seed of the random generator
+  clusters: int
+    Number of centers of the clustered distribution. By default, `n // 100`
+    (at least 1).
+
+  Returns
+  -------
+  coords: array
+    Array of shape `(n, 2)` with integer coordinates
+  """
+  side = 1e6
+  rng = np.random.RandomState(seed)
+  if distribution == 'uniform':
+    coords = rng.uniform(0, side, (n, 2))
+  elif distribution == 'clustered':
+    if clusters is None:
+      clusters = max(1, n // 100)
+    centers = rng.uniform(0, side, (clusters, 2))
+    labels = rng.randint(0, clusters, n)
+    spread = side / np.sqrt(clusters) / 10
+    coords = np.clip(centers[labels] + rng.normal(0, spread, (n, 2)), 0,
+                                                                    side-1)
+  else:
+    raise ValueError('Unknown distribution: {}'.format(distribution))
+  return np.floor(coords).astype(int)
+
+def synthetic_instances(sizes, distributions=('uniform', 'clustered'), seed=1,
+                                          path='/tmp/lkh/benchmark/instances'):
+  """
+  Write synthetic `EUC_2D` instances (see :func:`synthetic_coords`). Files
+  that already exist are reused because the instances are deterministic.
+
+  Parameters
+  ----------
+  sizes: list
+    Number of nodes of the instances
+  distributions: list
+    Distributions of the points
+  seed: int
+    Seed of the random generator
+  path: str
+    Directory where the problem files are written
+
+  Returns
+  -------
+  instances: list
+    One dictionary per instance (see :func:`bundled_instances`)
+  """
+  if not os.path.isdir(path):
+    os.makedirs(path)
+  instances = []
+  for distribution in distributions:
+    for n in sizes:
+      name = '{}{}s{}'.format(distribution, n, seed)
+      problem_file = os.path.join(path, name+'.tsp')
+      if not os.path.isfile(problem_file):
+        coords = synthetic_coords(n, distribution, seed)
+        parser.write_tsplib_problem(problem_file, coords=coords, name=name)
+      instances.append(dict(name=name, problem_file=problem_file,
+              pkg='lkh_solver', rosnode='lkh_solver', optimum=None))
+  return instances
+
+def _dimension(problem_file):
+  # Read the DIMENSION from the specification part only
+  return parser.read_tsplib_header(problem_file).get('DIMENSION')
+
+def run_instance(problem_file, params, pkg='lkh_solver', rosnode='lkh_solver',
+                          working_path='/tmp/lkh/benchmark', optimum=None):
+  """
+  Solve an instance and measure it. The trace of the solver is parsed while
+  it runs, therefore `trace_level` is raised to 1 if needed.
+
+  Parameters
+  ----------
+  problem_file: str
+    The problem file using the TSPLIB format
+  params: SolverParameters
+    Parameters to be pased to the solver
+  pkg: str
+    ROS package where the solver is available
+  rosnode: str
+    ROS node of the solver
+  working_path: str
+    Path where the intermediate files are written
+  optimum: int
+    Optimal tour length, used to compute the gap
+
+  Returns
+  -------
+  result: dict
+    The measurements: `wall_time` (seconds from launching the solver until
+    it exits), `startup_time` (until its first output line, i.e. process
+    startup and ROS path resolution), `ascent_time` (as reported by the
+    solver, `None` if not reported), `time_to_best` (until the final cost
+    was first reported), `cost`, `gap` (percent, `None` without `optimum`),
+    `peak_rss_mb` (peak resident memory of the solver process) and
+    `returncode`. The phases are measured as in :func:`solver.lkh_solver`.
+  """
+  if params.trace_level < 1:
+    params = copy.copy(params)
+    params.trace_level = 1
+  job = solver._prepare_solve(problem_file, params, working_path)
+  monitor = solver._TraceMonitor()
+  process = Popen(['rosrun', pkg, rosnode, job['basename']+'.par'],
+                      cwd=working_path, stdout=PIPE, stderr=STDOUT)
+  monitor.pid = process.pid
+  for line in iter(process.stdout.readline, b''):
+    monitor.append(line.decode(errors='replace'))
+  monitor.sample()
+  process.wait()
+  process.stdout.close()
+  tour, info = solver._finish_solve(job, process.returncode,
+                                ''.join(monitor.lines), '', monitor=monitor)
+  cost = info['cost']
+  timings = info['timings']
+  time_to_best = timings['solver']
+  if cost is not None:
+    for event in info['trace']['events']:
+      if event.get('cost', cost+1) <= cost:
+        time_to_best = event['elapsed']
+        break
+  gap = None
+  if cost is not None and optimum:
+    gap = float(evaluate.gap(cost, optimum))
+  result = dict(wall_time=timings['solver'], startup_time=timings['startup'],
+                ascent_time=timings['ascent'], time_to_best=time_to_best,
+                cost=cost, gap=gap, peak_rss_mb=info['peak_rss_mb'],
+                returncode=process.returncode)
+  return result
+
+def run_benchmark(instances, params=None, preset='fast', seed=1,
+                          working_path='/tmp/lkh/benchmark', callback=None):
+  """
+  Run the benchmark over the given instances.
+
+  Parameters
+  ----------
+  instances: list
+    Instances as returned by :func:`bundled_instances` or
+    :func:`synthetic_instances`
+  params: SolverParameters
+    Parameters used for every instance. If `None`, the given `preset` is
+    used for each instance (see :meth:`SolverParameters.preset`).
+  preset: str
+    Name of the preset used when `params` is `None`
+  seed: int
+    Seed of the solver
+  working_path: str
+    Path where the intermediate files are written
+  callback: callable
+    If given, it is called with the `name` and the result of each instance
+    as soon as it finishes
+
+  Returns
+  -------
+  results: dict
+    `instances` maps the name of each instance to its result (see
+    :func:`run_instance`) plus its `dimension`. The other keys describe the
+    environment of the run.
+  """
+  results = dict(timestamp=time.time(), host=platform.node(),
+                  python=platform.python_version(), preset=preset, seed=seed,
+                  instances=dict())
+  for instance in instances:
+    problem_file = instance['problem_file']
+    dimension = _dimension(problem_file)
+    if params is None:
+      instance_params = solver.SolverParameters.preset(preset, dimension)
+    else:
+      instance_params = copy.copy(params)
+    instance_params.seed = seed
+    result = run_instance(problem_file, instance_params, instance['pkg'],
+                instance['rosnode'], working_path, instance.get('optimum'))
+    result['dimension'] = dimension
+    results['instances'][instance['name']] = result
+    if callback is not None:
+      callback(instance['name'], result)
+  return results
+
+def save_results(filename, results):
+  """
+  Save benchmark results (or a baseline) as JSON.
+
+  Parameters
+  ----------
+  filename: str
+    Path of the JSON file
+  results: dict
+    Results returned by :func:`run_benchmark`
+  """
+  with open(filename, 'w') as f:
+    json.dump(results, f, indent=2, sort_keys=True)
+    f.write('\n')
+
+def load_results(filename):
+  """
+  Load benchmark results (or a baseline) saved by :func:`save_results`.
+
+  Parameters
+  ----------
+  filename: str
+    Path of the JSON file
+
+  Returns
+  -------
+  results: dict
+    The results
+  """
+  with open(filename, 'r') as f:
+    return json.load(f)
+
+def compare(results, baseline, time_tolerance=0.25, min_time=0.05,
+                                      rss_tolerance=0.25, cost_tolerance=0.):
+  """
+  Compare benchmark results against a baseline. Times are noisy, therefore a
+  time only regresses if it exceeds the baseline by more than
+  `time_tolerance` (relative) and by more than `min_time` (seconds).
+
+  Parameters
+  ----------
+  results: dict
+    Results returned by :func:`run_benchmark`
+  baseline: dict
+    Baseline results. Only the instances present in both are compared.
+  time_tolerance: float
+    Allowed relative increase of the times
+  min_time: float
+    Allowed absolute increase of the times (seconds)
+  rss_tolerance: float
+    Allowed relative increase of the peak memory
+  cost_tolerance: float
+    Allowed relative increase of the cost. The solver runs with a fixed seed,
+    therefore the cost is deterministic for a given build.
+
+  Returns
+  -------
+  regressions: list
+    One dictionary per regression with the `instance`, the `metric`, and
+    the `baseline` and current `value`. A failed solve is reported with the
+    metric `'returncode'`.
+  """
+  regressions = []
+  for name in sorted(results['instances']):
+    if name not in baseline['instances']:
+      continue
+    current = results['instances'][name]
+    reference = baseline['instances'][name]
+    if current['returncode'] != 0 or current['cost'] is None:
+      regressions.append(dict(instance=name, metric='returncode',
+                          baseline=reference['returncode'],
+                          value=current['returncode']))
+      continue
+    for metric, is_time in METRICS:
+      value = current.get(metric)
+      reference_value = reference.get(metric)
+      if value is None or reference_value is None:
+        continue
+      if is_time:
+        regressed = (value > reference_value * (1 + time_tolerance) and
+                    value - reference_value > min_time)
+      elif metric == 'cost':
+        regressed = value > reference_value * (1 + cost_tolerance)
+      else:
+        regressed = value > reference_value * (1 + rss_tolerance)
+      if regressed:
+        regressions.append(dict(instance=name, metric=metric,
+                            baseline=reference_value, value=value))
+  return regressions
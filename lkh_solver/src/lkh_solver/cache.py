@@ -0,0 +1,585 @@
+#! /usr/bin/env python
+import os
+import json
+import time
+import errno
+import shutil
+import hashlib
+import tempfile
+import threading
+import collections
+import numpy as np
+
+
+def hash_file(filename, hasher=None, blocksize=1<<20):
+  """
+  Feed the content of a file into a hash object.
+
+  Parameters
+  ----------
+  filename: str
+    Path to the file
+  hasher: hashlib object
+    Hash object to be updated. If `None`, a new `sha1` object is created.
+  blocksize: int
+    Number of bytes read at a time
+
+  Returns
+  -------
+  hasher: hashlib object
+    The updated hash object
+  """
+  if hasher is None:
+    hasher = hashlib.sha1()
+  with open(filename, 'rb') as f:
+    while True:
+      block = f.read(blocksize)
+      if not block:
+        break
+      hasher.update(block)
+  return hasher
+
+def parameters_digest(params, names, hasher=None):
+  """
+  Feed the given parameters into a hash object. The parameters are hashed in
+  the order given by `names` using their `repr`.
+
+  Parameters
+  ----------
+  params: SolverParameters
+    The solver parameters
+  names: list
+    Names of the attributes of `params` to be hashed
+  hasher: hashlib object
+    Hash object to be updated. If `None`, a new `sha1` object is created.
+
+  Returns
+  -------
+  hasher: hashlib object
+    The updated hash object
+  """
+  if hasher is None:
+    hasher = hashlib.sha1()
+  for name in names:
+    hasher.update('{0}={1!r};'.format(name, getattr(params, name)).encode())
+  return hasher
+
+
+class FileCache(object):
+  """
+  Size-bounded on-disk cache. Every entry is stored as a single file named
+  after its key. When the total size exceeds `max_size` the least recently
+  used entries are evicted. The file modification time is used to track the
+  last access, therefore the cache can be shared between processes.
+
+  Parameters
+  ----------
+  path: str
+    Directory where the cache entries are stored
+  max_size: int
+    Maximum size of the cache in bytes
+  suffix: str
+    Extension of the cache entries
+  """
+  def __init__(self, path, max_size=256*2**20, suffix=''):
+    self.path = os.path.abspath(os.path.expanduser(path))
+    self.max_size = int(max_size)
+    self.suffix = suffix
+    self.hits = 0
+    self.misses = 0
+    if not os.path.isdir(self.path):
+      try:
+        os.makedirs(self.path)
+      except OSError as e:
+        if e.errno != errno.EEXIST:
+          raise OSError('Failed to create: {}'.format(self.path))
+
+  def _entries(self):
+    entries = []
+    for name in os.listdir(self.path):
+      if not name.endswith(self.suffix) or name.startswith('.'):
+        continue
+      filename = os.path.join(self.path, name)
+      try:
+        stat = os.stat(filename)
+      except OSError:
+        # Removed by a concurrent process
+        continue
+      entries.append((stat.st_mtime, stat.st_size, filename))
+    return entries
+
+  def filename(self, key):
+    """
+    Return the path of the cache entry for the given `key`. The file may not
+    exist.
+    """
+    return os.path.join(self.path, key+self.suffix)
+
+  def get(self, key):
+    """
+    Look up the given `key`. The access time of the entry is refreshed.
+
+    Parameters
+    ----------
+    key: str
+      The cache key
+
+    Returns
+    -------
+    filename: str
+      Path to the cache entry or `None` if the key is not cached.
+    """
+    filename = self.filename(key)
+    try:
+      os.utime(filename, None)
+    except OSError:
+      self.misses += 1
+      return None
+    self.hits += 1
+    return filename
+
+  def fetch(self, key, dst):
+    """
+    Copy the entry for the given `key` into `dst`. A hard link is used when
+    possible.
+
+    Parameters
+    ----------
+    key: str
+      The cache key
+    dst: str
+      Destination path
+
+    Returns
+    -------
+    found: bool
+      `True` if the key was cached and copied. `False` otherwise.
+    """
+    filename = self.get(key)
+    if filename is None:
+      return False
+    if os.path.lexists(dst):
+      os.remove(dst)
+    try:
+      os.link(filename, dst)
+    except OSError:
+      try:
+        shutil.copyfile(filename, dst)
+      except (IOError, OSError):
+        # Evicted by a concurrent process
+        self.hits -= 1
+        self.misses += 1
+        return False
+    return True
+
+  def put(self, key, src, move=False):
+    """
+    Store the file `src` under the given `key`. The entry is written
+    atomically so that concurrent readers never see a partial file.
+
+    Parameters
+    ----------
+    key: str
+      The cache key
+    src: str
+      Path to the file to be stored
+    move: bool
+      If set, `src` is removed after being stored
+
+    Returns
+    -------
+    filename: str
+      Path to the cache entry
+    """
+    fd, tmp_filename = tempfile.mkstemp(dir=self.path, prefix='.')
+    os.close(fd)
+    try:
+      shutil.copyfile(src, tmp_filename)
+      filename = self.filename(key)
+      os.rename(tmp_filename, filename)
+    except:
+      if os.path.exists(tmp_filename):
+        os.remove(tmp_filename)
+      raise
+    if move:
+      os.remove(src)
+    self.evict()
+    return filename
+
+  def remove(self, key):
+    """
+    Invalidate the entry for the given `key`.
+
+    Parameters
+    ----------
+    key: str
+      The cache key
+
+    Returns
+    -------
+    removed: bool
+      `True` if the entry existed and was removed
+    """
+    try:
+      os.remove(self.filename(key))
+    except OSError:
+      return False
+    return True
+
+  def evict(self):
+    """
+    Remove the least recently used entries until the size of the cache is
+    below `max_size`.
+    """
+    entries = sorted(self._entries())
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, filename in entries:
+      if total_size <= self.max_size:
+        break
+      try:
+        os.remove(filename)
+      except OSError:
+        pass
+      total_size -= size
+
+  def clear(self):
+    """
+    Remove all the entries of the cache.
+    """
+    for _, _, filename in self._entries():
+      try:
+        os.remove(filename)
+      except OSError:
+        pass
+
+  def size(self):
+    """
+    Return the total size in bytes of the entries of the cache.
+    """
+    return sum(size for _, size, _ in self._entries())
+
+  def stats(self):
+    """
+    Return a dict with the number of `hits`, `misses`, `entries` and the total
+    `size` in bytes of the cache.
+    """
+    entries = self._entries()
+    stats = dict()
+    stats['hits'] = self.hits
+    stats['misses'] = self.misses
+    stats['entries'] = len(entries)
+    stats['size'] = sum(size for _, size, _ in entries)
+    return stats
+
+
+class PenaltyCache(FileCache):
+  """
+  Cache of the penalties (Pi-values) computed by the subgradient ascent of
+  LKH. The entries are keyed by the content of the problem file and the
+  parameters that affect the ascent. See :func:`solver.lkh_solver`.
+
+  Parameters
+  ----------
+  path: str
+    Directory where the `.pi` files are stored
+  max_size: int
+    Maximum size of the cache in bytes
+  """
+  keywords = ('ascent_candidates', 'candidate_set_type', 'extra_candidates',
+              'extra_candidates_symmetric', 'extra_candidate_set_type',
+              'initial_period', 'initial_step_size', 'max_candidates',
+              'optimum', 'precision', 'subgradient')
+  """Names of the :class:`SolverParameters` that affect the Pi-values. The
+  `optimum` bounds the alpha-values of the ascent candidates and the
+  `max_candidates` and extra candidates select them"""
+
+  def __init__(self, path='~/.cache/lkh/pi', max_size=256*2**20):
+    super(PenaltyCache, self).__init__(path, max_size, suffix='.pi')
+
+  def key(self, problem_file, params):
+    """
+    Compute the cache key of a problem.
+
+    Parameters
+    ----------
+    problem_file: str
+      Path to the problem file
+    params: SolverParameters
+      The solver parameters
+
+    Returns
+    -------
+    key: str
+      Hexadecimal digest of the problem content and the ascent parameters
+    """
+    hasher = hash_file(problem_file)
+    parameters_digest(params, self.keywords, hasher)
+    return hasher.hexdigest()
+
+
+class CandidateCache(FileCache):
+  """
+  Cache of the candidate sets created by LKH (`CANDIDATE_FILE`). The entries
+  are keyed by the content of the problem file, the tour files whose edges
+  are added to the candidate sets and the parameters that affect the
+  candidate sets. Reading the candidate sets skips their generation. Used
+  together with a :class:`PenaltyCache`, the whole preprocessing is skipped.
+  See :func:`solver.lkh_solver`.
+
+  Parameters
+  ----------
+  path: str
+    Directory where the `.cand` files are stored
+  max_size: int
+    Maximum size of the cache in bytes
+  """
+  keywords = PenaltyCache.keywords + ('excess', 'max_candidates_symmetric')
+  """Names of the :class:`SolverParameters` that affect the candidate sets"""
+
+  def __init__(self, path='~/.cache/lkh/cand', max_size=256*2**20):
+    super(CandidateCache, self).__init__(path, max_size, suffix='.cand')
+
+  def key(self, problem_file, params, tour_files=()):
+    """
+    Compute the cache key of a problem.
+
+    Parameters
+    ----------
+    problem_file: str
+      Path to the problem file
+    params: SolverParameters
+      The solver parameters
+    tour_files: list
+      Paths of the tour files whose edges are added to the candidate sets
+      (initial, input and merge tours)
+
+    Returns
+    -------
+    key: str
+      Hexadecimal digest of the problem and tours content and the candidate
+      parameters
+    """
+    hasher = hash_file(problem_file)
+    for tour_file in tour_files:
+      hash_file(tour_file, hasher)
+    parameters_digest(params, self.keywords, hasher)
+    return hasher.hexdigest()
+
+
+class ResultCache(FileCache):
+  """
+  Cache of the results of :func:`solver.lkh_solver`, so that identical
+  requests (same problem content, parameters, including the `seed`, and
+  input files) do not run the solver again. It has two tiers: an in-memory
+  LRU of up to `max_entries` results, private to the process, and the files
+  of the :class:`FileCache`, shared between processes. Results older than
+  `ttl` seconds are discarded when they are looked up.
+
+  Only complete solves are stored, i.e. not the ones that were killed by
+  their `timeout`. Note that solves limited by `time_limit` may not be
+  deterministic.
+
+  Parameters
+  ----------
+  path: str
+    Directory where the results are stored
+  max_size: int
+    Maximum size of the on-disk cache in bytes
+  max_entries: int
+    Maximum number of results kept in memory. If 0, the in-memory tier is
+    disabled.
+  ttl: float
+    Time to live of the results in seconds. If `None`, they do not expire.
+  """
+  def __init__(self, path='~/.cache/lkh/results', max_size=256*2**20,
+                                                  max_entries=1024, ttl=None):
+    super(ResultCache, self).__init__(path, max_size, suffix='.json')
+    self.max_entries = int(max_entries)
+    self.ttl = ttl
+    self.memory_hits = 0
+    self._memory = collections.OrderedDict()
+    self._digests = dict()
+    self._lock = threading.Lock()
+
+  def __getstate__(self):
+    # The in-memory tier is private to every process
+    state = self.__dict__.copy()
+    state['_memory'] = collections.OrderedDict()
+    del state['_lock']
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._lock = threading.Lock()
+
+  def _file_digest(self, filename):
+    # Content digest of a file, re-computed only if the file changed
+    stat = os.stat(filename)
+    signature = (os.path.abspath(filename), stat.st_mtime, stat.st_size)
+    digest = self._digests.get(signature)
+    if digest is None:
+      digest = hash_file(filename).hexdigest()
+      if len(self._digests) >= 4*max(1, self.max_entries):
+        self._digests.clear()
+      self._digests[signature] = digest
+    return digest
+
+  def key(self, problem_file, params, files=(), **extra):
+    """
+    Compute the cache key of a solve request.
+
+    Parameters
+    ----------
+    problem_file: str
+      Path to the problem file
+    params: SolverParameters
+      The solver parameters. All the parameters that have been set are
+      hashed.
+    files: list
+      Paths of other input files (e.g. tours) whose content is hashed
+    extra:
+      Other values that identify the request (e.g. the solver node), hashed
+      using their `repr`
+
+    Returns
+    -------
+    key: str
+      Hexadecimal digest of the request
+    """
+    hasher = hashlib.sha1()
+    for filename in [problem_file] + list(files):
+      hasher.update(self._file_digest(filename).encode())
+    hasher.update(repr(params.keywords()).encode())
+    hasher.update(repr(sorted(extra.items())).encode())
+    return hasher.hexdigest()
+
+  def _expired(self, created):
+    return self.ttl is not None and time.time() - created > self.ttl
+
+  def lookup(self, key):
+    """
+    Look up the result of a request.
+
+    Parameters
+    ----------
+    key: str
+      The cache key
+
+    Returns
+    -------
+    result: tuple
+      `(tour, info)` as stored by :meth:`store` or `None` if the key is not
+      cached or its result expired. A copy of the tour is returned.
+    """
+    with self._lock:
+      entry = self._memory.get(key)
+      if entry is not None:
+        if not self._expired(entry['created']):
+          # Most recently used (Python 2 lacks move_to_end)
+          self._memory[key] = self._memory.pop(key)
+          self.hits += 1
+          self.memory_hits += 1
+          return self._result(entry)
+        del self._memory[key]
+    filename = self.get(key)
+    entry = None
+    if filename is not None:
+      try:
+        with open(filename, 'r') as f:
+          entry = json.load(f)
+      except (IOError, OSError, ValueError):
+        # Evicted by a concurrent process
+        entry = None
+      if entry is not None and self._expired(entry['created']):
+        self.remove(key)
+        entry = None
+      if entry is None:
+        self.hits -= 1
+        self.misses += 1
+        return None
+      self._remember(key, entry)
+      return self._result(entry)
+    return None
+
+  def _remember(self, key, entry):
+    if self.max_entries <= 0:
+      return
+    with self._lock:
+      self._memory[key] = entry
+      while len(self._memory) > self.max_entries:
+        self._memory.popitem(last=False)
+
+  def _result(self, entry):
+    tour = None
+    if entry['tour'] is not None:
+      tour = (np.array(entry['tour'], dtype=int), dict(entry['tour_info']))
+    return tour, dict(entry['info'])
+
+  def store(self, key, tour, info):
+    """
+    Store the result of a request in both tiers.
+
+    Parameters
+    ----------
+    key: str
+      The cache key
+    tour: tuple
+      The tour returned by :func:`solver.lkh_solver`
+    info: dict
+      The info returned by :func:`solver.lkh_solver`. Only the `cost` and the
+      `cpu_time` (stored as `solve_time`) are kept.
+    """
+    entry = dict(created=time.time(), tour=None, tour_info=None,
+                  info=dict(cost=info.get('cost'),
+                            solve_time=info.get('cpu_time')))
+    if tour is not None:
+      entry['tour'] = np.asarray(tour[0]).tolist()
+      entry['tour_info'] = tour[1]
+    self._remember(key, entry)
+    fd, tmp_filename = tempfile.mkstemp(dir=self.path, prefix='.')
+    try:
+      with os.fdopen(fd, 'w') as f:
+        json.dump(entry, f)
+      os.rename(tmp_filename, self.filename(key))
+    except:
+      if os.path.exists(tmp_filename):
+        os.remove(tmp_filename)
+      raise
+    self.evict()
+
+  def clear(self):
+    """
+    Remove all the entries of the cache (both tiers).
+    """
+    with self._lock:
+      self._memory.clear()
+    super(ResultCache, self).clear()
+
+  def remove(self, key):
+    """
+    Invalidate the entry for the given `key` (both tiers).
+
+    Parameters
+    ----------
+    key: str
+      The cache key
+
+    Returns
+    -------
+    removed: bool
+      `True` if the entry existed on disk and was removed
+    """
+    with self._lock:
+      self._memory.pop(key, None)
+    return super(ResultCache, self).remove(key)
+
+  def stats(self):
+    """
+    Return a dict with the number of `hits` (of both tiers), `memory_hits`,
+    `misses`, `entries` and the total `size` in bytes of the on-disk cache,
+    and the number of `memory_entries`.
+    """
+    stats = super(ResultCache, self).stats()
+    stats['memory_hits'] = self.memory_hits
+    stats['memory_entries'] = len(self._memory)
+    return stats
@@ -0,0 +1,385 @@
+#! /usr/bin/env python
+"""
+Vectorized evaluation of tours: their cost using the distance functions of
+LKH (`Distance.c`), their validity and their gap to a known optimum. Tours
+are evaluated in batches without a Python loop per node or per tour.
+"""
+import numpy as np
+# Own modules
+from . import parser
+
+
+def _degrees(x):
+  # TSPLIB GEO coordinates are DDD.MM (degrees and minutes)
+  deg = np.trunc(x)
+  return deg + 5.0 * (x - deg) / 3.0
+
+def _geo_radians(x):
+  return 3.141592 * _degrees(x) / 180.0
+
+def _geo(p, q):
+  lat_p, lon_p = _geo_radians(p[...,0]), _geo_radians(p[...,1])
+  lat_q, lon_q = _geo_radians(q[...,0]), _geo_radians(q[...,1])
+  q1 = np.cos(lon_p - lon_q)
+  q2 = np.cos(lat_p - lat_q)
+  q3 = np.cos(lat_p + lat_q)
+  d = 6378.388 * np.arccos(np.clip(0.5 * ((1.0 + q1) * q2 - (1.0 - q1) * q3),
+                                                                -1., 1.)) + 1.
+  return np.trunc(d)
+
+def _geom(p, q):
+  lat_p, lon_p = np.pi * (p[...,0] / 180.0), np.pi * (p[...,1] / 180.0)
+  lat_q, lon_q = np.pi * (q[...,0] / 180.0), np.pi * (q[...,1] / 180.0)
+  q1 = np.cos(lat_q) * np.sin(lon_p - lon_q)
+  q3 = np.sin((lon_p - lon_q) / 2.0)
+  q4 = np.cos((lon_p - lon_q) / 2.0)
+  q2 = np.sin(lat_p + lat_q) * q3 * q3 - np.sin(lat_p - lat_q) * q4 * q4
+  q5 = np.cos(lat_p - lat_q) * q4 * q4 - np.cos(lat_p + lat_q) * q3 * q3
+  d = 6378388.0 * np.arctan2(np.sqrt(q1 * q1 + q2 * q2), q5) + 1.0
+  return np.trunc(d)
+
+def _meeus(lat1, lon1, lat2, lon2):
+  # Andoyer's method as described by Meeus (kilometers)
+  a = 6378.137
+  fl = 1 / 298.257
+  sg = np.sin((lat1 - lat2) / 2)**2
+  sl = np.sin((lon1 - lon2) / 2)**2
+  sf = np.sin((lat1 + lat2) / 2)**2
+  s = sg * (1 - sl) + (1 - sf) * sl
+  c = (1 - sg) * (1 - sl) + sf * sl
+  same = (lat1 == lat2) & (lon1 == lon2)
+  # Avoid the division by zero of identical points
+  s = np.where(same, 1., s)
+  w = np.arctan(np.sqrt(s / c))
+  r = np.sqrt(s * c) / w
+  h1 = (3 * r - 1) / 2 / c
+  h2 = (3 * r + 1) / 2 / s
+  d = 2 * w * a * (1 + fl * (h1 * sf * (1 - sg) - h2 * (1 - sf) * sg))
+  return np.where(same, 0., d)
+
+def _geo_meeus(p, q):
+  d = _meeus(np.pi * _degrees(p[...,0]) / 180, np.pi * _degrees(p[...,1]) / 180,
+             np.pi * _degrees(q[...,0]) / 180, np.pi * _degrees(q[...,1]) / 180)
+  return np.trunc(d + 0.5)
+
+def _geom_meeus(p, q):
+  d = _meeus(np.pi * (p[...,0] / 180), np.pi * (p[...,1] / 180),
+             np.pi * (q[...,0] / 180), np.pi * (q[...,1] / 180))
+  return np.trunc(1000 * d + 0.5)
+
+def _xray(scales):
+  def distance(p, q):
+    dp = np.abs(p[...,0] - q[...,0])
+    dp = np.minimum(dp, np.abs(dp - 360))
+    cost = np.maximum(dp / scales[0], np.maximum(
+                                  np.abs(p[...,1] - q[...,1]) / scales[1],
+                                  np.abs(p[...,2] - q[...,2]) / scales[2]))
+    return np.trunc(100 * cost + 0.5)
+  return distance
+
+def _euclidean(p, q):
+  return np.sqrt(np.sum((p - q)**2, axis=-1))
+
+# Distance functions of LKH by EDGE_WEIGHT_TYPE. They are applied to arrays
+# of points whose last axis holds the coordinates
+_DISTANCES = {
+  'ATT': lambda p, q: np.ceil(np.sqrt(np.sum((p - q)**2, axis=-1) / 10.0)),
+  'CEIL_2D': lambda p, q: np.ceil(_euclidean(p, q)),
+  'CEIL_3D': lambda p, q: np.ceil(_euclidean(p, q)),
+  'EUC_2D': lambda p, q: np.trunc(_euclidean(p, q) + 0.5),
+  'EUC_3D': lambda p, q: np.trunc(_euclidean(p, q) + 0.5),
+  'GEO': _geo,
+  'GEOM': _geom,
+  'GEO_MEEUS': _geo_meeus,
+  'GEOM_MEEUS': _geom_meeus,
+  'MAN_2D': lambda p, q: np.trunc(np.sum(np.abs(p - q), axis=-1) + 0.5),
+  'MAN_3D': lambda p, q: np.trunc(np.sum(np.abs(p - q), axis=-1) + 0.5),
+  'MAX_2D': lambda p, q: np.max(np.trunc(np.abs(p - q) + 0.5), axis=-1),
+  'MAX_3D': lambda p, q: np.max(np.trunc(np.abs(p - q) + 0.5), axis=-1),
+  'XRAY1': _xray((1., 1., 1.)),
+  'XRAY2': _xray((1.25, 1.5, 1.15)),
+}
+# The EDGE_WEIGHT_TYPEs given by coordinates that are supported
+EDGE_WEIGHT_TYPES = tuple(sorted(_DISTANCES))
+_THREED_TYPES = ('CEIL_3D', 'EUC_3D', 'MAN_3D', 'MAX_3D', 'XRAY1', 'XRAY2')
+
+def _distance_function(coords, edge_weight_type):
+  # The distance function and the coordinates it uses
+  coords = np.asarray(coords, dtype=float)
+  if edge_weight_type is None:
+    edge_weight_type = 'EUC_2D' if coords.shape[1] == 2 else 'EUC_3D'
+  if edge_weight_type not in _DISTANCES:
+    raise ValueError('Unsupported edge_weight_type: {}'.format(
+                                                            edge_weight_type))
+  dimensions = 3 if edge_weight_type in _THREED_TYPES else 2
+  if coords.shape[1] < dimensions:
+    raise ValueError('{} requires 3D coordinates'.format(edge_weight_type))
+  return _DISTANCES[edge_weight_type], coords[:,:dimensions]
+
+def distance_matrix(coords, edge_weight_type=None):
+  """
+  Compute the matrix of edge weights of an instance given by coordinates,
+  using the same rounding as LKH.
+
+  Parameters
+  ----------
+  coords: array_like
+    Array of shape `(n, 2)` or `(n, 3)` with the node coordinates
+  edge_weight_type: str
+    TSPLIB edge weight type (see :data:`EDGE_WEIGHT_TYPES`). By default
+    `EUC_2D` or `EUC_3D`.
+
+  Returns
+  -------
+  weights: array
+    Integer array of shape `(n, n)`
+
+  Raises
+  ------
+  ValueError:
+    If the `edge_weight_type` is not supported
+  """
+  distance, coords = _distance_function(coords, edge_weight_type)
+  return distance(coords[:,np.newaxis], coords).astype(np.int64)
+
+def edge_lengths(a, b, coords=None, weights=None, edge_weight_type=None):
+  """
+  Compute the length of the edges `(a[i], b[i])`, using the same rounding as
+  LKH. Either `coords` or `weights` must be given.
+
+  Parameters
+  ----------
+  a: array_like
+    Start nodes of the edges (indices starting at 0), of any shape
+  b: array_like
+    End nodes of the edges, with the same shape as `a`
+  coords: array_like
+    Array of shape `(n, 2)` or `(n, 3)` with the node coordinates
+  weights: array_like
+    Array of shape `(n, n)` with the edge weights. The weights are rounded to
+    the nearest integer.
+  edge_weight_type: str
+    TSPLIB edge weight type of `coords` (see :data:`EDGE_WEIGHT_TYPES`). By
+    default `EUC_2D` or `EUC_3D`.
+
+  Returns
+  -------
+  lengths: array
+    Integer array with the shape of `a`
+  """
+  if (coords is None) == (weights is None):
+    raise ValueError('Either coords or weights must be given')
+  a = np.asarray(a, dtype=int)
+  b = np.asarray(b, dtype=int)
+  if weights is not None:
+    return np.rint(np.asarray(weights)[a, b]).astype(np.int64)
+  distance, coords = _distance_function(coords, edge_weight_type)
+  return distance(coords[a], coords[b]).astype(np.int64)
+
+def _as_tours(tours):
+  # The tours as a 2D array and whether a single tour was given
+  tours = np.asarray(tours, dtype=int)
+  return np.atleast_2d(tours), tours.ndim == 1
+
+def tour_costs(tours, coords=None, weights=None, edge_weight_type=None):
+  """
+  Compute the cost of closed tours. See :func:`edge_lengths` for the
+  parameters describing the instance.
+
+  Parameters
+  ----------
+  tours: array_like
+    A tour or an array of shape `(k, m)` with `k` tours, as node indices
+    starting at 0
+
+  Returns
+  -------
+  costs: array
+    The integer cost of every tour (a scalar for a single tour)
+  """
+  tours, single = _as_tours(tours)
+  costs = edge_lengths(tours, np.roll(tours, -1, axis=1), coords, weights,
+                                            edge_weight_type).sum(axis=1)
+  return costs[0] if single else costs
+
+def validate_tours(tours, dimension, clusters=None):
+  """
+  Check the structure of tours: a TSP tour visits every node exactly once and
+  a GTSP tour visits exactly one node of every cluster.
+
+  Parameters
+  ----------
+  tours: array_like
+    A tour or an array of shape `(k, m)` with `k` tours, as node indices
+    starting at 0
+  dimension: int
+    Number of nodes of the instance
+  clusters: array_like
+    Array of length `dimension` with the cluster label of each node, for a
+    GTSP
+
+  Returns
+  -------
+  valid: array
+    Whether every tour is valid (a scalar for a single tour)
+  """
+  tours, single = _as_tours(tours)
+  in_range = np.all((tours >= 0) & (tours < dimension), axis=1)
+  visited = np.where(in_range[:,np.newaxis], tours, 0)
+  expected = dimension
+  if clusters is not None:
+    labels, sets = np.unique(np.asarray(clusters), return_inverse=True)
+    visited = sets.ravel()[visited]
+    expected = labels.shape[0]
+  if tours.shape[1] != expected:
+    valid = np.zeros(tours.shape[0], dtype=bool)
+  else:
+    valid = in_range & np.all(np.sort(visited, axis=1) == np.arange(expected),
+                                                                      axis=1)
+  return valid[0] if single else valid
+
+def gap(costs, optimum):
+  """
+  Compute the gap of tour costs to a known optimum.
+
+  Parameters
+  ----------
+  costs: array_like
+    The cost of the tours
+  optimum: int
+    The optimal cost (not zero)
+
+  Returns
+  -------
+  gaps: array
+    The gaps in percent
+  """
+  return 100. * (np.asarray(costs) - optimum) / optimum
+
+def evaluate_tours(tours, coords=None, weights=None, clusters=None,
+                                        edge_weight_type=None, optimum=None):
+  """
+  Evaluate a batch of tours, e.g. the solver outputs: their validity (see
+  :func:`validate_tours`), their cost (see :func:`tour_costs`) and their
+  gap to a known optimum. Tours of different lengths are evaluated one at a
+  time.
+
+  Parameters
+  ----------
+  tours: array_like
+    A tour or a sequence of tours, as node indices starting at 0
+  coords: array_like
+    Array of shape `(n, 2)` or `(n, 3)` with the node coordinates
+  weights: array_like
+    Array of shape `(n, n)` with the edge weights. Used only if `coords` is
+    `None`.
+  clusters: array_like
+    Array of length `n` with the cluster label of each node, for a GTSP
+  edge_weight_type: str
+    TSPLIB edge weight type of `coords` (see :data:`EDGE_WEIGHT_TYPES`). By
+    default `EUC_2D` or `EUC_3D`.
+  optimum: int
+    Optimal cost, used to compute the gaps
+
+  Returns
+  -------
+  result: dict
+    `valid` (bool array), `costs` (float array, `NaN` for the tours with
+    nodes out of range) and `gaps` (percent, `None` without `optimum`). They
+    are scalars for a single tour.
+  """
+  if coords is not None:
+    dimension = np.shape(coords)[0]
+  elif weights is not None:
+    dimension = np.shape(weights)[0]
+  else:
+    raise ValueError('Either coords or weights must be given')
+  try:
+    tours, single = _as_tours(tours)
+  except ValueError:
+    # Tours of different lengths
+    results = [evaluate_tours(tour, coords, weights, clusters,
+                              edge_weight_type, optimum) for tour in tours]
+    return dict((key, None if optimum is None and key == 'gaps' else
+                np.array([result[key] for result in results]))
+                for key in ('valid', 'costs', 'gaps'))
+  valid = validate_tours(tours, dimension, clusters)
+  in_range = np.all((tours >= 0) & (tours < dimension), axis=1)
+  costs = tour_costs(np.where(in_range[:,np.newaxis], tours, 0), coords,
+                              weights, edge_weight_type).astype(float)
+  costs[~in_range] = np.nan
+  gaps = gap(costs, optimum) if optimum is not None else None
+  if single:
+    return dict(valid=valid[0], costs=costs[0],
+                gaps=gaps[0] if gaps is not None else None)
+  return dict(valid=valid, costs=costs, gaps=gaps)
+
+def problem_data(problem):
+  """
+  Get the arguments of :func:`evaluate_tours` (and :func:`tour_costs`) that
+  describe a problem read with :func:`parser.read_tsplib_problem`. An
+  explicit TSP uses the lower triangle of its matrix, as LKH does.
+
+  Parameters
+  ----------
+  problem: dict
+    The problem
+
+  Returns
+  -------
+  data: dict
+    `coords` and `edge_weight_type`, or `weights`, and `clusters` (`None`
+    unless it is a GTSP)
+
+  Raises
+  ------
+  ValueError:
+    If the `EDGE_WEIGHT_TYPE` is not supported
+  """
+  problem_type = str(problem.get('TYPE', '')).split(' ')[0]
+  edge_weight_type = problem.get('EDGE_WEIGHT_TYPE')
+  data = dict(clusters=problem.get('clusters'))
+  if edge_weight_type == 'EXPLICIT' and 'weights' in problem:
+    weights = problem['weights']
+    if problem_type in ('TSP', 'GTSP'):
+      weights = np.tril(weights) + np.tril(weights, -1).T
+    data['weights'] = weights
+  elif edge_weight_type in _DISTANCES and 'coords' in problem:
+    data['coords'] = problem['coords']
+    data['edge_weight_type'] = edge_weight_type
+  else:
+    raise ValueError('Unsupported EDGE_WEIGHT_TYPE: {}'.format(
+                                                            edge_weight_type))
+  return data
+
+def evaluate_tour_files(problem_file, tour_files, optimum=None):
+  """
+  Evaluate TSPLIB tour files (e.g. written by the solver) against their
+  problem file, which is read only once. See :func:`evaluate_tours`.
+
+  Parameters
+  ----------
+  problem_file: str
+    The problem file using the TSPLIB format
+  tour_files: list
+    Paths of the tour files
+  optimum: int
+    Optimal cost, used to compute the gaps
+
+  Returns
+  -------
+  result: dict
+    See :func:`evaluate_tours`. It also includes the `lengths` reported by
+    the tour files (`None` if not reported), which can be compared with the
+    `costs`.
+  """
+  data = problem_data(parser.read_tsplib_problem(problem_file))
+  tours = []
+  lengths = []
+  for filename in tour_files:
+    tour, info = parser.read_tsplib_tour(filename)
+    tours.append(tour - 1)
+    lengths.append(parser.read_tour_length(info))
+  result = evaluate_tours(tours, optimum=optimum, **data)
+  result['lengths'] = lengths
+  return result
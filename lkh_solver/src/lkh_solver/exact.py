@@ -0,0 +1,166 @@
+#! /usr/bin/env python
+"""
+Exact solution of tiny TSP, ATSP and GTSP instances in Python. Solving them
+with LKH costs far more (writing the files, starting the solver, the ascent)
+than finding the optimal tour directly.
+"""
+import itertools
+import numpy as np
+# Own modules
+from . import evaluate
+from . import parser
+
+
+# Largest instance (number of nodes) solved exactly by default
+MAX_DIMENSION = 15
+# Largest TSP (or ATSP) instance solved by enumerating every tour
+BRUTE_FORCE_DIMENSION = 6
+
+def _brute_force(weights):
+  # Enumerate the tours that start at node 0
+  n = weights.shape[0]
+  tours = np.array(list(itertools.permutations(range(1, n))), dtype=int)
+  tours = np.column_stack((np.zeros(tours.shape[0], dtype=int), tours))
+  lengths = weights[tours, np.roll(tours, -1, axis=1)].sum(axis=1)
+  best = np.argmin(lengths)
+  return tours[best], lengths[best]
+
+def _held_karp(weights, sets, start):
+  # Held-Karp dynamic program over the sets 1..k-1, starting at the given
+  # node of set 0. cost[S, v] is the length of the shortest path that starts
+  # at `start`, visits exactly one node of every set in S and ends at the
+  # target v (a node of the sets 1..k-1). All the subsets with the same number
+  # of sets are computed at once.
+  m = sets.max()
+  targets = np.flatnonzero(sets > 0)
+  bits = 1 << (sets[targets] - 1)
+  full = (1 << m) - 1
+  cost = np.full((full+1, targets.shape[0]), np.inf)
+  parent = np.zeros((full+1, targets.shape[0]), dtype=int)
+  cost[bits, np.arange(targets.shape[0])] = weights[start, targets]
+  masks = np.arange(full+1)
+  sizes = np.zeros(full+1, dtype=int)
+  for i in range(m):
+    sizes += (masks >> i) & 1
+  step = weights[np.ix_(targets, targets)].T
+  for size in range(2, m+1):
+    layer = masks[sizes == size]
+    # [subset, last target, target before it]
+    lengths = cost[layer[:,np.newaxis] ^ bits] + step
+    best = np.argmin(lengths, axis=2)
+    values = np.min(lengths, axis=2)
+    values[(layer[:,np.newaxis] & bits) == 0] = np.inf
+    cost[layer] = values
+    parent[layer] = best
+  lengths = cost[full] + weights[targets, start]
+  last = np.argmin(lengths)
+  # Follow the parents back to the start
+  tour = [start]
+  mask = full
+  for _ in range(m):
+    tour.append(targets[last])
+    last, mask = parent[mask, last], mask ^ bits[last]
+  return np.array(tour[:1] + tour[:0:-1], dtype=int), lengths.min()
+
+def solve(weights, clusters=None):
+  """
+  Find an optimal tour of a TSP (or ATSP) instance, or an optimal g-tour of a
+  GTSP instance. The smallest TSP instances are solved by enumerating every
+  tour, the others using the Held-Karp dynamic program, whose time and
+  memory grow exponentially with the number of nodes. Therefore, it is only
+  meant for tiny instances (see :data:`MAX_DIMENSION`).
+
+  Parameters
+  ----------
+  weights: array_like
+    Array of shape `(n, n)` with the edge weights. The weights are rounded to
+    the nearest integer.
+  clusters: array_like
+    Array of length `n` with the cluster label of each node. If given, the
+    tour visits exactly one node of every cluster.
+
+  Returns
+  -------
+  tour: array
+    The tour as indices (starting at 0) into `weights`
+  cost: int
+    The length of the tour
+  """
+  weights = np.rint(np.asarray(weights)).astype(np.int64)
+  n = weights.shape[0]
+  if weights.ndim != 2 or n != weights.shape[1]:
+    raise ValueError('weights must be a square matrix')
+  if clusters is None:
+    if n < 2:
+      return np.arange(n), 0
+    if n <= BRUTE_FORCE_DIMENSION:
+      tour, cost = _brute_force(weights)
+      return tour, int(cost)
+    sets = np.arange(n)
+    starts = [0]
+  else:
+    _, sets = np.unique(np.asarray(clusters), return_inverse=True)
+    sets = sets.ravel()
+    if sets.shape[0] != n:
+      raise ValueError('clusters must have one label per node')
+    # Start from every node of the smallest set, numbered 0
+    counts = np.bincount(sets)
+    order = np.argsort(counts, kind='mergesort')
+    ranks = np.empty_like(order)
+    ranks[order] = np.arange(order.shape[0])
+    sets = ranks[sets]
+    starts = np.flatnonzero(sets == 0)
+    if order.shape[0] == 1:
+      return starts[:1], 0
+  results = [_held_karp(weights.astype(float), sets, start)
+                                                        for start in starts]
+  tour, cost = min(results, key=lambda result: result[1])
+  return tour, int(cost)
+
+def solve_problem_file(problem_file, max_dimension=None):
+  """
+  Solve a problem file exactly (see :func:`solve`) if it is small enough.
+  Only the specification part is read before deciding.
+
+  Parameters
+  ----------
+  problem_file: str
+    The problem file using the TSPLIB format
+  max_dimension: int
+    Largest number of nodes solved exactly. By default,
+    :data:`MAX_DIMENSION`.
+
+  Returns
+  -------
+  result: tuple
+    The `tour` (node numbers starting at 1) and its `cost`. `None` if the
+    problem is too large or not supported (e.g. it has fixed edges or its
+    `EDGE_WEIGHT_TYPE` is special), then it has to be solved by LKH.
+  """
+  if max_dimension is None:
+    max_dimension = MAX_DIMENSION
+  info = parser.read_tsplib_header(problem_file)
+  problem_type = str(info.get('TYPE', '')).split(' ')[0]
+  if (not isinstance(info.get('DIMENSION'), int) or
+      info['DIMENSION'] > max_dimension or
+      problem_type not in ('TSP', 'ATSP', 'GTSP', 'AGTSP')):
+    return None
+  edge_weight_type = info.get('EDGE_WEIGHT_TYPE')
+  if (edge_weight_type != 'EXPLICIT' and
+      edge_weight_type not in evaluate.EDGE_WEIGHT_TYPES):
+    return None
+  try:
+    info, sections = parser.read_tsplib_sections(problem_file)
+    if 'FIXED_EDGES_SECTION' in sections:
+      return None
+    data = evaluate.problem_data(parser.read_tsplib_problem(problem_file))
+    weights = data.get('weights')
+    if weights is None:
+      weights = evaluate.distance_matrix(data['coords'],
+                                                  data['edge_weight_type'])
+  except ValueError:
+    return None
+  if problem_type in ('GTSP', 'AGTSP') and data['clusters'] is None:
+    return None
+  tour, cost = solve(weights, data['clusters'])
+  return tour + 1, cost
@@ -0,0 +1,399 @@
+#! /usr/bin/env python
+import os
+import copy
+import time
+import ctypes
+import ctypes.util
+import threading
+import contextlib
+import multiprocessing
+import numpy as np
+# Own modules
+from . import cache
+from . import parser
+
+
+# The working directory belongs to the whole process, therefore the calls of
+# all the libraries that change it are serialized
+_working_path_lock = threading.Lock()
+
+@contextlib.contextmanager
+def _working_path(path):
+  # Run a library call in the given working directory
+  with _working_path_lock:
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+      yield
+    finally:
+      os.chdir(cwd)
+
+def find_library(name):
+  """
+  Find the path of a shared library. The directories in `LD_LIBRARY_PATH`
+  (which include the catkin `devel` and `install` spaces) are searched first.
+
+  Parameters
+  ----------
+  name: str
+    Name of the library without the `lib` prefix and the extension, e.g.
+    `'lkh'` or `'glkh'`
+
+  Returns
+  -------
+  path: str
+    Path to the shared library
+  """
+  filename = 'lib{}.so'.format(name)
+  for dirname in os.environ.get('LD_LIBRARY_PATH', '').split(os.pathsep):
+    path = os.path.join(dirname, filename)
+    if dirname and os.path.isfile(path):
+      return path
+  path = ctypes.util.find_library(name)
+  if path is None:
+    raise OSError('Failed to find the shared library: {}'.format(filename))
+  return path
+
+
+class SolverLibrary(object):
+  """
+  In-process LKH (or GLKH) solver. The solver is loaded as a shared library
+  and called through `ctypes`, therefore the parameters and the problem are
+  passed through memory and no process is spawned.
+
+  The library keeps its state in global variables, therefore the calls to
+  :meth:`solve` are serialized. The working directory of the process is
+  changed during the calls, therefore the calls of different libraries are
+  serialized as well.
+
+  Parameters
+  ----------
+  name: str
+    Name of the shared library. Use `'lkh'` for TSP instances and `'glkh'`
+    for GTSP instances.
+  path: str
+    Path to the shared library. If `None`, it is found with
+    :func:`find_library`.
+  working_path: str
+    Working directory during the solve. GLKH writes temporary files in its
+    `TMP` subdirectory.
+  """
+  def __init__(self, name='lkh', path=None, working_path='/tmp/lkh'):
+    if path is None:
+      path = find_library(name)
+    self.name = name
+    self.path = path
+    self.working_path = working_path
+    self._lock = threading.Lock()
+    self._lib = ctypes.CDLL(path)
+    self._lib.LKHSolve.argtypes = [ctypes.c_char_p, ctypes.c_char_p,
+                                              ctypes.POINTER(ctypes.c_longlong)]
+    self._lib.LKHSolve.restype = ctypes.c_int
+    self._lib.LKHGetTour.argtypes = [np.ctypeslib.ndpointer(dtype=np.intc,
+                                                      flags='C_CONTIGUOUS')]
+    self._lib.LKHGetTour.restype = None
+    self._lib.LKHFree.argtypes = []
+    self._lib.LKHFree.restype = None
+    # The binary problems and the sessions are only available in the LKH
+    # library
+    if hasattr(self._lib, 'LKHSolveBuffer'):
+      self._lib.LKHSolveBuffer.argtypes = [ctypes.c_char_p, ctypes.c_char_p,
+                            ctypes.c_size_t, ctypes.POINTER(ctypes.c_longlong)]
+      self._lib.LKHSolveBuffer.restype = ctypes.c_int
+    if hasattr(self._lib, 'LKHLoad'):
+      self._lib.LKHLoad.argtypes = [ctypes.c_char_p, ctypes.c_char_p]
+      self._lib.LKHLoad.restype = ctypes.c_int
+      self._lib.LKHSolveLoaded.argtypes = [ctypes.c_char_p,
+                                              ctypes.POINTER(ctypes.c_longlong)]
+      self._lib.LKHSolveLoaded.restype = ctypes.c_int
+    # Session whose problem is currently loaded in the library
+    self._session = None
+
+  def solve(self, params, problem=None, problem_file=None):
+    """
+    Solve a problem in-process.
+
+    Parameters
+    ----------
+    params: SolverParameters
+      Parameters to be pased to the LKH solver. See :class:`SolverParameters`
+      for details.
+    problem: str
+      Content of the problem file in TSPLIB format. See
+      :func:`parser.format_tsplib_problem`. If it is `bytes`, it may contain
+      binary sections (LKH library only).
+    problem_file: str
+      Path to the problem file. Used only if `problem` is `None`.
+
+    Returns
+    -------
+    tour: array
+      The tour as node indices starting at 0, i.e. node `i` of the TSPLIB
+      problem is `i-1`. `None` if the solver failed.
+    info: dict
+      Extra information about the solver call. It includes the CPU time and
+      the `cost` of the tour.
+    """
+    starttime = time.time()
+    if not params.initialized():
+      raise ValueError('SolverParameters have not been initialized')
+    if (problem is None) == (problem_file is None):
+      raise ValueError('Either problem or problem_file must be given')
+    if problem_file is None:
+      problem_file = '(memory)'
+    else:
+      problem_file = os.path.abspath(problem_file)
+    content = parser.format_parameters(problem_file, params)
+    binary = isinstance(problem, bytes)
+    if binary and not hasattr(self._lib, 'LKHSolveBuffer'):
+      raise ValueError('The {} library does not support binary '
+                       'problems'.format(self.name))
+    if problem is not None and not binary:
+      problem = problem.encode()
+    cost = ctypes.c_longlong()
+    tour = None
+    with self._lock:
+      tmp_path = os.path.join(self.working_path, 'TMP')
+      if not os.path.isdir(tmp_path):
+        os.makedirs(tmp_path)
+      with _working_path(self.working_path):
+        if binary:
+          dimension = self._lib.LKHSolveBuffer(content.encode(), problem,
+                                            len(problem), ctypes.byref(cost))
+        else:
+          dimension = self._lib.LKHSolve(content.encode(), problem,
+                                                          ctypes.byref(cost))
+        if dimension > 0:
+          tour = np.empty(dimension, dtype=np.intc)
+          self._lib.LKHGetTour(tour)
+          tour = tour.astype(int) - 1
+        self._lib.LKHFree()
+        self._session = None
+    info = dict()
+    info['cpu_time'] = time.time() - starttime
+    info['cost'] = cost.value if tour is not None else None
+    return tour, info
+
+  def session(self, params, problem=None, problem_file=None):
+    """
+    Load a problem once to solve it several times. See :class:`Session`.
+
+    Parameters
+    ----------
+    params: SolverParameters
+      Parameters used to load the problem
+    problem: str
+      Content of the problem file in TSPLIB format
+    problem_file: str
+      Path to the problem file. Used only if `problem` is `None`.
+
+    Returns
+    -------
+    session: Session
+      The loaded problem
+    """
+    return Session(self, params, problem=problem, problem_file=problem_file)
+
+
+class Session(object):
+  """
+  Problem kept loaded in a :class:`SolverLibrary` between solves. The problem
+  is read, and its Pi-values and candidate sets are computed, only once.
+  Every call to :meth:`solve` starts from that state, therefore it returns
+  the same tour as :meth:`SolverLibrary.solve` with the same parameters, but
+  skips the preprocessing. This makes parameter sweeps (e.g. over the
+  `seed`, `runs` or `move_type`) much cheaper.
+
+  The library holds a single problem. If another problem is solved (or
+  loaded by another session) in the meantime, the session reloads its
+  problem transparently at the next :meth:`solve`.
+
+  Parameters
+  ----------
+  library: SolverLibrary
+    The LKH library
+  params: SolverParameters
+    Parameters used to load the problem. The parameters that affect the
+    preprocessing (see :attr:`keywords`) are fixed for the whole session.
+  problem: str
+    Content of the problem file in TSPLIB format
+  problem_file: str
+    Path to the problem file. Used only if `problem` is `None`.
+  """
+  keywords = cache.CandidateCache.keywords + ('initial_tour_algorithm',
+                                              'subproblem_size')
+  """Names of the :class:`SolverParameters` fixed when loading the problem"""
+
+  def __init__(self, library, params, problem=None, problem_file=None):
+    if not hasattr(library._lib, 'LKHLoad'):
+      raise ValueError('The {} library does not support sessions'.format(
+                                                                library.name))
+    if not params.initialized():
+      raise ValueError('SolverParameters have not been initialized')
+    if (problem is None) == (problem_file is None):
+      raise ValueError('Either problem or problem_file must be given')
+    if params.subproblem_size:
+      raise ValueError('Sessions do not support subproblem_size')
+    self.library = library
+    self.params = copy.copy(params)
+    if problem_file is None:
+      self.problem_file = '(memory)'
+      self._problem = problem.encode()
+    else:
+      self.problem_file = os.path.abspath(problem_file)
+      self._problem = None
+    self.dimension = None
+    self.load_time = None
+    self.loads = 0
+    with self.library._lock:
+      self._load()
+
+  def _load(self):
+    # Must be called with the lock of the library
+    starttime = time.time()
+    content = parser.format_parameters(self.problem_file, self.params)
+    library = self.library
+    library._session = None
+    with _working_path(library.working_path):
+      dimension = library._lib.LKHLoad(content.encode(), self._problem)
+    if dimension < 0:
+      raise ValueError('Failed to load the problem: {}'.format(
+                                                            self.problem_file))
+    library._session = self
+    self.dimension = dimension
+    self.load_time = time.time() - starttime
+    self.loads += 1
+
+  def _check(self, params):
+    for name in self.keywords:
+      if getattr(params, name) != getattr(self.params, name):
+        raise ValueError('The parameter {} cannot change within a '
+                         'session'.format(name))
+
+  def solve(self, params=None):
+    """
+    Solve the loaded problem.
+
+    Parameters
+    ----------
+    params: SolverParameters
+      Parameters of the search. If `None`, the parameters used to load the
+      problem. Raises `ValueError` if one of the :attr:`keywords` differs
+      from the parameters used to load the problem.
+
+    Returns
+    -------
+    tour: array
+      The tour as node indices starting at 0. `None` if the solver failed.
+    info: dict
+      Extra information about the solver call. It includes the CPU time, the
+      `cost` of the tour and whether the problem had to be `reloaded`.
+    """
+    starttime = time.time()
+    if params is None:
+      params = self.params
+    elif not params.initialized():
+      raise ValueError('SolverParameters have not been initialized')
+    self._check(params)
+    content = parser.format_parameters(self.problem_file, params)
+    cost = ctypes.c_longlong()
+    tour = None
+    library = self.library
+    with library._lock:
+      reloaded = library._session is not self
+      if reloaded:
+        self._load()
+      with _working_path(library.working_path):
+        dimension = library._lib.LKHSolveLoaded(content.encode(),
+                                                          ctypes.byref(cost))
+        if dimension > 0:
+          tour = np.empty(dimension, dtype=np.intc)
+          library._lib.LKHGetTour(tour)
+          tour = tour.astype(int) - 1
+        else:
+          # The library discards the problem after a failure
+          library._session = None
+    info = dict()
+    info['cpu_time'] = time.time() - starttime
+    info['cost'] = cost.value if tour is not None else None
+    info['reloaded'] = reloaded
+    return tour, info
+
+  def close(self):
+    """
+    Free the problem if it is still loaded in the library.
+    """
+    with self.library._lock:
+      if self.library._session is self:
+        self.library._lib.LKHFree()
+        self.library._session = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+
+# Session of each worker process of solve_sweep
+_worker_session = None
+
+def _init_worker(name, path, working_path, params, problem, problem_file):
+  global _worker_session
+  library = SolverLibrary(name, path, working_path)
+  _worker_session = Session(library, params, problem, problem_file)
+
+def _solve_worker(params):
+  return _worker_session.solve(params)
+
+def solve_sweep(params_list, problem=None, problem_file=None, workers=None,
+                              name='lkh', path=None, working_path='/tmp/lkh'):
+  """
+  Solve the same problem with several parameters (e.g. a sweep over the
+  `seed`). Each worker process loads the problem once in its own
+  :class:`Session` and keeps it loaded until the sweep finishes.
+
+  Parameters
+  ----------
+  params_list: list
+    The :class:`SolverParameters` of each solve. They may only differ in the
+    parameters of the search (see :attr:`Session.keywords`).
+  problem: str
+    Content of the problem file in TSPLIB format
+  problem_file: str
+    Path to the problem file. Used only if `problem` is `None`.
+  workers: int
+    Number of worker processes. By default, the number of CPUs (at most one
+    per solve). With a single worker the solves run in this process.
+  name: str
+    Name of the shared library
+  path: str
+    Path to the shared library. If `None`, it is found with
+    :func:`find_library`.
+  working_path: str
+    Working directory during the solves
+
+  Returns
+  -------
+  results: list
+    The `(tour, info)` of each solve, in the order of `params_list`
+  """
+  params_list = list(params_list)
+  if not params_list:
+    return []
+  if workers is None:
+    workers = multiprocessing.cpu_count()
+  workers = max(1, min(workers, len(params_list)))
+  if path is None:
+    path = find_library(name)
+  if workers == 1:
+    library = SolverLibrary(name, path, working_path)
+    with Session(library, params_list[0], problem, problem_file) as session:
+      return [session.solve(params) for params in params_list]
+  pool = multiprocessing.Pool(workers, _init_worker, (name, path,
+                  working_path, params_list[0], problem, problem_file))
+  try:
+    return pool.map(_solve_worker, params_list, chunksize=1)
+  finally:
+    pool.close()
+    pool.join()
@@ -1,5 +1,7 @@
 #! /usr/bin/env python
 import os
+import re
+import numpy as np
 
 def get_keyword_index(lines, keyword):
   """
@@ -24,6 +26,163 @@ def get_keyword_index(lines, keyword):
       return i
   return None
 
+_SECTION_PATTERN = re.compile(r'^[ \t]*([A-Z_]+_SECTION|EOF)[ \t]*:?[ \t]*$',
+                                                                    re.MULTILINE)
+
+def parse_tsplib_header(lines, info=None):
+  """
+  Parse the specification part of a TSPLIB file, i.e. the `KEYWORD : value`
+  lines. Integer values are converted. The values of repeated keywords (e.g.
+  `COMMENT`) are concatenated.
+
+  Parameters
+  ----------
+  lines: list
+    The lines of the specification part
+  info: dict
+    If given, it is updated with the parsed fields
+
+  Returns
+  -------
+  info: dict
+    The parsed fields
+  """
+  if info is None:
+    info = dict()
+  for line in lines:
+    if ':' not in line:
+      continue
+    key, val_str = (item.strip() for item in line.split(':', 1))
+    try:
+      value = int(val_str)
+    except ValueError:
+      value = val_str
+    if key in info and isinstance(info[key], str):
+      value = info[key] + ' ' + str(value)
+    info[key] = value
+  return info
+
+def read_tsplib_header(filename):
+  """
+  Read only the specification part of a TSPLIB file, i.e. the lines before
+  its first data section. The file is read as bytes because it may contain
+  binary sections.
+
+  Parameters
+  ----------
+  filename: str
+    Path to the TSPLIB file
+
+  Returns
+  -------
+  info: dict
+    The parsed fields. See :func:`parse_tsplib_header`.
+  """
+  lines = []
+  with open(filename, 'rb') as f:
+    for line in f:
+      line = line.decode(errors='replace')
+      if _SECTION_PATTERN.match(line.rstrip()):
+        break
+      lines.append(line)
+  return parse_tsplib_header(lines)
+
+_BINARY_SECTION_PATTERN = re.compile(
+        br'^[ \t]*([A-Z_]+_BINARY_SECTION)[ \t]*:?[ \t]*\r?\n', re.MULTILINE)
+
+def _binary_layout(name, info):
+  # Data type and number of values of a binary section
+  n = info['DIMENSION']
+  if name == 'NODE_COORD_BINARY_SECTION':
+    three_d = (info.get('NODE_COORD_TYPE') == 'THREED_COORDS' or
+                          str(info.get('EDGE_WEIGHT_TYPE', '')).endswith('_3D'))
+    return np.dtype('<f8'), n * (3 if three_d else 2)
+  if name == 'EDGE_WEIGHT_BINARY_SECTION':
+    fmt = info.get('EDGE_WEIGHT_FORMAT', 'FULL_MATRIX')
+    if fmt == 'FULL_MATRIX':
+      count = n * n
+    elif 'DIAG' in fmt:
+      count = n * (n+1) // 2
+    else:
+      count = n * (n-1) // 2
+    return np.dtype('<i4'), count
+  raise ValueError('Unknown binary section: {}'.format(name))
+
+def read_tsplib_sections(filename):
+  """
+  Read a TSPLIB file and split it into its specification part and its data
+  sections in a single pass. The sections are not parsed, except the binary
+  ones (e.g. `EDGE_WEIGHT_BINARY_SECTION`, see :func:`write_tsplib_problem`)
+  which are returned as one dimensional arrays.
+
+  Parameters
+  ----------
+  filename: str
+    Path to the TSPLIB file
+
+  Returns
+  -------
+  info: dict
+    The fields of the specification part. See :func:`parse_tsplib_header`.
+  sections: dict
+    The text of every section (e.g. `TOUR_SECTION`) keyed by its name
+  """
+  with open(filename, 'rb') as f:
+    raw = f.read()
+  # Cut the binary sections out of the text. Their size is given by the
+  # specification part, which precedes them.
+  pieces = []
+  binary = dict()
+  start = 0
+  match = _BINARY_SECTION_PATTERN.search(raw, start)
+  while match is not None:
+    pieces.append(raw[start:match.start()])
+    text = b''.join(pieces).decode()
+    header = _SECTION_PATTERN.search(text)
+    info = parse_tsplib_header(text[:header.start() if header else None]
+                                                                .splitlines())
+    name = match.group(1).decode()
+    dtype, count = _binary_layout(name, info)
+    binary[name] = np.frombuffer(raw, dtype=dtype, count=count,
+                                                        offset=match.end())
+    start = match.end() + count*dtype.itemsize
+    match = _BINARY_SECTION_PATTERN.search(raw, start)
+  pieces.append(raw[start:])
+  text = b''.join(pieces).decode().replace('\r\n', '\n')
+  matches = list(_SECTION_PATTERN.finditer(text))
+  end = matches[0].start() if matches else len(text)
+  info = parse_tsplib_header(text[:end].splitlines())
+  sections = dict()
+  for match, next_match in zip(matches, matches[1:] + [None]):
+    name = match.group(1)
+    if name == 'EOF':
+      break
+    stop = next_match.start() if next_match is not None else len(text)
+    sections[name] = text[match.end():stop]
+  sections.update(binary)
+  return info, sections
+
+def parse_array(text, dtype=int):
+  """
+  Convert the whitespace-separated numbers of `text` into an array without
+  creating a Python object per number.
+
+  Parameters
+  ----------
+  text: str
+    The numbers separated by whitespace
+  dtype: data-type
+    Data type of the array
+
+  Returns
+  -------
+  array: array
+    One dimensional array with the numbers
+  """
+  if not text.strip():
+    return np.empty(0, dtype=dtype)
+  return np.fromstring(text, dtype=dtype, sep=' ')
+
 def read_tsplib_tour(filename):
   """
   Read a tour from a TSPLIB file
@@ -35,46 +194,465 @@ def read_tsplib_tour(filename):
 
   Returns
   -------
-  tour: list
-    The tour as a list of integers
+  tour: array
+    The tour as an array of integers (the node numbers start at 1)
   info: dict
     Extra information contained in the `.tour` file
   """
-  lines = []
-  # Read the raw file and dump it into a list
-  with open(filename, 'rb') as f:
-    while True:
-      line = f.readline()
-      if line.find('EOF') != -1 or not line:
+  info, sections = read_tsplib_sections(filename)
+  values = parse_array(sections.get('TOUR_SECTION', ''))
+  if 'DIMENSION' in info:
+    tour = values[:info['DIMENSION']]
+  else:
+    terminators = np.flatnonzero(values == -1)
+    tour = values[:terminators[0]] if terminators.size else values
+  return tour, info
+
+def _explicit_indices(n, edge_weight_format):
+  # Matrix indices of the entries of an EDGE_WEIGHT_SECTION in file order
+  fmt = edge_weight_format.upper()
+  diagonal = 0 if 'DIAG' in fmt else 1
+  if fmt.startswith('UPPER'):
+    rows, cols = np.triu_indices(n, diagonal)
+  else:
+    rows, cols = np.tril_indices(n, -diagonal)
+  if fmt.endswith('_COL'):
+    # Column-wise traversal of a triangle is the row-wise traversal of the
+    # opposite triangle transposed
+    if fmt.startswith('UPPER'):
+      cols, rows = np.tril_indices(n, -diagonal)
+    else:
+      cols, rows = np.triu_indices(n, diagonal)
+  return rows, cols
+
+def read_tsplib_problem(filename):
+  """
+  Read a problem from a TSPLIB (or GTSPLIB) file. The data sections are
+  converted in bulk into arrays that can be passed back to
+  :func:`write_tsplib_problem`.
+
+  Parameters
+  ----------
+  filename: str
+    Path to the problem file
+
+  Returns
+  -------
+  problem: dict
+    The fields of the specification part (see :func:`parse_tsplib_header`)
+    plus the arrays of the data sections that are present: `coords` with
+    shape `(n, d)` (`NODE_COORD_SECTION`), `weights` with shape `(n, n)`
+    (`EDGE_WEIGHT_SECTION`) and `clusters` with the set number of every node
+    (`GTSP_SET_SECTION`). Node `i` of the problem is the row `i-1`. The
+    binary sections are read as well.
+  """
+  info, sections = read_tsplib_sections(filename)
+  problem = dict(info)
+  n = info['DIMENSION']
+  if 'NODE_COORD_SECTION' in sections:
+    values = parse_array(sections['NODE_COORD_SECTION'], dtype=float)
+    data = values.reshape(n, -1)
+    coords = np.empty((n, data.shape[1]-1))
+    coords[data[:,0].astype(int)-1] = data[:,1:]
+    problem['coords'] = coords
+  elif 'NODE_COORD_BINARY_SECTION' in sections:
+    coords = sections['NODE_COORD_BINARY_SECTION'].astype(float)
+    problem['coords'] = coords.reshape(n, -1)
+  values = None
+  if 'EDGE_WEIGHT_SECTION' in sections:
+    values = parse_array(sections['EDGE_WEIGHT_SECTION'], dtype=float)
+    if np.all(values == np.rint(values)):
+      values = values.astype(np.int64)
+  elif 'EDGE_WEIGHT_BINARY_SECTION' in sections:
+    values = sections['EDGE_WEIGHT_BINARY_SECTION'].astype(np.int64)
+  if values is not None:
+    fmt = info.get('EDGE_WEIGHT_FORMAT', 'FULL_MATRIX')
+    if fmt == 'FULL_MATRIX':
+      weights = values[:n*n].reshape(n, n)
+    elif fmt.split('_')[0] in ('UPPER', 'LOWER'):
+      rows, cols = _explicit_indices(n, fmt)
+      weights = np.zeros((n, n), dtype=values.dtype)
+      weights[rows, cols] = values[:rows.shape[0]]
+      weights[cols, rows] = values[:rows.shape[0]]
+    else:
+      raise ValueError('Unsupported EDGE_WEIGHT_FORMAT: {}'.format(fmt))
+    problem['weights'] = weights
+  if 'GTSP_SET_SECTION' in sections:
+    values = parse_array(sections['GTSP_SET_SECTION'])
+    ends = np.flatnonzero(values == -1)
+    starts = np.concatenate(([0], ends[:-1]+1))
+    # Every set is given by its number, its nodes and -1
+    is_node = np.ones(values.shape[0], dtype=bool)
+    is_node[starts] = False
+    is_node[ends] = False
+    clusters = np.zeros(n, dtype=int)
+    clusters[values[is_node]-1] = np.repeat(values[starts], ends-starts-1)
+    problem['clusters'] = clusters
+  return problem
+
+def read_tour_length(info):
+  """
+  Get the length of a tour from the extra information of a TSPLIB tour file.
+  The LKH and GLKH solvers write it as `COMMENT : Length = <integer>`.
+
+  Parameters
+  ----------
+  info: dict
+    Extra information returned by :func:`read_tsplib_tour`
+
+  Returns
+  -------
+  length: int
+    The tour length. `None` if it is not available.
+  """
+  match = re.search(r'Length\s*=\s*(-?\d+)', str(info.get('COMMENT', '')))
+  if match is None:
+    return None
+  return int(match.group(1))
+
+def write_tsplib_tour(filename, tour, name=None, length=None):
+  """
+  Write a tour to a TSPLIB file. The file can be used as `INITIAL_TOUR_FILE`,
+  `INPUT_TOUR_FILE` or `MERGE_TOUR_FILE` of the LKH solver.
+
+  Parameters
+  ----------
+  filename: str
+    Path of the tour file to be written
+  tour: array_like
+    The tour as a sequence of node numbers (starting at 1)
+  name: str
+    Name of the tour. If `None`, the basename of `filename` is used.
+  length: int
+    Length of the tour. If given, it is written as a comment.
+  """
+  if name is None:
+    name = os.path.splitext(os.path.basename(filename))[0]
+  tour = np.asarray(tour, dtype=int)
+  content =  'NAME : {}\n'.format(name)
+  if length is not None:
+    content += 'COMMENT : Length = {:d}\n'.format(int(length))
+  content += 'TYPE : TOUR\n'
+  content += 'DIMENSION : {:d}\n'.format(tour.shape[0])
+  content += 'TOUR_SECTION\n'
+  content += format_array(tour, '%d', columns=1)
+  content += '-1\nEOF\n'
+  with open(filename, 'w') as f:
+    f.write(content)
+
+def read_penalties(filename):
+  """
+  Read the penalties (Pi-values) written by the LKH solver to a `PI_FILE`.
+
+  Parameters
+  ----------
+  filename: str
+    Path to the `PI_FILE`
+
+  Returns
+  -------
+  pi: array
+    The Pi-value of every node. Node `i` of the problem is `pi[i-1]`.
+  """
+  with open(filename, 'r') as f:
+    values = f.read().split()
+  dimension = int(values[0])
+  data = np.array(values[1:2*dimension+1], dtype=int).reshape(-1, 2)
+  pi = np.zeros(dimension, dtype=int)
+  pi[data[:,0]-1] = data[:,1]
+  return pi
+
+def write_penalties(filename, pi):
+  """
+  Write the penalties (Pi-values) to a file that can be used as `PI_FILE`.
+
+  Parameters
+  ----------
+  filename: str
+    Path of the `PI_FILE` to be written
+  pi: array_like
+    The Pi-value of every node. Node `i` of the problem is `pi[i-1]`.
+  """
+  pi = np.asarray(pi, dtype=int)
+  data = np.column_stack((np.arange(1, pi.shape[0]+1), pi))
+  with open(filename, 'w') as f:
+    f.write('{:d}\n'.format(pi.shape[0]))
+    f.write(format_array(data, '%d %d'))
+    f.write('-1\nEOF\n')
+
+def read_candidates(filename):
+  """
+  Read the candidate set written by the LKH solver to a `CANDIDATE_FILE`.
+
+  Parameters
+  ----------
+  filename: str
+    Path to the `CANDIDATE_FILE`
+
+  Returns
+  -------
+  dads: array
+    The dad of every node in the minimum spanning tree (`0` if the node has
+    no dad). Node `i` of the problem is `dads[i-1]`.
+  candidates: list
+    The candidate edges of every node as a list of `(node, alpha)` tuples.
+    The candidates of node `i` are `candidates[i-1]`.
+  """
+  with open(filename, 'r') as f:
+    dimension = int(f.readline())
+    dads = np.zeros(dimension, dtype=int)
+    candidates = [[] for _ in range(dimension)]
+    for line in f:
+      values = [int(value) for value in line.split()]
+      if not values or values[0] == -1:
         break
-      lines.append(line)
-  # Parse the named fields
-  remaining_lines = []
-  info = dict()
+      node, dad, count = values[:3]
+      dads[node-1] = dad
+      candidates[node-1] = list(zip(values[3:3+2*count:2],
+                                                  values[4:4+2*count:2]))
+  return dads, candidates
+
+def write_candidates(filename, dads, candidates):
+  """
+  Write a candidate set to a file that can be used as `CANDIDATE_FILE`. See
+  :func:`read_candidates` for details about the arguments.
+
+  Parameters
+  ----------
+  filename: str
+    Path of the `CANDIDATE_FILE` to be written
+  dads: array_like
+    The dad of every node in the minimum spanning tree
+  candidates: list
+    The candidate edges of every node as a list of `(node, alpha)` tuples
+  """
+  lines = ['{:d}'.format(len(candidates))]
+  for i, (dad, edges) in enumerate(zip(dads, candidates)):
+    line = '{:d} {:d} {:d}'.format(i+1, int(dad), len(edges))
+    for node, alpha in edges:
+      line += ' {:d} {:d}'.format(int(node), int(alpha))
+    lines.append(line)
+  lines.append('-1\nEOF\n')
+  with open(filename, 'w') as f:
+    f.write('\n'.join(lines))
+
+_TRACE_PATTERNS = (
+  ('trial', re.compile(r'^(\*)?\s*(?P<trial>\d+): Cost = (?P<cost>-?\d+)'
+                      r'(, Gap = (?P<gap>-?[\d.]+)%)?'
+                      r', Time = (?P<time>[\d.]+) sec\.')),
+  ('run', re.compile(r'^Run (?P<run>\d+): Cost = (?P<cost>-?\d+)'
+                      r'(, Gap = (?P<gap>-?[\d.]+)%)?'
+                      r', Time = (?P<time>[\d.]+) sec\.')),
+  ('lower_bound', re.compile(r'^Lower bound = (?P<lower_bound>-?[\d.]+)'
+                      r'(, Gap = (?P<gap>-?[\d.]+)%)?'
+                      r'(, Ascent time = (?P<time>[\d.]+) sec\.)?')),
+  ('preprocessing', re.compile(r'^Preprocessing time = (?P<time>[\d.]+) sec')),
+  ('time_limit', re.compile(r'^\*\*\* (Total time|Time) limit exceeded'
+                                                              r' \*\*\*')),
+)
+# Statistics printed by the solver at the end (see Statistics.c)
+_STATISTIC_PATTERN = re.compile(r'(?P<name>[A-Za-z]+)\.(?P<stat>min|avg|max)'
+                                r' = (?P<value>-?[\d.]+)')
+_SUCCESSES_PATTERN = re.compile(r'^Successes/Runs = (?P<successes>\d+)'
+                                r'/(?P<runs>\d+)')
+
+def parse_trace_line(line):
+  """
+  Parse a line of the trace printed by the LKH solver when `trace_level` is
+  at least 1.
+
+  Parameters
+  ----------
+  line: str
+    A line of the output of the solver
+
+  Returns
+  -------
+  event: dict
+    The progress event described by the line or `None` if the line does not
+    describe one. The key `event` is one of `'lower_bound'` (end of the
+    ascent), `'preprocessing'`, `'trial'`, `'run'` or `'time_limit'`. The
+    other keys depend on the event: `trial`, `run`, `cost`, `gap` (percent),
+    `lower_bound` and `time` (seconds). `'trial'` events also include
+    `improved`, which is `True` if the trial found a better tour.
+  """
+  line = line.strip()
+  for name, pattern in _TRACE_PATTERNS:
+    match = pattern.match(line)
+    if match is None:
+      continue
+    event = dict(event=name)
+    for key, value in match.groupdict().items():
+      if value is None:
+        continue
+      if key in ('trial', 'run', 'cost'):
+        event[key] = int(value)
+      else:
+        event[key] = float(value)
+    if name == 'trial':
+      event['improved'] = line.startswith('*')
+    return event
+  return None
+
+def parse_trace(lines, stamps=None):
+  """
+  Parse the output of the LKH solver into structured fields.
+
+  Parameters
+  ----------
+  lines: list
+    Lines of the output of the solver. A string with the whole output is also
+    accepted.
+  stamps: list
+    If given, the time (seconds) at which each line was printed. It is added
+    to the events as `elapsed`.
+
+  Returns
+  -------
+  trace: dict
+    The `events` returned by :func:`parse_trace_line`, where the `'trial'`
+    events also include the `run`. The `runs` (list of `'run'` events, i.e.
+    the cost series of the runs), the `lower_bound`, the `ascent_time` and
+    the `preprocessing_time` (`None` if not printed) and whether the
+    `time_limit` was exceeded. `statistics` has the summary printed at the
+    end of the solve (printed at every `trace_level`), e.g. `successes`,
+    `runs`, `cost_min`, `cost_avg`, `cost_max`, `gap_min`, `trials_avg`,
+    `time_max`.
+  """
+  if isinstance(lines, str):
+    lines = lines.splitlines()
+  trace = dict(events=[], runs=[], lower_bound=None, ascent_time=None,
+                preprocessing_time=None, time_limit=False, statistics=dict())
+  statistics = trace['statistics']
+  run = 1
+  for i, line in enumerate(lines):
+    event = parse_trace_line(line)
+    if event is None:
+      line = line.strip()
+      match = _SUCCESSES_PATTERN.match(line)
+      if match is not None:
+        for key, value in match.groupdict().items():
+          statistics[key] = int(value)
+      for name, stat, value in _STATISTIC_PATTERN.findall(line):
+        statistics['{}_{}'.format(name.lower(), stat)] = float(value)
+      continue
+    if stamps is not None:
+      event['elapsed'] = stamps[i]
+    name = event['event']
+    if name == 'trial':
+      event['run'] = run
+    elif name == 'run':
+      run = event['run'] + 1
+      trace['runs'].append(event)
+    elif name == 'lower_bound':
+      trace['lower_bound'] = event['lower_bound']
+      trace['ascent_time'] = event.get('time')
+    elif name == 'preprocessing':
+      trace['preprocessing_time'] = event['time']
+    elif name == 'time_limit':
+      trace['time_limit'] = True
+    trace['events'].append(event)
+  return trace
+
+def parse_profile(lines):
+  """
+  Parse the profiling counters printed at exit by the instrumented build of
+  LKH (the `lkh_solver_profile` node, see `src/Profile.c`).
+
+  Parameters
+  ----------
+  lines: list
+    Lines of the output of the solver. A string with the whole output is also
+    accepted.
+
+  Returns
+  -------
+  profile: dict
+    `None` if the output has no profiling counters. Otherwise, `functions`
+    maps the name of every instrumented function (e.g. `Ascent`,
+    `LinKernighan`, `Best5OptMove`, `Flip_SL`, `ERXT`) to its number of
+    `calls` and the cumulative wall `time` (seconds, including the nested
+    calls). `cache` has the number of `lookups` and `hits` of the distance
+    cache, the `hit_rate` (`None` without lookups) and its `size` (0 if the
+    cache was not used, e.g. when the cost matrix is stored).
+  """
+  if isinstance(lines, str):
+    lines = lines.splitlines()
+  profile = None
   for line in lines:
-    if ':' in line:
-      key, val_str = (item.strip() for item in line.split(':', 1))
-      try:
-        value = int(val_str)
-      except:
-        value = val_str
-      if key in info:
-        if type(info[key]) == str:
-          value = info[key] + ' ' + value
-      info[key] = value
-    else:
-      remaining_lines.append(line)
-  lines = list(remaining_lines)
-  # Read the TOUR_SECTION
-  keyword = 'TOUR_SECTION'
-  first = get_keyword_index(lines, keyword) + 1
-  last = first + info['DIMENSION']
-  tour = []
-  for line in lines[first:last]:
-    tour.append(int(line))
-  return tour, info
+    fields = line.split()
+    if not fields:
+      continue
+    if fields[0] == 'PROFILE_SECTION':
+      profile = dict(functions=dict(), cache=None)
+    elif profile is None:
+      continue
+    elif fields[0] == 'FUNCTION':
+      profile['functions'][fields[1]] = dict(calls=int(fields[2]),
+                                              time=float(fields[3]))
+    elif fields[0] == 'CACHE':
+      lookups, hits, size = [int(field) for field in fields[1:4]]
+      profile['cache'] = dict(lookups=lookups, hits=hits, size=size,
+                        hit_rate=float(hits) / lookups if lookups else None)
+    elif fields[0] == 'END_PROFILE_SECTION':
+      break
+  return profile
 
-def write_parameters_file(problem_file, params, working_path):
+def format_parameters(problem_file, params, tour_file=None, pi_file=None,
+                        merge_tour_files=(), initial_tour_file=None,
+                        input_tour_file=None, candidate_files=(),
+                        subproblem_tour_file=None):
+  """
+  Format the content of the parameters file used by the LKH solver. Only the
+  parameters that have been set are written, see
+  :meth:`SolverParameters.keywords`.
+
+  Parameters
+  ----------
+  problem_file: str
+    Path to the problem file (`.tsp` file)
+  params: SolverParameters
+    Parameters to be pased to the LKH solver. See :class:`SolverParameters` for
+    details.
+  tour_file: str
+    Path of the `OUTPUT_TOUR_FILE`. If `None`, the keyword is omitted.
+  pi_file: str
+    Path of the `PI_FILE`. If `None`, the keyword is omitted.
+  merge_tour_files: list
+    Paths of the tours to be merged (`MERGE_TOUR_FILE`)
+  initial_tour_file: str
+    Path of the `INITIAL_TOUR_FILE`. If `None`, the keyword is omitted.
+  input_tour_file: str
+    Path of the `INPUT_TOUR_FILE`. If `None`, the keyword is omitted.
+  candidate_files: list
+    Paths of the candidate sets (`CANDIDATE_FILE`). If there is only one file
+    and it does not exist, the solver writes its candidate set to it.
+  subproblem_tour_file: str
+    Path of the `SUBPROBLEM_TOUR_FILE`. If `None`, the keyword is omitted.
+
+  Returns
+  -------
+  content: str
+    The content of the parameters file
+  """
+  keywords = params.keywords()
+  for candidate_file in candidate_files:
+    keywords.append(('CANDIDATE_FILE', candidate_file))
+  for merge_tour_file in merge_tour_files:
+    keywords.append(('MERGE_TOUR_FILE', merge_tour_file))
+  files = [('INITIAL_TOUR_FILE', initial_tour_file),
+          ('INPUT_TOUR_FILE', input_tour_file),
+          ('OUTPUT_TOUR_FILE', tour_file),
+          ('PI_FILE', pi_file),
+          ('SUBPROBLEM_TOUR_FILE', subproblem_tour_file)]
+  keywords += [(keyword, value) for keyword, value in files if value is not None]
+  # Sort by keyword. The order of repeated keywords is kept
+  keywords.sort(key=lambda item: item[0])
+  content =  'PROBLEM_FILE = {}\n'.format(problem_file)
+  content += '\n'.join('{} = {}'.format(*item) for item in keywords)
+  return content
+
+def write_parameters_file(problem_file, params, working_path, **kwargs):
   """
   Write the parameters file used by the `lkh_solver` node to solve a TSP
   instance.
@@ -88,34 +666,291 @@ def write_parameters_file(problem_file, params, working_path):
     details.
   working_path: str
     Path where the files generated by the LKH solver will be placed.
+  kwargs:
+    Additional arguments passed to :func:`format_parameters`. By default,
+    the `tour_file` and the `pi_file` are placed in the `working_path`.
 
   Returns
   -------
   basename: str
     The basename is the `problem_file` without the file extension
   """
-  def bool_to_string(value):
-    return 'YES' if value else 'NO'
   problem_name = os.path.splitext(os.path.basename(problem_file))[0]
   basename = os.path.join(working_path, problem_name)
-  content =  'PROBLEM_FILE = {}\n'.format(problem_file)
-  content += 'ASCENT_CANDIDATES = {:d}\n'.format(params.ascent_candidates)
-  content += 'BACKBONE_TRIALS = {:d}\n'.format(params.backbone_trials)
-  content += 'BACKTRACKING = {}\n'.format(bool_to_string(params.backtracking))
-  content += 'EXTRA_CANDIDATES = {:d}\n'.format(params.extra_candidates)
-  content += 'KICKS = {:d}\n'.format(params.kicks)
-  content += 'KICK_TYPE = {:d}\n'.format(params.kick_type)
-  content += 'MAX_CANDIDATES = {:d}\n'.format(params.max_candidates)
-  content += 'MAX_TRIALS = {:d}\n'.format(params.max_trials)
-  content += 'MOVE_TYPE = {:d}\n'.format(params.move_type)
-  content += 'OUTPUT_TOUR_FILE = {}\n'.format(basename+'.tour')
-  content += 'PI_FILE = {}\n'.format(basename+'.pi')
-  content += 'POPULATION_SIZE = {:d}\n'.format(params.population_size)
-  content += 'PRECISION = {:d}\n'.format(params.precision)
-  content += 'RUNS = {:d}\n'.format(params.runs)
-  content += 'SEED = {:d}\n'.format(params.seed)
-  content += 'TRACE_LEVEL = {:d}'.format(params.trace_level)
+  if kwargs.get('tour_file') is None:
+    kwargs['tour_file'] = basename+'.tour'
+  if kwargs.get('pi_file') is None:
+    kwargs['pi_file'] = basename+'.pi'
+  content = format_parameters(problem_file, params, **kwargs)
   # Write the file
   with open(basename+'.par', 'w') as f:
     f.write(content)
   return basename
+
+def format_array(array, fmt, columns=None):
+  """
+  Format a numeric array as text using a single formatting operation instead of
+  one call per element.
+
+  Parameters
+  ----------
+  array: array_like
+    The array to be formatted. It is flattened in row-major order.
+  fmt: str
+    Format of one element, e.g. `'%d'`. It can also be the format of a whole
+    row, in which case `columns` must be `None`.
+  columns: int
+    Number of elements per line. If `None`, `fmt` is assumed to describe a
+    whole row of `array`.
+
+  Returns
+  -------
+  text: str
+    The formatted array. Each line ends with a new line character.
+  """
+  array = np.asarray(array)
+  values = tuple(array.ravel().tolist())
+  if columns is None:
+    row_fmt = fmt + '\n'
+    rows = array.shape[0] if array.ndim > 0 else 1
+    return (row_fmt*rows) % values
+  rows, remainder = divmod(len(values), columns)
+  row_fmt = ' '.join([fmt]*columns) + '\n'
+  text = (row_fmt*rows) % values[:rows*columns]
+  if remainder:
+    text += (' '.join([fmt]*remainder) + '\n') % values[rows*columns:]
+  return text
+
+def format_gtsp_sets(set_ids):
+  """
+  Format the `GTSP_SET_SECTION` of a GTSP problem using a single formatting
+  operation. Every set is written in one line: its number, its nodes and -1.
+
+  Parameters
+  ----------
+  set_ids: array_like
+    Array of length `n` with the set index (starting at 0) of each node. All
+    the indices between 0 and the number of sets must be used.
+
+  Returns
+  -------
+  text: str
+    The content of the section
+  """
+  set_ids = np.asarray(set_ids, dtype=int)
+  counts = np.bincount(set_ids)
+  # Interleave the set numbers with the nodes of each set
+  order = np.argsort(set_ids, kind='mergesort') + 1
+  values = np.empty(order.shape[0] + counts.shape[0], dtype=int)
+  is_set = np.zeros(values.shape[0], dtype=bool)
+  is_set[np.cumsum(counts+1) - counts - 1] = True
+  values[is_set] = np.arange(1, counts.shape[0]+1)
+  values[~is_set] = order
+  fmt = ''.join(['%d' + ' %d'*count + ' -1\n' for count in counts.tolist()])
+  return fmt % tuple(values.tolist())
+
+def _tsplib_problem_parts(coords, weights, clusters, name, edge_weight_type,
+                                                        fixed_edges, binary):
+  # The text of the problem and, for the binary sections, tuples with the
+  # keyword and the array of the section
+  if (coords is None) == (weights is None):
+    raise ValueError('Either coords or weights must be given')
+  symmetric = True
+  if coords is not None:
+    coords = np.asarray(coords)
+    if coords.ndim != 2 or coords.shape[1] not in (2, 3):
+      raise ValueError('coords must have shape (n, 2) or (n, 3)')
+    dimension = coords.shape[0]
+    if edge_weight_type is None:
+      edge_weight_type = 'EUC_2D' if coords.shape[1] == 2 else 'EUC_3D'
+  else:
+    weights = np.rint(np.asarray(weights)).astype(np.int64)
+    if weights.ndim != 2 or weights.shape[0] != weights.shape[1]:
+      raise ValueError('weights must be a square matrix')
+    dimension = weights.shape[0]
+    symmetric = np.array_equal(weights, weights.T)
+    if binary and weights.size and (weights.max() > np.iinfo(np.int32).max
+                                  or weights.min() < np.iinfo(np.int32).min):
+      raise ValueError('The weights do not fit in 32-bit integers')
+  if clusters is None:
+    problem_type = 'TSP' if symmetric else 'ATSP'
+  else:
+    problem_type = 'GTSP' if symmetric else 'AGTSP'
+    labels, set_ids = np.unique(np.asarray(clusters), return_inverse=True)
+    if set_ids.shape[0] != dimension:
+      raise ValueError('clusters must have one label per node')
+  # Specification part
+  content =  'NAME : {}\n'.format(name)
+  content += 'TYPE : {}\n'.format(problem_type)
+  content += 'DIMENSION : {:d}\n'.format(dimension)
+  if clusters is not None:
+    content += 'GTSP_SETS : {:d}\n'.format(len(labels))
+  # Data part
+  parts = []
+  if coords is not None:
+    content += 'EDGE_WEIGHT_TYPE : {}\n'.format(edge_weight_type)
+    if binary:
+      parts += [content, ('NODE_COORD_BINARY_SECTION', coords.astype('<f8'))]
+      content = ''
+    else:
+      content += 'NODE_COORD_SECTION\n'
+      if np.issubdtype(coords.dtype, np.integer):
+        coord_fmt = '%d'
+      else:
+        coord_fmt = '%.15g'
+      ids = np.arange(1, dimension+1)
+      row_fmt = '%d ' + ' '.join([coord_fmt]*coords.shape[1])
+      content += format_array(np.column_stack((ids, coords)), row_fmt)
+  else:
+    content += 'EDGE_WEIGHT_TYPE : EXPLICIT\n'
+    if binary:
+      # The layouts of the cost matrix of LKH, used in place
+      if symmetric:
+        content += 'EDGE_WEIGHT_FORMAT : LOWER_ROW\n'
+        data = weights[np.tril_indices(dimension, -1)].astype('<i4')
+      else:
+        content += 'EDGE_WEIGHT_FORMAT : FULL_MATRIX\n'
+        data = weights.astype('<i4')
+      parts += [content, ('EDGE_WEIGHT_BINARY_SECTION', data)]
+      content = ''
+    elif symmetric:
+      content += 'EDGE_WEIGHT_FORMAT : UPPER_ROW\n'
+      content += 'EDGE_WEIGHT_SECTION\n'
+      content += format_array(weights[np.triu_indices(dimension, 1)], '%d',
+                                                              columns=16)
+    else:
+      content += 'EDGE_WEIGHT_FORMAT : FULL_MATRIX\n'
+      content += 'EDGE_WEIGHT_SECTION\n'
+      content += format_array(weights, '%d', columns=dimension)
+  if clusters is not None:
+    content += 'GTSP_SET_SECTION\n'
+    content += format_gtsp_sets(set_ids)
+  if fixed_edges is not None and len(fixed_edges) > 0:
+    content += 'FIXED_EDGES_SECTION\n'
+    content += format_array(np.asarray(fixed_edges, dtype=int) + 1, '%d %d')
+    content += '-1\n'
+  content += 'EOF\n'
+  parts.append(content)
+  return parts, problem_type
+
+def _binary_chunks(parts):
+  # Encode the parts. The data of the binary sections are aligned to 8 bytes
+  offset = 0
+  for part in parts:
+    if isinstance(part, tuple):
+      keyword, data = part
+      line = keyword + ' '
+      line += ' '*(-(offset + len(line) + 1) % 8) + '\n'
+      chunks = [line.encode(), np.ascontiguousarray(data), b'\n']
+    else:
+      chunks = [part.encode()]
+    for chunk in chunks:
+      offset += chunk.nbytes if isinstance(chunk, np.ndarray) else len(chunk)
+      yield chunk
+
+def format_tsplib_problem(coords=None, weights=None, clusters=None,
+                  name='problem', edge_weight_type=None, fixed_edges=None,
+                  binary=False):
+  """
+  Format a TSPLIB problem from NumPy arrays. Exactly one of `coords` or
+  `weights` must be given. The most compact representation is chosen
+  automatically:
+
+  * `coords` with 2 or 3 columns are written as `EUC_2D` or `EUC_3D` (unless
+    `edge_weight_type` is given).
+  * A symmetric `weights` matrix is written as `UPPER_ROW` and an asymmetric
+    one as `FULL_MATRIX` (`ATSP`).
+  * If `clusters` is given, the problem type is `GTSP` (or `AGTSP`) and the
+    `GTSP_SET_SECTION` is added.
+  * If `fixed_edges` is given, the `FIXED_EDGES_SECTION` is added.
+
+  With `binary`, the coordinates or the weights are written in binary
+  sections instead (`NODE_COORD_BINARY_SECTION` or
+  `EDGE_WEIGHT_BINARY_SECTION`): little-endian 8-byte floats or 4-byte
+  integers, copied from the arrays without any text formatting. A symmetric
+  `weights` matrix is then written as `LOWER_ROW`. LKH maps these sections
+  into memory instead of parsing them. GLKH cannot read them.
+
+  Parameters
+  ----------
+  coords: array_like
+    Array of shape `(n, 2)` or `(n, 3)` with the node coordinates
+  weights: array_like
+    Array of shape `(n, n)` with the edge weights. The weights are rounded to
+    the nearest integer, therefore they should be scaled beforehand if more
+    resolution is required.
+  clusters: array_like
+    Array of length `n` with the cluster label of each node
+  name: str
+    Name of the problem
+  edge_weight_type: str
+    TSPLIB edge weight type for `coords`, e.g. `'CEIL_2D'`, `'GEO'` or
+    `'ATT'`.
+  fixed_edges: array_like
+    Array of shape `(m, 2)` with the edges (node indices starting at 0) that
+    must belong to the tour
+  binary: bool
+    If set, write the binary sections
+
+  Returns
+  -------
+  content: str
+    The content of the problem file (`bytes` if `binary` is set)
+  problem_type: str
+    The TSPLIB problem type
+  """
+  parts, problem_type = _tsplib_problem_parts(coords, weights, clusters,
+                              name, edge_weight_type, fixed_edges, binary)
+  if binary:
+    content = b''.join(chunk if isinstance(chunk, bytes) else chunk.tobytes()
+                                          for chunk in _binary_chunks(parts))
+  else:
+    content = ''.join(parts)
+  return content, problem_type
+
+def write_tsplib_problem(filename, coords=None, weights=None, clusters=None,
+              name=None, edge_weight_type=None, fixed_edges=None, binary=False):
+  """
+  Write a TSPLIB problem file from NumPy arrays. See
+  :func:`format_tsplib_problem` for details.
+
+  Parameters
+  ----------
+  filename: str
+    Path of the problem file to be written
+  coords: array_like
+    Array of shape `(n, 2)` or `(n, 3)` with the node coordinates
+  weights: array_like
+    Array of shape `(n, n)` with the edge weights
+  clusters: array_like
+    Array of length `n` with the cluster label of each node
+  name: str
+    Name of the problem. If `None`, the basename of `filename` is used.
+  edge_weight_type: str
+    TSPLIB edge weight type for `coords`
+  fixed_edges: array_like
+    Array of shape `(m, 2)` with the edges that must belong to the tour
+  binary: bool
+    If set, write the coordinates or the weights in binary sections. The
+    arrays are written directly from their buffers.
+
+  Returns
+  -------
+  problem_type: str
+    The TSPLIB problem type written to the file
+  """
+  if name is None:
+    name = os.path.splitext(os.path.basename(filename))[0]
+  if binary:
+    parts, problem_type = _tsplib_problem_parts(coords, weights, clusters,
+                                name, edge_weight_type, fixed_edges, binary)
+    with open(filename, 'wb') as f:
+      for chunk in _binary_chunks(parts):
+        f.write(chunk)
+    return problem_type
+  content, problem_type = format_tsplib_problem(coords, weights, clusters,
+                                      name, edge_weight_type, fixed_edges)
+  # Write the file in one go
+  with open(filename, 'w') as f:
+    f.write(content)
+  return problem_type
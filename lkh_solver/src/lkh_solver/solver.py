@@ -1,9 +1,21 @@
 #!/usr/bin/env python
 import os
+import sys
 import math
+import copy
 import time
+import errno
+import numbers
+import shutil
+import tempfile
+import threading
+import multiprocessing
+import numpy as np
 from subprocess import Popen, PIPE
 # Own modules
+from . import cache
+from . import evaluate
+from . import exact
 from . import parser
 
 
@@ -18,9 +30,42 @@ class SolverParameters(object):
   backtracking = False
   """Specifies whether a backtracking `K`-opt move is to be used as the
   first move in a sequence of moves (where `K = move_type`)"""
+  candidate_set_type = None
+  """Specifies the candidate set type: `'ALPHA'`, `'DELAUNAY'`,
+  `'DELAUNAY PURE'`, `'NEAREST-NEIGHBOR'` or `'QUADRANT'`. `ALPHA` is
+  applicable in general. The other types can only be used for instances given
+  by coordinates. With `DELAUNAY` the ascent only considers the edges of the
+  Delaunay graph, which makes it scale to large instances. Default: `ALPHA`"""
+  excess = None
+  """The maximum alpha-value allowed for any candidate edge is set to
+  `excess` times the absolute value of the lower bound of a solution tour.
+  Default: `1/dimension`"""
   extra_candidates = 0
   """Number of extra candidate edges to be added to the candidate set of
   each node."""
+  extra_candidates_symmetric = None
+  """Specifies whether the extra candidate edges are complemented such that
+  each of them is associated with both its two end nodes."""
+  extra_candidate_set_type = None
+  """The candidate set type of the extra candidate edges:
+  `'NEAREST-NEIGHBOR'` or `'QUADRANT'`. Default: `QUADRANT`"""
+  gain23 = None
+  """Specifies whether the Gain23 function is used. Default: `True`"""
+  gain_criterion = None
+  """Specifies whether Lin and Kernighan's gain criterion is used.
+  Default: `True`"""
+  initial_period = None
+  """The length of the first period in the ascent. Default: `dimension/2`
+  (but at least 100)"""
+  initial_step_size = None
+  """The initial step size used in the ascent. Default: 1"""
+  initial_tour_algorithm = None
+  """Specifies the algorithm for obtaining an initial tour: `'BORUVKA'`,
+  `'GREEDY'`, `'MOORE'`, `'NEAREST-NEIGHBOR'`, `'QUICK-BORUVKA'`,
+  `'SIERPINSKI'` or `'WALK'`. Default: `WALK`"""
+  initial_tour_fraction = None
+  """Specifies the fraction of the initial tour (in `[0, 1]`) to be
+  constructed by means of the edges of the initial tour file. Default: 1"""
   kicks = 1
   """Specifies the number of times to "kick" a tour found by Lin-Kernighan.
   Each kick is a random K-swap kick. However, if KICKS is zero, then LKH's
@@ -29,14 +74,43 @@ class SolverParameters(object):
   """Specifies the value of K for a random K-swap kick (an extension of the
   double-bridge move). If `KICK_TYPE` is zero, then the LKH's special
   kicking strategy, `WALK`, is used."""
+  max_breadth = None
+  """The maximum number of candidate edges considered at each level of the
+  search for a move. Default: `INT_MAX`"""
   max_candidates = 30
   """The maximum number of candidate edges to be associated with each node.
   Default: 30"""
+  max_candidates_symmetric = None
+  """Specifies whether the candidate set is complemented such that every
+  candidate edge is associated with both its two end nodes."""
+  max_swaps = None
+  """Specifies the maximum number of swaps (flips) allowed in any search for
+  a tour improvement. Default: `dimension`"""
   max_trials = 1000
   """The maximum number of trials in each run."""
   move_type = 5
   """Specifies the sequential move type to be used in local search. A value
   `K >= 2` signifies that a sequential `K`-opt move is to be used."""
+  nonsequential_move_type = None
+  """Specifies the nonsequential move type to be used. A value `K >= 4`
+  signifies that attempts are made to improve a tour by nonsequential `k`-opt
+  moves where `4 <= k <= K`. Default: `move_type + patching_c + patching_a - 1`
+  """
+  optimum = None
+  """Known optimal tour length. If `stop_at_optimum` is set, a run is
+  terminated when the tour length becomes equal to this value."""
+  patching_a = None
+  """The maximum number of disjoint alternating cycles to be used for
+  patching. Default: 1"""
+  patching_a_mode = None
+  """Either `'RESTRICTED'` (gainful moves are only considered if all its
+  inclusion edges are candidate edges) or `'EXTENDED'` (the non-sequential
+  move need not be gainful if all its inclusion edges are candidate edges)."""
+  patching_c = None
+  """The maximum number of disjoint cycles to be patched in an attempt to
+  find a feasible and gainful move. Default: 0"""
+  patching_c_mode = None
+  """Either `'RESTRICTED'` or `'EXTENDED'`. See `patching_a_mode`."""
   population_size = 1
   """Specifies the maximum size of the population in LKH's genetic
   algorithm. Tours found by the first `POPULATION_SIZE` runs constitute an
@@ -51,15 +125,110 @@ class SolverParameters(object):
   precision = 10
   """The internal precision in the representation of transformed distances (10
   corresponds to 2 decimal places)"""
+  restricted_search = None
+  """Specifies whether the first edge to be broken in a move must not belong
+  to the currently best solution tour. Default: `True`"""
   runs = 1
   """The total number of runs."""
   seed = 1
   """Specifies the initial seed for random number generation."""
+  stop_at_optimum = None
+  """Specifies whether a run is stopped if the tour length becomes equal to
+  `optimum`. Default: `True`"""
+  subgradient = None
+  """Specifies whether the Pi-values should be determined by subgradient
+  optimization. Default: `True`"""
+  subproblem_size = None
+  """The number of nodes in a division of the original problem into
+  subproblems. The division is made according to the subproblem tour file.
+  Default: 0 (no division)"""
+  subproblem_partitioning = None
+  """The partitioning scheme used to divide the problem into subproblems:
+  `'DELAUNAY'`, `'KARP'`, `'K-CENTER'`, `'K-MEANS'`, `'MOORE'`, `'ROHE'` or
+  `'SIERPINSKI'`. By default the subproblem tour is divided into segments of
+  equal size."""
+  subproblem_borders = None
+  """Specifies whether the subproblems along the borders between subproblems
+  are to be solved too."""
+  subproblem_compressed = None
+  """Specifies whether each subproblem is compressed by removing the nodes
+  with two incident subproblem tour edges that belong to all the tours to be
+  merged."""
+  subsequent_move_type = None
+  """Specifies the move type to be used for all moves following the first
+  move in a sequence of moves. The value 0 signifies that all moves are of
+  the same type (`move_type`). Default: 0"""
+  subsequent_patching = None
+  """Specifies whether patching is used for moves following the first move in
+  a sequence of moves. Default: `True`"""
+  time_limit = None
+  """Specifies a time limit in seconds for each run. Default: no limit"""
+  total_time_limit = None
+  """Specifies a total time limit in seconds, including the ascent. No trial
+  (or run) is started once it is exceeded. Default: no limit"""
   trace_level = 1
   """Specifies the level of detail of the output given during the solution
   process. The value 0 signifies a minimum amount of output. The higher the
   value is the more information is given"""
 
+  # Schema of the LKH keywords. Every entry is given by the name of the
+  # attribute, the keyword, the type of value and its valid values: the
+  # minimum (int), the range (float), the choices (choice) or the suffix
+  # (flag). Entries sharing a keyword are appended to the value of the first
+  # one, e.g. `SUBPROBLEM_SIZE = 1000 KARP BORDERS`.
+  _schema = (
+    ('ascent_candidates', 'ASCENT_CANDIDATES', 'int', 2),
+    ('backbone_trials', 'BACKBONE_TRIALS', 'int', 0),
+    ('backtracking', 'BACKTRACKING', 'bool', None),
+    ('candidate_set_type', 'CANDIDATE_SET_TYPE', 'choice', ('ALPHA',
+                'DELAUNAY', 'DELAUNAY PURE', 'NEAREST-NEIGHBOR', 'QUADRANT')),
+    ('excess', 'EXCESS', 'float', (0., None)),
+    ('extra_candidates', 'EXTRA_CANDIDATES', 'int', 0),
+    ('extra_candidates_symmetric', 'EXTRA_CANDIDATES', 'flag', 'SYMMETRIC'),
+    ('extra_candidate_set_type', 'EXTRA_CANDIDATE_SET_TYPE', 'choice',
+                                              ('NEAREST-NEIGHBOR', 'QUADRANT')),
+    ('gain23', 'GAIN23', 'bool', None),
+    ('gain_criterion', 'GAIN_CRITERION', 'bool', None),
+    ('initial_period', 'INITIAL_PERIOD', 'int', 0),
+    ('initial_step_size', 'INITIAL_STEP_SIZE', 'int', 1),
+    ('initial_tour_algorithm', 'INITIAL_TOUR_ALGORITHM', 'choice', ('BORUVKA',
+              'GREEDY', 'MOORE', 'NEAREST-NEIGHBOR', 'QUICK-BORUVKA',
+              'SIERPINSKI', 'WALK')),
+    ('initial_tour_fraction', 'INITIAL_TOUR_FRACTION', 'float', (0., 1.)),
+    ('kicks', 'KICKS', 'int', 0),
+    ('kick_type', 'KICK_TYPE', 'int', 0),
+    ('max_breadth', 'MAX_BREADTH', 'int', 0),
+    ('max_candidates', 'MAX_CANDIDATES', 'int', 0),
+    ('max_candidates_symmetric', 'MAX_CANDIDATES', 'flag', 'SYMMETRIC'),
+    ('max_swaps', 'MAX_SWAPS', 'int', 0),
+    ('max_trials', 'MAX_TRIALS', 'int', 0),
+    ('move_type', 'MOVE_TYPE', 'int', 2),
+    ('nonsequential_move_type', 'NONSEQUENTIAL_MOVE_TYPE', 'int', 4),
+    ('optimum', 'OPTIMUM', 'int', None),
+    ('patching_a', 'PATCHING_A', 'int', 0),
+    ('patching_a_mode', 'PATCHING_A', 'choice', ('RESTRICTED', 'EXTENDED')),
+    ('patching_c', 'PATCHING_C', 'int', 0),
+    ('patching_c_mode', 'PATCHING_C', 'choice', ('RESTRICTED', 'EXTENDED')),
+    ('population_size', 'POPULATION_SIZE', 'int', 0),
+    ('precision', 'PRECISION', 'int', 1),
+    ('restricted_search', 'RESTRICTED_SEARCH', 'bool', None),
+    ('runs', 'RUNS', 'int', 1),
+    ('seed', 'SEED', 'int', None),
+    ('stop_at_optimum', 'STOP_AT_OPTIMUM', 'bool', None),
+    ('subgradient', 'SUBGRADIENT', 'bool', None),
+    ('subproblem_size', 'SUBPROBLEM_SIZE', 'int', 3),
+    ('subproblem_partitioning', 'SUBPROBLEM_SIZE', 'choice', ('DELAUNAY',
+              'KARP', 'K-CENTER', 'K-MEANS', 'MOORE', 'ROHE', 'SIERPINSKI')),
+    ('subproblem_borders', 'SUBPROBLEM_SIZE', 'flag', 'BORDERS'),
+    ('subproblem_compressed', 'SUBPROBLEM_SIZE', 'flag', 'COMPRESSED'),
+    ('subsequent_move_type', 'SUBSEQUENT_MOVE_TYPE', 'int', 0),
+    ('subsequent_patching', 'SUBSEQUENT_PATCHING', 'bool', None),
+    ('time_limit', 'TIME_LIMIT', 'float', (0., None)),
+    ('total_time_limit', 'TOTAL_TIME_LIMIT', 'float', (0., None)),
+    ('trace_level', 'TRACE_LEVEL', 'int', None),
+  )
+  _presets = ('fast', 'balanced', 'large-instance')
+
   def __init__(self):
     self._freeze()
 
@@ -86,23 +255,151 @@ class SolverParameters(object):
   def initialized(self):
     """
     Return `True` if the parameters have been initialized. `False` otherwise.
+    The parameters whose default is `None` are optional: when they are `None`
+    the LKH default is used.
     """
     initialized = True
     for name in dir(self):
       attr = getattr(self, name)
       if name.startswith('_') or callable(attr):
         continue
-      if attr is None:
+      if attr is None and getattr(type(self), name) is not None:
         initialized = False
         break
     return initialized
 
+  def validate(self):
+    """
+    Check the value of every parameter against the schema of the LKH
+    keywords.
+
+    Raises
+    ------
+    ValueError:
+      If a parameter has an invalid value
+    """
+    for name, keyword, kind, values in self._schema:
+      value = getattr(self, name)
+      if value is None:
+        continue
+      error = None
+      if kind == 'int':
+        if isinstance(value, bool) or not isinstance(value, numbers.Integral):
+          error = 'integer expected'
+        elif values is not None and value < values:
+          error = '>= {} expected'.format(values)
+      elif kind == 'float':
+        if isinstance(value, bool) or not isinstance(value, numbers.Real):
+          error = 'real expected'
+        elif value < values[0]:
+          error = '>= {} expected'.format(values[0])
+        elif values[1] is not None and value > values[1]:
+          error = '<= {} expected'.format(values[1])
+      elif kind == 'choice':
+        if value not in values:
+          error = 'one of {} expected'.format(', '.join(values))
+      if error is not None:
+        raise ValueError('{} ({}): {}'.format(name, keyword, error))
+
+  def keywords(self):
+    """
+    Serialize the parameters that have been set.
+
+    Returns
+    -------
+    keywords: list
+      Tuples `(keyword, value)` in the order of the schema, where `value` is a
+      string in the format expected by `ReadParameters`.
+    """
+    self.validate()
+    keywords = []
+    values = dict()
+    for name, keyword, kind, suffix in self._schema:
+      value = getattr(self, name)
+      if value is None or (kind == 'flag' and not value):
+        continue
+      if kind == 'bool':
+        value = 'YES' if value else 'NO'
+      elif kind == 'flag':
+        value = suffix
+      else:
+        value = str(value)
+      if keyword in values:
+        values[keyword] += ' ' + value
+      else:
+        values[keyword] = value
+        keywords.append(keyword)
+    return [(keyword, values[keyword]) for keyword in keywords]
+
+  @classmethod
+  def preset(cls, name, dimension=None):
+    """
+    Create parameters tuned for a given trade-off between speed and tour
+    quality.
+
+    Parameters
+    ----------
+    name: str
+      Name of the preset:
+
+      - `'fast'`: one run with few trials, greedy initial tour and a short
+        ascent.
+      - `'balanced'`: the LKH defaults (5 candidates and `dimension` trials)
+        with 5 runs for instances of up to 1000 nodes.
+      - `'large-instance'`: sparse (Delaunay) ascent and candidate set,
+        greedy initial tour and a number of trials inversely proportional to
+        the size of the instance, so that the solve time grows almost
+        linearly.
+
+      Above 10000 nodes every preset uses the sparse ascent and candidate
+      set, which requires an instance given by coordinates.
+    dimension: int
+      Number of nodes of the instance. If `None`, a medium size instance is
+      assumed.
+
+    Returns
+    -------
+    params: SolverParameters
+      The parameters of the preset
+    """
+    if name not in cls._presets:
+      raise ValueError('Unknown preset: {}. Expected one of {}'.format(name,
+                                            ', '.join(sorted(cls._presets))))
+    if dimension is None:
+      dimension = 1000
+    params = cls()
+    params.max_candidates = 5
+    params.runs = 1
+    large = name == 'large-instance' or dimension > 10000
+    if large:
+      params.candidate_set_type = 'DELAUNAY'
+      params.initial_tour_algorithm = 'GREEDY'
+      params.initial_period = 100
+      params.max_candidates_symmetric = True
+    if name == 'fast':
+      params.initial_tour_algorithm = 'GREEDY'
+      params.initial_period = 100
+      params.max_trials = max(1, min(100, 10**5 // dimension))
+    elif large:
+      params.max_trials = max(10, min(1000, 10**6 // dimension))
+    else:
+      params.max_trials = dimension
+      params.runs = 5 if dimension <= 1000 else 1
+    return params
+
+# Called with the problem file and the info of every solve
+_metrics_hook = None
+
 def lkh_solver(problem_file, params, pkg='lkh_solver', rosnode='lkh_solver',
-                                                      working_path='/tmp/lkh'):
+              working_path='/tmp/lkh', pi_cache=None, merge_tour_files=(),
+              initial_tour_file=None, input_tour_file=None, candidate_files=(),
+              pi_file=None, timeout=None, candidate_cache=None,
+              result_cache=None, scratch=False, exact_threshold=None):
   """
   Run the `lkh_solver` on the given `problem_file`. The `lkh_solver` node will
   generate several files (`.par`, `.pi`, `.tour`, etc) that can be used for
-  debugging.
+  debugging. Tiny problems are solved exactly in Python instead, see
+  `exact_threshold`.
 
   Parameters
   ----------
@@ -118,51 +415,1509 @@ def lkh_solver(problem_file, params, pkg='lkh_solver', rosnode='lkh_solver',
     ROS node of the solver
   working_path: str
     Path to be used by the LKH solver to store the required intermediate files
+  pi_cache: PenaltyCache
+    If given, the penalties (Pi-values) computed by the ascent are stored in
+    the cache and re-used by later calls on the same problem. See
+    :class:`cache.PenaltyCache` for details.
+  merge_tour_files: list
+    Paths of tour files to be merged with the tours found by the solver
+    (`MERGE_TOUR_FILE`).
+  initial_tour_file: str
+    Path of a tour file used to initialize the first run of the solver
+    (`INITIAL_TOUR_FILE`).
+  input_tour_file: str
+    Path of a tour file whose edges are added to the candidate sets
+    (`INPUT_TOUR_FILE`).
+  candidate_files: list
+    Paths of candidate set files (`CANDIDATE_FILE`). If a single file is given
+    and it does not exist, the solver writes its candidate set to it.
+  pi_file: str
+    Path of the penalties file (`PI_FILE`). If it exists, the ascent is
+    skipped. Otherwise, the penalties are written to it. By default, a
+    temporary file is used and `pi_cache` is consulted.
+  timeout: float
+    Hard wall-clock budget in seconds. The `total_time_limit` of the solver
+    (checked by LKH between trials and runs) is set to 90% of the budget and
+    the solver is killed if it is still running when the budget is
+    exhausted. In both cases the best tour written so far by the solver is
+    returned. If the solver did not write any tour (e.g. it was killed during
+    the ascent or it failed), a cheap tour is returned instead: the
+    `initial_tour_file`, the nodes along a Hilbert curve or the nearest
+    neighbour tour. The penalties and candidate sets completely written
+    before the solver was killed are kept (and cached).
+  candidate_cache: CandidateCache
+    If given, the candidate sets created by the solver are stored in the
+    cache and re-used by later calls on the same problem. Ignored when
+    `candidate_files` are given. See :class:`cache.CandidateCache` for
+    details.
+  result_cache: ResultCache
+    If given, the result of an identical previous request (same problem and
+    input files content, parameters, solver node and `timeout`) is returned
+    without running the solver. Then, the `cpu_time` is the one of the
+    lookup, `solve_time` is the one of the original call and the details of
+    the solver process (`trace`, `timings`, `io`, `peak_rss_mb`, `profile`)
+    are `None`. Not used when the `pi_file` or the `candidate_files` do not
+    exist yet (they are written by the solver). See
+    :class:`cache.ResultCache` for details.
+  scratch: bool or str
+    If set, the files exchanged with the solver are placed in a private
+    directory inside a memory-backed location (see :func:`scratch_path`),
+    or inside the given directory, instead of `working_path`. The directory
+    is removed when the call returns, also on errors and timeouts.
+  exact_threshold: int
+    Problems with at most this number of nodes are solved exactly (see
+    :func:`exact.solve_problem_file`) without running the solver, unless
+    `pi_file` or `candidate_files` are given (they are written by the
+    solver). By default, :data:`exact.MAX_DIMENSION`. `0` disables it.
 
   Returns
   -------
   tour: list
-    The near-optimal tour found using the LKH heuristics.
+    The near-optimal tour found using the LKH heuristics. `None` if the solver
+    did not find any tour.
   info: dict
-    Extra information about the solver call. It includes the CPU time,
-    `stdout` and `stderr`
+    Extra information about the solver call. It includes the CPU time (wall
+    time of the whole call), the `cost` of the tour, `stdout`, `stderr` and
+    the `returncode` of the solver (`None` if it did not run). The output of
+    the solver is parsed into `trace` (see :func:`parser.parse_trace`) and
+    `timings`, the wall time in seconds of each phase: `prepare` (writing the
+    input files), `startup` (until the solver prints its first line), `read`
+    (reading the problem), `ascent`, `candidates` (creating the candidate sets
+    after the ascent), `search` (the runs), `solver` (the whole solver
+    process) and `total`. Phases not reported by the solver are `None`, most
+    of them require a `trace_level` of at least 1. `peak_rss_mb` is the peak
+    resident memory of the solver process, sampled from `/proc` while it
+    prints (`None` if not available). `profile` has the profiling counters of
+    the instrumented solver node `lkh_solver_profile` (see
+    :func:`parser.parse_profile`), `None` for the other nodes. When using
+    `pi_cache`, `pi_cache` is either `'hit'` or `'miss'`, and likewise
+    `candidate_cache` when using `candidate_cache` and `result_cache`. When
+    using `timeout`, `timed_out` is `True` if the solver had to be killed and
+    `fallback_tour` is `True` if the returned tour is the cheap tour. `io` has
+    the `bytes_written` (parameters file) and `bytes_read` (tour file) by this
+    process and the `solver_bytes_read` and `solver_bytes_written` by the
+    solver process (all its I/O including its output, `None` if `/proc` is not
+    available). The `info` is also passed to the metrics hook, see
+    :func:`set_metrics_hook`. If the problem was solved exactly, `exact` is
+    `True`, `stdout` and `stderr` are empty and the details of the solver
+    process (`trace`, `timings`, `io`, `peak_rss_mb`, `profile`) are `None`.
+  """
+  if pi_file is None and not candidate_files:
+    result = _solve_exact(problem_file, exact_threshold, timeout)
+    if result is not None:
+      return result
+  if scratch:
+    scratch_dir = _scratch_dir(scratch)
+    try:
+      return lkh_solver(problem_file, params, pkg=pkg, rosnode=rosnode,
+                working_path=scratch_dir, pi_cache=pi_cache,
+                merge_tour_files=merge_tour_files,
+                initial_tour_file=initial_tour_file,
+                input_tour_file=input_tour_file,
+                candidate_files=candidate_files, pi_file=pi_file,
+                timeout=timeout, candidate_cache=candidate_cache,
+                result_cache=result_cache, exact_threshold=0)
+    finally:
+      shutil.rmtree(scratch_dir, ignore_errors=True)
+  result_key = None
+  # A missing penalties or candidates file is written by the solver, which a
+  # cached result would skip
+  if any(filename is not None and not os.path.isfile(filename)
+          for filename in [pi_file] + list(candidate_files)):
+    result_cache = None
+  if result_cache is not None:
+    starttime = time.time()
+    inputs = list(merge_tour_files) + list(candidate_files)
+    inputs += [initial_tour_file, input_tour_file, pi_file]
+    inputs = [filename for filename in inputs
+                      if filename is not None and os.path.isfile(filename)]
+    result_key = result_cache.key(problem_file, params, inputs, pkg=pkg,
+                                        rosnode=rosnode, timeout=timeout)
+    result = result_cache.lookup(result_key)
+    if result is not None:
+      tour, cached = result
+      info = _solverless_info(cached['cost'], starttime, timeout)
+      info['solve_time'] = cached['solve_time']
+      info['result_cache'] = 'hit'
+      if _metrics_hook is not None:
+        _metrics_hook(problem_file, info)
+      return tour, info
+  job = _prepare_solve(problem_file, params, working_path, pi_cache=pi_cache,
+                pi_file=pi_file, timeout=timeout,
+                merge_tour_files=merge_tour_files,
+                initial_tour_file=initial_tour_file,
+                input_tour_file=input_tour_file,
+                candidate_files=candidate_files,
+                candidate_cache=candidate_cache)
+  if result_key is not None:
+    job['result_cache'] = result_cache
+    job['result_key'] = result_key
+  # Call the LKH solver. Its output is echoed when tracing
+  echo = job['params'].trace_level > 0
+  monitor = _TraceMonitor()
+  process = Popen(['rosrun', pkg, rosnode, job['basename']+'.par'],
+                              cwd=working_path, stdout=PIPE, stderr=PIPE)
+  monitor.pid = process.pid
+  timed_out = []
+  if timeout is not None:
+    def kill():
+      timed_out.append(True)
+      try:
+        process.kill()
+      except OSError:
+        # The process already finished
+        pass
+    remaining = max(0., timeout - (time.time()-job['starttime']))
+    timer = threading.Timer(remaining, kill)
+    timer.start()
+  # Read stderr concurrently, the pipe could fill up otherwise
+  errors = []
+  def read_stderr():
+    for line in iter(process.stderr.readline, b''):
+      line = line.decode(errors='replace')
+      errors.append(line)
+      if echo:
+        sys.stderr.write(line)
+  stderr_thread = threading.Thread(target=read_stderr)
+  stderr_thread.start()
+  try:
+    for line in iter(process.stdout.readline, b''):
+      line = monitor.append(line.decode(errors='replace'))
+      if echo:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+    monitor.sample()
+    process.wait()
+  except:
+    # Do not leave the solver running (e.g. on KeyboardInterrupt)
+    process.kill()
+    process.wait()
+    raise
+  finally:
+    stderr_thread.join()
+    process.stdout.close()
+    process.stderr.close()
+    if timeout is not None:
+      timer.cancel()
+  return _finish_solve(job, process.returncode, ''.join(monitor.lines),
+                    ''.join(errors), len(timed_out) > 0, monitor=monitor)
+
+class _TraceMonitor(object):
+  """
+  Record the lines printed by a solver process, the time at which they were
+  printed, the peak memory and the I/O of the process. Both are cumulative,
+  therefore `/proc` is sampled at most every `interval` seconds while lines
+  are printed and once more by :meth:`sample` when the output ends (before
+  the process is reaped).
   """
+  # Minimum time between two samples of /proc (seconds)
+  interval = 0.1
+
+  def __init__(self):
+    self.pid = None
+    self.starttime = time.time()
+    self.endtime = None
+    self.sampletime = None
+    self.lines = []
+    self.stamps = []
+    self.peak_rss = None
+    self.io = dict()
+
+  def append(self, line):
+    now = time.time()
+    self.stamps.append(now - self.starttime)
+    self.lines.append(line)
+    if self.sampletime is None or now - self.sampletime >= self.interval:
+      self.sample()
+    return line
+
+  def sample(self):
+    # The status of a process that already exited has no VmHWM, the last
+    # sampled value is kept
+    self.sampletime = time.time()
+    try:
+      with open('/proc/{}/status'.format(self.pid), 'r') as f:
+        for status in f:
+          if status.startswith('VmHWM:'):
+            self.peak_rss = max(self.peak_rss or 0.,
+                                int(status.split()[1]) / 1024.)
+            break
+      with open('/proc/{}/io'.format(self.pid), 'r') as f:
+        for status in f:
+          key, value = status.split(':')
+          if key in ('rchar', 'wchar'):
+            self.io[key] = int(value)
+    except (IOError, OSError):
+      pass
+
+  def finish(self):
+    if self.endtime is None:
+      self.endtime = time.time()
+
+def scratch_path():
+  """
+  Return the memory-backed directory used for the scratch files (see the
+  `scratch` argument of :func:`lkh_solver`): `/dev/shm` if available,
+  otherwise the default temporary directory.
+
+  Returns
+  -------
+  path: str
+    The directory
+  """
+  if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+    return '/dev/shm'
+  return tempfile.gettempdir()
+
+def _scratch_dir(scratch):
+  # Create a private scratch directory. See lkh_solver
+  base = scratch if isinstance(scratch, str) else scratch_path()
+  return tempfile.mkdtemp(prefix='lkh_', dir=base)
+
+def set_metrics_hook(hook):
+  """
+  Set a function called with the `problem_file` and the `info` of every
+  solver call that runs the solver node (:func:`lkh_solver` and the
+  functions built on it, and :class:`aio.AsyncSolver`), e.g. to export the
+  `timings` and the `trace` statistics to a metrics system.
+
+  Parameters
+  ----------
+  hook: callable
+    The hook. `None` removes it.
+
+  Returns
+  -------
+  previous: callable
+    The previous hook (`None` if there was none)
+  """
+  global _metrics_hook
+  previous = _metrics_hook
+  _metrics_hook = hook
+  return previous
+
+def _solverless_info(cost, starttime, timeout):
+  # The info of a call that did not run the solver, with the same keys as
+  # the one returned by _finish_solve. See lkh_solver
+  info = dict(cpu_time=time.time()-starttime, cost=cost, stdout='', stderr='',
+              returncode=None, trace=None, timings=None, io=None,
+              peak_rss_mb=None, profile=None)
+  if timeout is not None:
+    info['timed_out'] = False
+    info['fallback_tour'] = False
+  return info
+
+def _exact_info(cost, starttime, timeout):
+  # The info of a problem solved exactly. See lkh_solver
+  info = _solverless_info(cost, starttime, timeout)
+  info['exact'] = True
+  return info
+
+def _solve_exact(problem_file, exact_threshold, timeout=None):
+  # Solve a tiny problem file exactly. See lkh_solver
+  starttime = time.time()
+  if exact_threshold is None:
+    exact_threshold = exact.MAX_DIMENSION
+  if exact_threshold < 1:
+    return None
+  result = exact.solve_problem_file(problem_file, exact_threshold)
+  if result is None:
+    return None
+  nodes, cost = result
+  name = os.path.splitext(os.path.basename(problem_file))[0]
+  tour = (nodes, dict(NAME=name+'.tour', TYPE='TOUR', DIMENSION=len(nodes),
+                      COMMENT='Length = {:d}'.format(cost)))
+  info = _exact_info(cost, starttime, timeout)
+  if _metrics_hook is not None:
+    _metrics_hook(problem_file, info)
+  return tour, info
+
+def _solve_array_exact(problem, exact_threshold, timeout=None):
+  # Solve a tiny problem given by arrays exactly. See _solve_exact
+  starttime = time.time()
+  if exact_threshold is None:
+    exact_threshold = exact.MAX_DIMENSION
+  coords = problem.get('coords')
+  weights = problem.get('weights')
+  fixed_edges = problem.get('fixed_edges')
+  if ((coords is None) == (weights is None) or
+      (fixed_edges is not None and len(fixed_edges) > 0)):
+    return None
+  if len(coords if coords is not None else weights) > exact_threshold:
+    return None
+  if coords is not None:
+    try:
+      weights = evaluate.distance_matrix(coords,
+                                          problem.get('edge_weight_type'))
+    except ValueError:
+      return None
+  tour, cost = exact.solve(weights, problem.get('clusters'))
+  return tour, _exact_info(cost, starttime, timeout)
+
+def _prepare_solve(problem_file, params, working_path, pi_cache=None,
+                  pi_file=None, timeout=None, candidate_cache=None, **files):
+  # Write the files required by a solver call. See lkh_solver
   starttime = time.time()
   # Check parameters have been initialized
   if not params.initialized():
     raise ValueError('SolverParameters have not been initialized')
+  if timeout is not None:
+    # The time limit of the solver is checked for every run separately, the
+    # total time limit also includes the ascent and all the runs
+    time_limit = round(0.9*timeout, 3)
+    if (params.total_time_limit is None or
+        params.total_time_limit > time_limit):
+      params = copy.copy(params)
+      params.total_time_limit = time_limit
   # Create a TMP folder required for the GTSP solver
   def create_dir(dpath):
     if not os.path.isdir(dpath):
       try:
         os.makedirs(dpath)
-      except OSError:
-        raise OSError('Failed to create: {}'.format(dpath))
+      except OSError as e:
+        # Another process may have created it concurrently
+        if e.errno != errno.EEXIST:
+          raise OSError('Failed to create: {}'.format(dpath))
   tmp_path = os.path.join(working_path, 'TMP')
   create_dir(working_path)
   create_dir(tmp_path)
   # Generate the parameters file
-  basename = parser.write_parameters_file(problem_file, params, working_path)
-  # Call the LKH solver
-  if params.trace_level > 0:
-    outpipe = None
-  else:
-    outpipe = PIPE
-  process = Popen(['rosrun', pkg, rosnode, basename+'.par'],
-                              cwd=working_path, stdout=outpipe, stderr=outpipe)
-  stdout, stderr = process.communicate()
-  # Read the tour
+  if pi_file is not None:
+    # The penalties file is managed by the caller
+    pi_cache = None
+  candidate_key = None
+  if candidate_cache is not None and not files.get('candidate_files'):
+    # The candidate sets are read from (or written to) a file in the working
+    # path
+    tour_files = list(files.get('merge_tour_files', ()))
+    tour_files += [files.get(name) for name in ('initial_tour_file',
+                'input_tour_file') if files.get(name) is not None]
+    candidate_key = candidate_cache.key(problem_file, params, tour_files)
+    problem_name = os.path.splitext(os.path.basename(problem_file))[0]
+    candidate_filename = os.path.join(working_path, problem_name+'.cand')
+    candidate_hit = candidate_cache.fetch(candidate_key, candidate_filename)
+    if not candidate_hit and os.path.isfile(candidate_filename):
+      os.remove(candidate_filename)
+    files['candidate_files'] = [candidate_filename]
+  basename = parser.write_parameters_file(problem_file, params, working_path,
+                                                      pi_file=pi_file, **files)
+  pi_filename = basename+'.pi'
+  if pi_file is None and os.path.isfile(pi_filename):
+    os.remove(pi_filename)
+  # Remove the tour of a previous call, it could be mistaken for a new one
   tour_filename = basename+'.tour'
+  if os.path.isfile(tour_filename):
+    os.remove(tour_filename)
+  job = dict(starttime=starttime, params=params, basename=basename,
+              problem_file=problem_file,
+              tmp_path=tmp_path, pi_file=pi_file, pi_cache=pi_cache,
+              timeout=timeout, candidate_cache=None,
+              initial_tour_file=files.get('initial_tour_file'))
+  if candidate_key is not None:
+    job['candidate_cache'] = candidate_cache
+    job['candidate_key'] = candidate_key
+    job['candidate_cache_hit'] = candidate_hit
+    job['candidate_file'] = candidate_filename
+  if pi_cache is not None:
+    job['pi_key'] = pi_cache.key(problem_file, params)
+    job['pi_cache_hit'] = pi_cache.fetch(job['pi_key'], pi_filename)
+  # Files written by the solver for later calls. They may be incomplete if the
+  # solver is killed
+  candidate_files = list(files.get('candidate_files', []))
+  job['outputs'] = [filename for filename in [pi_file] + candidate_files[:1]
+                      if filename is not None and not os.path.isfile(filename)]
+  return job
+
+def _finish_solve(job, returncode, stdout, stderr, timed_out=False,
+                                                                monitor=None):
+  # Read the results of a solver call and clean up. See lkh_solver
+  if monitor is not None:
+    monitor.finish()
+  basename = job['basename']
+  pi_filename = basename+'.pi'
+  tour_filename = basename+'.tour'
+  # Read the tour. The solver writes every improvement, therefore the tour is
+  # available even if it was killed
   tour = None
   if os.path.isfile(tour_filename):
     tour = parser.read_tsplib_tour(tour_filename)
-  cpu_time = time.time() - starttime
+  io = dict(bytes_written=os.path.getsize(basename+'.par'),
+            bytes_read=os.path.getsize(tour_filename) if tour is not None else 0)
+  cpu_time = time.time() - job['starttime']
   # Extra info
   info = dict()
   info['cpu_time'] = cpu_time
+  info['cost'] = parser.read_tour_length(tour[1]) if tour is not None else None
+  info['returncode'] = returncode
+  fallback = None
+  if tour is None and job['timeout'] is not None:
+    # Killed (or failed) before writing any tour, e.g. during the ascent
+    fallback = _fallback_tour(job)
+    if fallback is not None:
+      tour = (fallback[0], dict())
+      info['cost'] = fallback[1]
   info['stdout'] = stdout
   info['stderr'] = stderr
+  if monitor is not None:
+    trace = parser.parse_trace(monitor.lines, monitor.stamps)
+    info['trace'] = trace
+    info['timings'] = _phase_timings(job, monitor, trace, cpu_time)
+    info['peak_rss_mb'] = monitor.peak_rss
+    info['profile'] = parser.parse_profile(monitor.lines)
+    io['solver_bytes_read'] = monitor.io.get('rchar')
+    io['solver_bytes_written'] = monitor.io.get('wchar')
+  info['io'] = io
+  if job['timeout'] is not None:
+    info['timed_out'] = timed_out
+    info['fallback_tour'] = fallback is not None
+  pi_cache = job['pi_cache']
+  if pi_cache is not None:
+    pi_cache_hit = job['pi_cache_hit']
+    info['pi_cache'] = 'hit' if pi_cache_hit else 'miss'
+    if (not pi_cache_hit and (returncode == 0 or timed_out) and
+        _written(pi_filename)):
+      pi_cache.put(job['pi_key'], pi_filename)
+  candidate_cache = job['candidate_cache']
+  if candidate_cache is not None:
+    candidate_hit = job['candidate_cache_hit']
+    candidate_filename = job['candidate_file']
+    info['candidate_cache'] = 'hit' if candidate_hit else 'miss'
+    if os.path.isfile(candidate_filename):
+      if (not candidate_hit and (returncode == 0 or timed_out) and
+          _written(candidate_filename)):
+        candidate_cache.put(job['candidate_key'], candidate_filename,
+                                                                  move=True)
+      else:
+        os.remove(candidate_filename)
   # Clean up
-  os.remove(basename+'.pi')
-  os.rmdir(tmp_path)
+  if job['pi_file'] is None and os.path.isfile(pi_filename):
+    os.remove(pi_filename)
+  if timed_out:
+    # Keep the outputs that were completely written before the solver was
+    # killed
+    for filename in job['outputs']:
+      if os.path.isfile(filename) and not _written(filename):
+        os.remove(filename)
+    if os.path.isfile(tour_filename+'.tmp'):
+      os.remove(tour_filename+'.tmp')
+  try:
+    os.rmdir(job['tmp_path'])
+  except OSError:
+    # Still in use by a concurrent call
+    pass
+  result_cache = job.get('result_cache')
+  if result_cache is not None:
+    info['result_cache'] = 'miss'
+    if returncode == 0 and not timed_out and tour is not None:
+      result_cache.store(job['result_key'], tour, info)
+  if _metrics_hook is not None:
+    _metrics_hook(job['problem_file'], info)
+  return tour, info
+
+def _written(filename):
+  # Whether the solver finished writing a penalties or candidates file. Both
+  # end with EOF
+  try:
+    with open(filename, 'rb') as f:
+      f.seek(0, os.SEEK_END)
+      if f.tell() < 4:
+        return False
+      f.seek(-4, os.SEEK_END)
+      return f.read() == b'EOF\n'
+  except (IOError, OSError):
+    return False
+
+def _fallback_tour(job):
+  # A cheap tour for a solver call killed before writing any tour: the
+  # initial tour if given, otherwise the nodes along a Hilbert curve (given
+  # by coordinates) or the nearest neighbour tour (explicit weights). A GTSP
+  # tour visits the first node reached in every cluster. Returns the tour
+  # (node numbers starting at 1) and its cost, or None if the problem is not
+  # supported
+  try:
+    data = evaluate.problem_data(parser.read_tsplib_problem(
+                                                        job['problem_file']))
+  except ValueError:
+    return None
+  coords = data.get('coords')
+  weights = data.get('weights')
+  clusters = data['clusters']
+  initial_tour_file = job.get('initial_tour_file')
+  if initial_tour_file is not None and os.path.isfile(initial_tour_file):
+    tour = parser.read_tsplib_tour(initial_tour_file)[0] - 1
+  elif coords is not None:
+    tour = hilbert_order(coords)
+    if clusters is not None:
+      _, first = np.unique(clusters[tour], return_index=True)
+      tour = tour[np.sort(first)]
+  else:
+    n = weights.shape[0]
+    visited = np.zeros(n, dtype=bool)
+    tour = [0]
+    while True:
+      if clusters is None:
+        visited[tour[-1]] = True
+      else:
+        visited[clusters == clusters[tour[-1]]] = True
+      if visited.all():
+        break
+      tour.append(int(np.argmin(np.where(visited, np.inf,
+                                                      weights[tour[-1]]))))
+    tour = np.array(tour, dtype=int)
+  cost = evaluate.tour_costs(tour, coords=coords, weights=weights,
+                              edge_weight_type=data.get('edge_weight_type'))
+  return tour + 1, int(cost)
+
+def _phase_timings(job, monitor, trace, total):
+  # Wall time of each phase of a solver call. See lkh_solver
+  timings = dict(prepare=monitor.starttime - job['starttime'], startup=None,
+                  read=None, ascent=trace['ascent_time'], candidates=None,
+                  search=None, solver=monitor.endtime - monitor.starttime,
+                  total=total)
+  if monitor.stamps:
+    timings['startup'] = monitor.stamps[0]
+  for line, stamp in zip(monitor.lines, monitor.stamps):
+    if line.startswith('Reading PROBLEM_FILE'):
+      # Printed once the problem has been read
+      timings['read'] = stamp - monitor.stamps[0]
+      break
+  if trace['preprocessing_time'] is not None:
+    timings['candidates'] = max(0., trace['preprocessing_time'] -
+                                    (trace['ascent_time'] or 0.))
+  statistics = trace['statistics']
+  if trace['runs']:
+    timings['search'] = sum(run['time'] for run in trace['runs'])
+  elif 'time_avg' in statistics:
+    timings['search'] = statistics['time_avg'] * max(1,
+                                              statistics.get('runs', 1))
+  return timings
+
+def _solve_array(params, name, kwargs, **problem):
+  result = _solve_array_exact(problem, kwargs.pop('exact_threshold', None),
+                                                        kwargs.get('timeout'))
+  if result is not None:
+    return result
+  library = kwargs.pop('library', None)
+  # GLKH does not read the binary sections
+  binary = problem.get('clusters') is None
+  if library is not None:
+    binary = binary and hasattr(library._lib, 'LKHSolveBuffer')
+    content, _ = parser.format_tsplib_problem(name=name, binary=binary,
+                                                                  **problem)
+    return library.solve(params, problem=content)
+  scratch = kwargs.pop('scratch', False)
+  if scratch:
+    # The problem file is also a scratch file
+    kwargs['working_path'] = _scratch_dir(scratch)
+  working_path = kwargs.get('working_path', '/tmp/lkh')
+  if not os.path.isdir(working_path):
+    os.makedirs(working_path)
+  if problem.get('clusters') is not None:
+    kwargs.setdefault('pkg', 'glkh_solver')
+    kwargs.setdefault('rosnode', 'glkh_solver')
+  problem_file = os.path.join(working_path, name+'.tsp')
+  try:
+    parser.write_tsplib_problem(problem_file, name=name, binary=binary,
+                                                                  **problem)
+    tour, info = lkh_solver(problem_file, params, exact_threshold=0, **kwargs)
+    if info.get('io') is not None:
+      info['io']['bytes_written'] += os.path.getsize(problem_file)
+  finally:
+    if scratch:
+      shutil.rmtree(working_path, ignore_errors=True)
+  if tour is not None:
+    tour = np.array(tour[0], dtype=int) - 1
+  return tour, info
+
+def solve_coords(coords, params, clusters=None, edge_weight_type=None,
+                                                  name='problem', **kwargs):
+  """
+  Solve a TSP (or GTSP) instance given by the coordinates of its nodes. The
+  problem file is written with :func:`parser.write_tsplib_problem`, using
+  the binary sections unless `clusters` is given.
+
+  Parameters
+  ----------
+  coords: array_like
+    Array of shape `(n, 2)` or `(n, 3)` with the node coordinates
+  params: SolverParameters
+    Parameters to be pased to the LKH solver. See :class:`SolverParameters` for
+    details.
+  clusters: array_like
+    Array of length `n` with the cluster label of each node. If given, the
+    instance is solved as a GTSP using the `glkh_solver` package.
+  edge_weight_type: str
+    TSPLIB edge weight type. By default `EUC_2D` or `EUC_3D`.
+  name: str
+    Name of the problem. The problem file is written to the `working_path`
+    using this name.
+  kwargs:
+    Additional arguments passed to :func:`lkh_solver`. If `library` (a
+    :class:`library.SolverLibrary`) is given, the problem is solved
+    in-process instead.
+
+  Returns
+  -------
+  tour: array
+    The tour as indices (starting at 0) into `coords`. For a GTSP, it contains
+    one node per cluster.
+  info: dict
+    Extra information about the solver call. See :func:`lkh_solver`.
+  """
+  return _solve_array(params, name, kwargs, coords=coords, clusters=clusters,
+                                            edge_weight_type=edge_weight_type)
+
+def solve_matrix(weights, params, clusters=None, name='problem', **kwargs):
+  """
+  Solve a TSP (or GTSP) instance given by its matrix of edge weights. A
+  symmetric matrix is solved as a TSP and an asymmetric one as an ATSP. The
+  problem file is written with :func:`parser.write_tsplib_problem`, using
+  the binary sections unless `clusters` is given.
+
+  Parameters
+  ----------
+  weights: array_like
+    Array of shape `(n, n)` with the edge weights. The weights are rounded to
+    the nearest integer.
+  params: SolverParameters
+    Parameters to be pased to the LKH solver. See :class:`SolverParameters` for
+    details.
+  clusters: array_like
+    Array of length `n` with the cluster label of each node. If given, the
+    instance is solved as a GTSP using the `glkh_solver` package.
+  name: str
+    Name of the problem. The problem file is written to the `working_path`
+    using this name.
+  kwargs:
+    Additional arguments passed to :func:`lkh_solver`. If `library` (a
+    :class:`library.SolverLibrary`) is given, the problem is solved
+    in-process instead.
+
+  Returns
+  -------
+  tour: array
+    The tour as indices (starting at 0) into `weights`. For a GTSP, it contains
+    one node per cluster.
+  info: dict
+    Extra information about the solver call. See :func:`lkh_solver`.
+  """
+  return _solve_array(params, name, kwargs, weights=weights, clusters=clusters)
+
+def solve_gtsp(clusters, params, coords=None, weights=None,
+                              edge_weight_type=None, name='problem', **kwargs):
+  """
+  Solve a GTSP instance given by the cluster of each node and either the node
+  coordinates or the matrix of edge weights. The tour visits exactly one node
+  of every cluster. The instance is solved using the `glkh_solver` package.
+
+  Parameters
+  ----------
+  clusters: array_like
+    Array of length `n` with the cluster label of each node. The labels can be
+    any sortable values, e.g. integers or strings.
+  params: SolverParameters
+    Parameters to be pased to the GLKH solver. See :class:`SolverParameters`
+    for details.
+  coords: array_like
+    Array of shape `(n, 2)` or `(n, 3)` with the node coordinates
+  weights: array_like
+    Array of shape `(n, n)` with the edge weights. The weights are rounded to
+    the nearest integer.
+  edge_weight_type: str
+    TSPLIB edge weight type for `coords`. By default `EUC_2D` or `EUC_3D`.
+  name: str
+    Name of the problem. The problem file is written to the `working_path`
+    using this name.
+  kwargs:
+    Additional arguments passed to :func:`lkh_solver`. If `library` (a
+    :class:`library.SolverLibrary` of `glkh`) is given, the problem is solved
+    in-process instead.
+
+  Returns
+  -------
+  tour: array
+    The tour as indices (starting at 0) of the visited nodes, one per cluster.
+    `None` if the solver failed.
+  info: dict
+    Extra information about the solver call (see :func:`lkh_solver`) plus
+    `labels`, the sorted cluster labels, `selected`, the index of the node
+    visited in each cluster of `labels`, and `cluster_tour`, the labels in the
+    order they are visited.
+  """
+  clusters = np.asarray(clusters)
+  labels, set_ids = np.unique(clusters, return_inverse=True)
+  set_ids = set_ids.ravel()
+  tour, info = _solve_array(params, name, kwargs, coords=coords,
+          weights=weights, clusters=set_ids, edge_weight_type=edge_weight_type)
+  info['labels'] = labels
+  if tour is None:
+    info['selected'] = None
+    info['cluster_tour'] = None
+    return tour, info
+  if not evaluate.validate_tours(tour, set_ids.shape[0], set_ids):
+    raise ValueError('The tour does not visit every cluster exactly once')
+  visited = set_ids[tour]
+  selected = np.empty(labels.shape[0], dtype=int)
+  selected[visited] = tour
+  info['selected'] = selected
+  info['cluster_tour'] = labels[visited]
+  return tour, info
+
+def _layer_lengths(a, b, coords, weights, edge_weight_type):
+  # Lengths of every edge from the nodes `a` to the nodes `b`
+  a, b = np.broadcast_arrays(a[:,np.newaxis], b[np.newaxis,:])
+  return evaluate.edge_lengths(a, b, coords, weights, edge_weight_type)
+
+def cluster_optimize(tour, clusters, coords=None, weights=None,
+                              edge_weight_type=None, chunk_size=2**16):
+  """
+  Improve a g-tour by choosing the best node of every cluster while keeping
+  the order in which the clusters are visited (shortest path in a layered
+  network), like the cluster optimization of GLKH's post-optimization. The
+  paths starting at all the nodes of the smallest cluster are computed at
+  once with NumPy, one layer (cluster) at a time. See
+  :func:`evaluate.edge_lengths` for the parameters describing the instance.
+
+  Parameters
+  ----------
+  tour: array_like
+    The g-tour as node indices (starting at 0), one per cluster
+  clusters: array_like
+    Array of length `n` with the cluster label of each node
+  chunk_size: int
+    Maximum number of edge lengths computed at once. The start nodes are
+    split into chunks to bound the memory usage.
+
+  Returns
+  -------
+  tour: array
+    The best g-tour visiting the clusters in the same order, starting at the
+    smallest cluster
+  cost: int
+    The cost of the g-tour
+  """
+  _, set_ids = np.unique(np.asarray(clusters), return_inverse=True)
+  set_ids = set_ids.ravel()
+  tour = np.asarray(tour, dtype=int)
+  if not evaluate.validate_tours(tour, set_ids.shape[0], set_ids):
+    raise ValueError('The tour does not visit every cluster exactly once')
+  # The nodes of every cluster, in the order of the tour, starting at the
+  # smallest cluster
+  order = np.argsort(set_ids, kind='mergesort')
+  bounds = np.concatenate(([0], np.cumsum(np.bincount(set_ids))))
+  visited = set_ids[tour]
+  sizes = bounds[visited+1] - bounds[visited]
+  visited = np.roll(visited, -np.argmin(sizes))
+  layers = [order[bounds[v]:bounds[v+1]] for v in visited]
+  starts = layers[0]
+  if len(layers) == 1:
+    return starts[:1], 0
+  steps = [_layer_lengths(a, b, coords, weights, edge_weight_type)
+                                  for a, b in zip(layers[:-1], layers[1:])]
+  closing = _layer_lengths(layers[-1], starts, coords, weights,
+                                                          edge_weight_type)
+  largest = max(step.size for step in steps)
+  chunk = max(1, chunk_size // largest)
+  best_cost = None
+  for first in range(0, starts.shape[0], chunk):
+    index = np.arange(first, min(first+chunk, starts.shape[0]))
+    # cost[s, v]: shortest path from the start s to the node v of the layer
+    cost = steps[0][index]
+    parents = []
+    for step in steps[1:]:
+      lengths = cost[:,:,np.newaxis] + step
+      parents.append(np.argmin(lengths, axis=1))
+      cost = lengths.min(axis=1)
+    cost = cost + closing[:,index].T
+    s, last = np.unravel_index(np.argmin(cost), cost.shape)
+    if best_cost is None or cost[s, last] < best_cost:
+      best_cost = cost[s, last]
+      # Follow the parents back to the start
+      path = [last]
+      for parent in parents[::-1]:
+        path.append(parent[s, path[-1]])
+      path.append(index[s])
+      best_tour = np.array([layer[v] for layer, v in zip(layers,
+                                                      path[::-1])], dtype=int)
+  return best_tour, int(best_cost)
+
+def _solve_job(job):
+  index, problem_file, params, working_path, kwargs = job
+  job_path = tempfile.mkdtemp(prefix='job{:d}_'.format(index), dir=working_path)
+  try:
+    tour, info = lkh_solver(problem_file, params, working_path=job_path,
+                                                                    **kwargs)
+  finally:
+    shutil.rmtree(job_path, ignore_errors=True)
+  return index, tour, info
+
+def solve_many(problems, params, workers=None, working_path='/tmp/lkh',
+                                                      stats=None, **kwargs):
+  """
+  Solve a batch of independent problems in parallel. Each solver call runs in
+  a pool of `workers` processes using its own scratch directory inside
+  `working_path`, which is removed afterwards. The results are yielded as
+  soon as they are available, therefore their order may differ from the
+  order of `problems`.
+
+  Parameters
+  ----------
+  problems: list
+    Paths to the problem files
+  params: SolverParameters or list
+    Parameters to be pased to the LKH solver. It can be a list with the
+    parameters of each problem.
+  workers: int
+    Maximum number of concurrent solver calls. By default, the number of CPUs.
+  working_path: str
+    Path where the scratch directories of the jobs are created
+  stats: dict
+    If given, it is updated with the aggregate statistics of the batch:
+    number of `jobs`, `wall_time`, `cpu_time` (sum of the `cpu_time` of the
+    jobs), `throughput` (jobs per second) and `speedup` (`cpu_time` divided by
+    `wall_time`).
+  kwargs:
+    Additional arguments passed to :func:`lkh_solver`
+
+  Returns
+  -------
+  results: generator
+    Yields tuples `(index, tour, info)` where `index` is the position of the
+    problem in `problems`. See :func:`lkh_solver` for details about `tour` and
+    `info`.
+  """
+  starttime = time.time()
+  problems = list(problems)
+  if isinstance(params, SolverParameters):
+    params = [params] * len(problems)
+  if len(params) != len(problems):
+    raise ValueError('params must be given for every problem')
+  if workers is None:
+    workers = multiprocessing.cpu_count()
+  if not os.path.isdir(working_path):
+    try:
+      os.makedirs(working_path)
+    except OSError as e:
+      if e.errno != errno.EEXIST:
+        raise OSError('Failed to create: {}'.format(working_path))
+  jobs = [(i, problem_file, job_params, working_path, kwargs)
+                  for i, (problem_file, job_params) in enumerate(zip(problems,
+                                                                    params))]
+  if stats is None:
+    stats = dict()
+  stats['jobs'] = 0
+  stats['cpu_time'] = 0.
+  pool = multiprocessing.Pool(max(1, min(workers, len(jobs))))
+  try:
+    for index, tour, info in pool.imap_unordered(_solve_job, jobs):
+      stats['jobs'] += 1
+      stats['cpu_time'] += info['cpu_time']
+      stats['wall_time'] = time.time() - starttime
+      stats['throughput'] = stats['jobs'] / stats['wall_time']
+      stats['speedup'] = stats['cpu_time'] / stats['wall_time']
+      yield index, tour, info
+    pool.close()
+  except:
+    pool.terminate()
+    raise
+  finally:
+    pool.join()
+
+def solve_multistart(problem_file, params, workers=None, merge=False,
+                                        working_path='/tmp/lkh', **kwargs):
+  """
+  Split the `runs` of the LKH solver across several processes and keep the
+  best tour. The subgradient ascent is computed only once and the resulting
+  penalties (Pi-values) are shared by all the processes through a
+  :class:`cache.PenaltyCache`. Every process starts from a different seed so
+  that, altogether, the runs use the same seeds as a single solver call.
+
+  Parameters
+  ----------
+  problem_file: str
+    Path to the problem file
+  params: SolverParameters
+    Parameters to be pased to the LKH solver. `params.runs` is the total
+    number of runs.
+  workers: int
+    Maximum number of concurrent solver calls. By default, the number of CPUs.
+  merge: bool
+    If set, the best tours of the processes are merged (`MERGE_TOUR_FILE`) by
+    an additional solver call with a single run.
+  working_path: str
+    Path where the files generated by the LKH solver will be placed.
+  kwargs:
+    Additional arguments passed to :func:`lkh_solver`. If `pi_cache` or
+    `candidate_cache` (and `candidate_files`) are not given, temporary caches
+    are used, so that the preprocessing is done only once.
+
+  Returns
+  -------
+  tour: list
+    The best tour found. See :func:`lkh_solver` for details.
+  info: dict
+    Information of the solver call that found the best tour. It also
+    includes the total `cpu_time` and `wall_time`, the `costs` and `seeds` of
+    the processes and, if `merge` is set, the cost of the merged tour
+    (`merge_cost`).
+  """
+  starttime = time.time()
+  if not params.initialized():
+    raise ValueError('SolverParameters have not been initialized')
+  if workers is None:
+    workers = multiprocessing.cpu_count()
+  workers = max(1, min(workers, params.runs))
+  if not os.path.isdir(working_path):
+    try:
+      os.makedirs(working_path)
+    except OSError as e:
+      if e.errno != errno.EEXIST:
+        raise OSError('Failed to create: {}'.format(working_path))
+  tmp_path = None
+  no_candidate_cache = (kwargs.get('candidate_cache') is None and
+                        not kwargs.get('candidate_files'))
+  if kwargs.get('pi_cache') is None or no_candidate_cache:
+    tmp_path = tempfile.mkdtemp(prefix='multistart_', dir=working_path)
+  if kwargs.get('pi_cache') is None:
+    kwargs['pi_cache'] = cache.PenaltyCache(os.path.join(tmp_path, 'pi'))
+  if no_candidate_cache:
+    kwargs['candidate_cache'] = cache.CandidateCache(os.path.join(tmp_path,
+                                                                    'cand'))
+  try:
+    cpu_time = 0.
+    # Compute the penalties once
+    if workers > 1:
+      ascent_params = copy.copy(params)
+      ascent_params.max_trials = 0
+      ascent_params.runs = 1
+      _, _, info = _solve_job((0, problem_file, ascent_params, working_path,
+                                                                      kwargs))
+      cpu_time += info['cpu_time']
+    # Split the runs. Job k starts from the seed following the last run of
+    # job k-1 (LKH increments the seed at the beginning of every run).
+    problems = []
+    job_params = []
+    seed = params.seed
+    for k in range(workers):
+      runs = params.runs // workers + int(k < params.runs % workers)
+      job = copy.copy(params)
+      job.runs = runs
+      job.seed = seed
+      seed += runs
+      problems.append(problem_file)
+      job_params.append(job)
+    results = [None] * workers
+    for index, tour, info in solve_many(problems, job_params, workers=workers,
+                                      working_path=working_path, **kwargs):
+      results[index] = (tour, info)
+      cpu_time += info['cpu_time']
+    costs = [info['cost'] for _, info in results]
+    valid = [k for k, cost in enumerate(costs) if cost is not None]
+    if len(valid) == 0:
+      tour, info = results[0]
+    else:
+      tour, info = results[min(valid, key=lambda k: costs[k])]
+    info['costs'] = costs
+    info['seeds'] = [job.seed for job in job_params]
+    # Merge the best tours
+    if merge and len(valid) > 1:
+      merge_path = tempfile.mkdtemp(prefix='merge_', dir=working_path)
+      try:
+        merge_tour_files = []
+        for k in valid:
+          filename = os.path.join(merge_path, 'job{:d}.tour'.format(k))
+          parser.write_tsplib_tour(filename, results[k][0][0], length=costs[k])
+          merge_tour_files.append(filename)
+        merge_params = copy.copy(params)
+        merge_params.runs = 1
+        merge_tour, merge_info = lkh_solver(problem_file, merge_params,
+                  working_path=merge_path, merge_tour_files=merge_tour_files,
+                  **kwargs)
+      finally:
+        shutil.rmtree(merge_path, ignore_errors=True)
+      cpu_time += merge_info['cpu_time']
+      info['merge_cost'] = merge_info['cost']
+      if merge_info['cost'] is not None and merge_info['cost'] < info['cost']:
+        merge_info.update((key, info[key]) for key in ('costs', 'seeds',
+                                                                'merge_cost'))
+        tour, info = merge_tour, merge_info
+  finally:
+    if tmp_path is not None:
+      shutil.rmtree(tmp_path, ignore_errors=True)
+  info['cpu_time'] = cpu_time
+  info['wall_time'] = time.time() - starttime
+  return tour, info
+
+def hilbert_order(coords, bits=16):
+  """
+  Order points along a Hilbert space-filling curve. Nearby points along the
+  curve are nearby in the plane, therefore the order is a fast approximation
+  of a tour and splitting it into chunks gives compact partitions.
+
+  Parameters
+  ----------
+  coords: array_like
+    Array of shape `(n, 2)` or `(n, 3)`. Only the first two coordinates are
+    used.
+  bits: int
+    Resolution of the curve in bits per coordinate
+
+  Returns
+  -------
+  order: array
+    The indices of the points sorted along the curve
+  """
+  coords = np.asarray(coords, dtype=float)[:,:2]
+  lower = coords.min(axis=0)
+  span = max(float(np.max(coords.max(axis=0) - lower)), 1e-12)
+  side = 1 << bits
+  xy = np.floor((coords - lower) / span * (side-1)).astype(np.int64)
+  x = xy[:,0]
+  y = xy[:,1]
+  index = np.zeros(coords.shape[0], dtype=np.int64)
+  s = side >> 1
+  while s > 0:
+    rx = (x & s) > 0
+    ry = (y & s) > 0
+    index += s * s * ((3 * rx.astype(np.int64)) ^ ry.astype(np.int64))
+    # Rotate the quadrant
+    flip = rx & ~ry
+    x[flip] = side - 1 - x[flip]
+    y[flip] = side - 1 - y[flip]
+    swap = ~ry
+    x[swap], y[swap] = y[swap], x[swap].copy()
+    s >>= 1
+  return np.argsort(index, kind='mergesort')
+
+def partition_coords(coords, size, method='hilbert', iterations=10,
+                                                            chunksize=2**16):
+  """
+  Partition points into compact parts of about `size` points.
+
+  Parameters
+  ----------
+  coords: array_like
+    Array of shape `(n, 2)` or `(n, 3)` with the point coordinates
+  size: int
+    Target number of points per part
+  method: str
+    `'hilbert'` splits the Hilbert curve order (see :func:`hilbert_order`)
+    into chunks of `size` points. `'k-means'` runs Lloyd's algorithm
+    starting from the centroids of the Hilbert chunks; the parts are more
+    compact but their sizes vary.
+  iterations: int
+    Number of iterations of Lloyd's algorithm
+  chunksize: int
+    Number of points assigned at a time by Lloyd's algorithm, it bounds the
+    memory used
+
+  Returns
+  -------
+  parts: list
+    Arrays with the indices of the points of every part. Consecutive parts
+    are close to each other.
+  """
+  coords = np.asarray(coords, dtype=float)
+  n = coords.shape[0]
+  order = hilbert_order(coords)
+  k = max(1, int(round(n / float(size))))
+  parts = np.array_split(order, k)
+  if method == 'hilbert':
+    return parts
+  if method != 'k-means':
+    raise ValueError('Unknown partitioning method: {}'.format(method))
+  centers = np.array([coords[part].mean(axis=0) for part in parts])
+  squared = np.sum(coords**2, axis=1)
+  labels = np.empty(n, dtype=int)
+  for _ in range(iterations):
+    center_squared = np.sum(centers**2, axis=1)
+    for start in range(0, n, chunksize):
+      chunk = slice(start, start+chunksize)
+      dist = (squared[chunk,np.newaxis] - 2*np.dot(coords[chunk], centers.T)
+                + center_squared)
+      labels[chunk] = np.argmin(dist, axis=1)
+    counts = np.bincount(labels, minlength=k)
+    for axis in range(coords.shape[1]):
+      sums = np.bincount(labels, weights=coords[:,axis], minlength=k)
+      centers[counts > 0,axis] = sums[counts > 0] / counts[counts > 0]
+  # Sort the points by part, following the curve order of the centers
+  center_rank = np.empty(k, dtype=int)
+  center_rank[hilbert_order(centers)] = np.arange(k)
+  ranks = center_rank[labels]
+  order = np.argsort(ranks, kind='mergesort')
+  bounds = np.cumsum(np.bincount(ranks, minlength=k))[:-1]
+  return [part for part in np.split(order, bounds) if part.shape[0] > 0]
+
+def _stitch_cycles(coords, cycles, edge_weight_type=None):
+  # Join the cycles (in the given order) into a single tour. Every cycle is
+  # opened at the edge that best connects it to the previous cycle and to the
+  # center of the next one. The lengths use the metric of the instance, the
+  # centers are appended to the coordinates
+  n = coords.shape[0]
+  centers = np.array([coords[cycle].mean(axis=0) for cycle in cycles])
+  points = np.vstack([coords, centers])
+  length = lambda nodes, point: evaluate.edge_lengths(nodes,
+                  np.full(nodes.shape, point), coords=points,
+                  edge_weight_type=edge_weight_type)
+  paths = []
+  last = n + len(cycles) - 1
+  for i, cycle in enumerate(cycles):
+    following = n + (i+1) % len(cycles)
+    if cycle.shape[0] < 2:
+      paths.append(cycle)
+      last = cycle[-1]
+      continue
+    a = cycle
+    b = np.roll(a, -1)
+    removed = evaluate.edge_lengths(a, b, coords=points,
+                                    edge_weight_type=edge_weight_type)
+    # Forward: from the successor of the removed edge around to its start.
+    # Backward: the reverse
+    forward = length(b, last) + length(a, following) - removed
+    backward = length(a, last) + length(b, following) - removed
+    j = int(np.argmin(np.minimum(forward, backward)))
+    if forward[j] <= backward[j]:
+      path = np.roll(cycle, -(j+1))
+    else:
+      path = np.roll(cycle[::-1], j+1-cycle.shape[0])
+    paths.append(path)
+    last = path[-1]
+  return np.concatenate(paths)
+
+def _solve_parts(coords, parts, params, edge_weight_type, paths, workers,
+                                                working_path, stats, kwargs):
+  # Solve the subproblems induced by `parts` in parallel. If `paths` is set,
+  # the first and last nodes of every part are joined by a fixed edge, so
+  # that the solution is a path between them. Returns the cycles (or paths)
+  # as global indices and the cost of the solved problems
+  results = [None] * len(parts)
+  problems = []
+  indices = []
+  for i, part in enumerate(parts):
+    if part.shape[0] <= 3:
+      # Any order is optimal
+      results[i] = part
+      continue
+    problem_file = os.path.join(working_path, 'part{:d}.tsp'.format(i))
+    fixed_edges = [[0, part.shape[0]-1]] if paths else None
+    parser.write_tsplib_problem(problem_file, coords=coords[part],
+                edge_weight_type=edge_weight_type, fixed_edges=fixed_edges)
+    problems.append(problem_file)
+    indices.append(i)
+  job_stats = dict()
+  for index, tour, info in solve_many(problems, params, workers=workers,
+                      working_path=working_path, stats=job_stats, **kwargs):
+    i = indices[index]
+    part = parts[i]
+    if tour is None:
+      raise RuntimeError('Failed to solve the subproblem {:d}'.format(i))
+    local = np.array(tour[0], dtype=int) - 1
+    if paths:
+      # Open the tour at the fixed edge (0, m-1)
+      start = int(np.flatnonzero(local == 0)[0])
+      local = np.roll(local, -start)
+      if local[-1] != part.shape[0] - 1:
+        local = np.roll(local[::-1], 1)
+    results[i] = part[local]
+  for key in ('jobs', 'cpu_time', 'wall_time'):
+    stats[key] = stats.get(key, 0) + job_stats.get(key, 0)
+  for problem_file in problems:
+    os.remove(problem_file)
+  return results
+
+def solve_decomposed(coords, params, subproblem_size=1000,
+                    partitioning='hilbert', refinements=2, workers=None,
+                    edge_weight_type=None, working_path='/tmp/lkh', **kwargs):
+  """
+  Solve a very large instance by decomposition. The points are partitioned
+  into compact subproblems that are solved concurrently in a process pool
+  and the subproblem tours are stitched into a tour of the whole instance.
+  Then, the tour is improved by refinement passes: it is split into segments
+  of `subproblem_size` consecutive nodes and every segment is re-solved
+  concurrently as a path between its (fixed) end nodes. The segment
+  boundaries are shifted by half a segment between passes, so that the seams
+  of the previous pass get optimized. A segment is only replaced if its path
+  gets shorter, therefore every pass improves the tour.
+
+  Parameters
+  ----------
+  coords: array_like
+    Array of shape `(n, 2)` or `(n, 3)` with the node coordinates
+  params: SolverParameters
+    Parameters to be pased to the LKH solver for every subproblem
+  subproblem_size: int
+    Number of nodes of the subproblems
+  partitioning: str
+    Method used to create the initial subproblems, `'hilbert'` or
+    `'k-means'`. See :func:`partition_coords`.
+  refinements: int
+    Number of refinement passes
+  workers: int
+    Maximum number of concurrent solver calls. By default, the number of CPUs.
+  edge_weight_type: str
+    `'EUC_2D'` (the default for 2D coordinates), `'EUC_3D'` (the default
+    for 3D coordinates) or `'CEIL_2D'`
+  working_path: str
+    Path where the scratch directories of the subproblems are created
+  kwargs:
+    Additional arguments passed to :func:`lkh_solver`
+
+  Returns
+  -------
+  tour: array
+    The tour as node indices starting at 0
+  info: dict
+    Extra information: the `cost` of the tour, the `costs` after the
+    stitching and after every refinement pass, the number of `subproblems`,
+    the `cpu_time` (sum of the solver calls), the `wall_time` and the
+    `timings` of the `partition`, `solve`, `stitch` and `refine` stages.
+  """
+  starttime = time.time()
+  if not params.initialized():
+    raise ValueError('SolverParameters have not been initialized')
+  coords = np.asarray(coords)
+  if coords.ndim != 2 or coords.shape[1] not in (2, 3):
+    raise ValueError('coords must have shape (n, 2) or (n, 3)')
+  if edge_weight_type is None:
+    edge_weight_type = 'EUC_2D' if coords.shape[1] == 2 else 'EUC_3D'
+  n = coords.shape[0]
+  subproblem_size = max(4, int(subproblem_size))
+  if not os.path.isdir(working_path):
+    try:
+      os.makedirs(working_path)
+    except OSError as e:
+      if e.errno != errno.EEXIST:
+        raise OSError('Failed to create: {}'.format(working_path))
+  tmp_path = tempfile.mkdtemp(prefix='decomposed_', dir=working_path)
+  timings = dict()
+  stats = dict()
+  costs = []
+  try:
+    # Partition and solve the parts
+    stagetime = time.time()
+    parts = partition_coords(coords, subproblem_size, method=partitioning)
+    timings['partition'] = time.time() - stagetime
+    stagetime = time.time()
+    cycles = _solve_parts(coords, parts, params, edge_weight_type, False,
+                                          workers, tmp_path, stats, kwargs)
+    timings['solve'] = time.time() - stagetime
+    stagetime = time.time()
+    tour = _stitch_cycles(coords, cycles, edge_weight_type)
+    timings['stitch'] = time.time() - stagetime
+    costs.append(int(evaluate.tour_costs(tour, coords=coords,
+                                        edge_weight_type=edge_weight_type)))
+    # Refinement passes over segments of the tour
+    stagetime = time.time()
+    for _ in range(refinements if n > subproblem_size else 0):
+      # Shift the boundaries by half a segment
+      tour = np.roll(tour, -(subproblem_size // 2))
+      bounds = list(range(subproblem_size, n, subproblem_size))
+      if n - bounds[-1] < subproblem_size // 2:
+        # Avoid a tiny last segment
+        bounds.pop()
+      segments = np.split(tour, bounds)
+      paths = _solve_parts(coords, segments, params, edge_weight_type, True,
+                                          workers, tmp_path, stats, kwargs)
+      for i, (segment, path) in enumerate(zip(segments, paths)):
+        old = evaluate.edge_lengths(segment[:-1], segment[1:], coords=coords,
+                                  edge_weight_type=edge_weight_type).sum()
+        new = evaluate.edge_lengths(path[:-1], path[1:], coords=coords,
+                                  edge_weight_type=edge_weight_type).sum()
+        if new < old:
+          segments[i] = path
+      tour = np.concatenate(segments)
+      costs.append(int(evaluate.tour_costs(tour, coords=coords,
+                                        edge_weight_type=edge_weight_type)))
+    timings['refine'] = time.time() - stagetime
+  finally:
+    shutil.rmtree(tmp_path, ignore_errors=True)
+  info = dict()
+  info['cost'] = costs[-1]
+  info['costs'] = costs
+  info['subproblems'] = stats.get('jobs', 0)
+  info['cpu_time'] = stats.get('cpu_time', 0.)
+  info['wall_time'] = time.time() - starttime
+  info['timings'] = timings
+  return tour, info
+
+def _distances(node, coords=None, weights=None, edge_weight_type=None):
+  # Distances from the given node to every node, using the metric of LKH
+  n = coords.shape[0] if coords is not None else weights.shape[0]
+  return evaluate.edge_lengths(np.full(n, node), np.arange(n), coords,
+                                                    weights, edge_weight_type)
+
+def _repair_tour(tour, coords=None, weights=None, edge_weight_type=None):
+  # Insert the nodes missing from the tour using the cheapest insertion
+  n = coords.shape[0] if coords is not None else weights.shape[0]
+  tour = np.array(tour, dtype=int)
+  missing = np.ones(n, dtype=bool)
+  missing[tour] = False
+  for node in np.flatnonzero(missing):
+    if tour.shape[0] < 2:
+      tour = np.append(tour, node)
+      continue
+    succ = np.roll(tour, -1)
+    nodes = np.full(tour.shape[0], node)
+    delta = (evaluate.edge_lengths(tour, nodes, coords, weights,
+                                                      edge_weight_type) +
+             evaluate.edge_lengths(nodes, succ, coords, weights,
+                                                      edge_weight_type) -
+             evaluate.edge_lengths(tour, succ, coords, weights,
+                                                      edge_weight_type))
+    tour = np.insert(tour, np.argmin(delta)+1, node)
+  return tour
+
+def resolve(previous_tour, params, coords=None, weights=None, ids=None,
+            previous_ids=None, moved=(), pi_file=None, candidate_file=None,
+            edge_weight_type=None, name='problem', working_path='/tmp/lkh',
+            **kwargs):
+  """
+  Re-solve a TSP instance that changed slightly since it was last solved,
+  e.g. a few nodes were added, removed or moved. The previous tour is
+  repaired (removed nodes are dropped and new or moved nodes are added using
+  the cheapest insertion) and used as `INITIAL_TOUR_FILE`.
+
+  The penalties (`PI_FILE`) and the candidate set (`CANDIDATE_FILE`) of the
+  previous solve are also re-used for the nodes that did not change. New and
+  moved nodes get a zero penalty and their nearest neighbours as candidates.
+  Therefore the subgradient ascent, whose cost is quadratic in the size of
+  the instance, is skipped.
+
+  Every call writes the penalties and the candidate set of the new problem,
+  so that they can be passed to the next call. The `params` must not change
+  between calls.
+
+  Parameters
+  ----------
+  previous_tour: array_like
+    The previous tour as a sequence of node `ids`. If `None`, the problem is
+    solved from scratch.
+  params: SolverParameters
+    Parameters to be pased to the LKH solver. See :class:`SolverParameters` for
+    details.
+  coords: array_like
+    Array of shape `(n, 2)` or `(n, 3)` with the node coordinates
+  weights: array_like
+    Array of shape `(n, n)` with the edge weights. Used only if `coords` is
+    `None`.
+  ids: array_like
+    Identifier of every node of the new problem. By default, the node indices.
+  previous_ids: array_like
+    Identifier of every node of the previous problem. By default, the node
+    indices.
+  moved: list
+    Identifiers of the nodes whose location (or weights) changed
+  pi_file: str
+    Path to the penalties of the previous problem
+  candidate_file: str
+    Path to the candidate set of the previous problem
+  edge_weight_type: str
+    TSPLIB edge weight type. By default `EUC_2D` or `EUC_3D`.
+  name: str
+    Name of the problem. The problem, penalties and candidate set files are
+    written to the `working_path` using this name.
+  working_path: str
+    Path to be used by the LKH solver to store the required intermediate files
+  kwargs:
+    Additional arguments passed to :func:`lkh_solver`
+
+  Returns
+  -------
+  tour: array
+    The tour as indices (starting at 0) into the new problem
+  info: dict
+    Extra information about the solver call. See :func:`lkh_solver`. It also
+    includes the `pi_file` and the `candidate_file` of the new problem and
+    `warm_start`, which is `True` if the penalties and candidates were re-used.
+  """
+  if (coords is None) == (weights is None):
+    raise ValueError('Either coords or weights must be given')
+  if coords is not None:
+    coords = np.asarray(coords, dtype=float)
+    n = coords.shape[0]
+  else:
+    weights = np.asarray(weights)
+    n = weights.shape[0]
+  if ids is None:
+    ids = range(n)
+  index = dict((node_id, i) for i, node_id in enumerate(ids))
+  if len(index) != n:
+    raise ValueError('The node ids must be unique')
+  moved = set(moved)
+  if not os.path.isdir(working_path):
+    try:
+      os.makedirs(working_path)
+    except OSError as e:
+      if e.errno != errno.EEXIST:
+        raise OSError('Failed to create: {}'.format(working_path))
+  basename = os.path.join(working_path, name)
+  problem_file = basename+'.tsp'
+  problem_type = parser.write_tsplib_problem(problem_file, coords=coords,
+                weights=weights, name=name, edge_weight_type=edge_weight_type)
+  # Repair the previous tour
+  initial_tour_file = None
+  if previous_tour is not None:
+    tour = [index[node_id] for node_id in previous_tour
+                                  if node_id in index and node_id not in moved]
+    tour = _repair_tour(tour, coords=coords, weights=weights,
+                                            edge_weight_type=edge_weight_type)
+    initial_tour_file = basename+'.initial.tour'
+    parser.write_tsplib_tour(initial_tour_file, tour+1)
+  # Re-use the penalties and candidates of the nodes that did not change
+  warm_start = False
+  new_pi_file = None
+  new_candidate_file = None
+  if problem_type == 'TSP':
+    new_pi_file = basename+'.pi'
+    new_candidate_file = basename+'.cand'
+    if (previous_tour is not None and pi_file is not None and
+        candidate_file is not None and os.path.isfile(pi_file) and
+        os.path.isfile(candidate_file)):
+      pi = parser.read_penalties(pi_file)
+      dads, candidates = parser.read_candidates(candidate_file)
+      if previous_ids is None:
+        previous_ids = range(pi.shape[0])
+      # New number (starting at 1) of the previous nodes. 0 if not kept
+      mapping = np.zeros(pi.shape[0]+1, dtype=int)
+      for i, node_id in enumerate(previous_ids):
+        if node_id in index and node_id not in moved:
+          mapping[i+1] = index[node_id] + 1
+      kept = np.flatnonzero(mapping[1:])
+      new_pi = np.zeros(n, dtype=int)
+      new_pi[mapping[kept+1]-1] = pi[kept]
+      new_dads = np.zeros(n, dtype=int)
+      new_candidates = [[] for _ in range(n)]
+      for i in kept:
+        node = mapping[i+1] - 1
+        new_dads[node] = mapping[dads[i]]
+        new_candidates[node] = [(mapping[to], alpha)
+                            for to, alpha in candidates[i] if mapping[to] > 0]
+      fresh = np.ones(n, dtype=bool)
+      fresh[mapping[kept+1]-1] = False
+      k = max(1, min(params.max_candidates, n-1))
+      for node in np.flatnonzero(fresh):
+        dist = _distances(node, coords=coords, weights=weights,
+                          edge_weight_type=edge_weight_type).astype(float)
+        dist[node] = np.inf
+        for other in np.argpartition(dist, k-1)[:k]:
+          new_candidates[node].append((other+1, 0))
+          if (node+1) not in [to for to, _ in new_candidates[other]]:
+            new_candidates[other].append((node+1, 0))
+      parser.write_penalties(new_pi_file, new_pi)
+      parser.write_candidates(new_candidate_file, new_dads, new_candidates)
+      warm_start = True
+    else:
+      # The solver computes them and writes them for the next call
+      for filename in (new_pi_file, new_candidate_file):
+        if os.path.isfile(filename):
+          os.remove(filename)
+  candidate_files = [new_candidate_file] if new_candidate_file else []
+  tour, info = lkh_solver(problem_file, params, working_path=working_path,
+                  initial_tour_file=initial_tour_file, pi_file=new_pi_file,
+                  candidate_files=candidate_files, **kwargs)
+  if tour is not None:
+    tour = np.array(tour[0], dtype=int) - 1
+  info['pi_file'] = new_pi_file
+  info['candidate_file'] = new_candidate_file
+  info['warm_start'] = warm_start
   return tour, info
@@ -1,7 +1,13 @@
 #! /usr/bin/env python
 from __future__ import print_function
 import os
+import copy
+import sys
+import json
+import shutil
+import tempfile
 import unittest
+import numpy as np
 import resource_retriever
 # Tested module
 import lkh_solver as lkh
@@ -20,7 +26,428 @@ class Test_lkh_solver_Modules(unittest.TestCase):
     params = lkh.solver.SolverParameters()
     params.trace_level = 0
     for problem_file in files:
+      # Run the solver also on the tiny problems
+      tour, info = lkh.solver.lkh_solver(problem_file, params,
+                                                          exact_threshold=0)
+
+  def test_lkh_solver_timeout(self):
+    folder = 'package://lkh_solver/tsplib'
+    path = resource_retriever.get_filename(folder, use_protocol=False)
+    problem_file = os.path.join(path, 'berlin52.tsp')
+    params = lkh.solver.SolverParameters()
+    params.trace_level = 0
+    tour, info = lkh.solver.lkh_solver(problem_file, params, timeout=60.)
+    self.assertFalse(info['timed_out'])
+    self.assertEqual(len(tour[0]), 52)
+    tour, info = lkh.solver.lkh_solver(problem_file, params, timeout=0.)
+    self.assertTrue(info['timed_out'])
+    # Killed before writing any tour
+    self.assertTrue(info['fallback_tour'])
+    np.testing.assert_array_equal(np.sort(tour[0]), np.arange(1, 53))
+    # A total time limit shorter than the ascent still makes one trial
+    params.total_time_limit = 0.
+    tour, info = lkh.solver.lkh_solver(problem_file, params)
+    self.assertEqual(info['returncode'], 0)
+    np.testing.assert_array_equal(np.sort(tour[0]), np.arange(1, 53))
+
+  @unittest.skipIf(sys.version_info < (3, 6), 'requires Python 3.6')
+  def test_lkh_solver_trace(self):
+    folder = 'package://lkh_solver/tsplib'
+    path = resource_retriever.get_filename(folder, use_protocol=False)
+    problem_file = os.path.join(path, 'eil51.tsp')
+    params = lkh.solver.SolverParameters()
+    params.trace_level = 1
+    params.runs = 2
+    calls = []
+    previous = lkh.solver.set_metrics_hook(lambda *args: calls.append(args))
+    try:
       tour, info = lkh.solver.lkh_solver(problem_file, params)
+    finally:
+      lkh.solver.set_metrics_hook(previous)
+    self.assertEqual(len(calls), 1)
+    self.assertIs(calls[0][1], info)
+    trace = info['trace']
+    self.assertEqual([run['run'] for run in trace['runs']], [1, 2])
+    self.assertEqual(trace['statistics']['cost_min'], info['cost'])
+    for phase in ['prepare', 'startup', 'read', 'ascent', 'candidates',
+                  'search', 'solver', 'total']:
+      self.assertGreaterEqual(info['timings'][phase], 0.)
+
+  def test_lkh_solver_profile(self):
+    folder = 'package://lkh_solver/tsplib'
+    path = resource_retriever.get_filename(folder, use_protocol=False)
+    problem_file = os.path.join(path, 'eil51.tsp')
+    params = lkh.solver.SolverParameters()
+    params.trace_level = 0
+    params.runs = 2
+    tour, info = lkh.solver.lkh_solver(problem_file, params,
+                                              rosnode='lkh_solver_profile')
+    functions = info['profile']['functions']
+    self.assertEqual(functions['Ascent']['calls'], 1)
+    self.assertGreaterEqual(functions['LinKernighan']['calls'], params.runs)
+    self.assertGreater(functions['Best5OptMove']['calls'], 0)
+    self.assertIn('hit_rate', info['profile']['cache'])
+    tour, info = lkh.solver.lkh_solver(problem_file, params)
+    self.assertIsNone(info['profile'])
+
+  def test_lkh_solver_scratch(self):
+    folder = 'package://lkh_solver/tsplib'
+    path = resource_retriever.get_filename(folder, use_protocol=False)
+    problem_file = os.path.join(path, 'berlin52.tsp')
+    params = lkh.solver.SolverParameters()
+    params.trace_level = 0
+    scratch = tempfile.mkdtemp()
+    tour, info = lkh.solver.lkh_solver(problem_file, params, scratch=scratch)
+    self.assertEqual(len(tour[0]), 52)
+    self.assertGreater(info['io']['bytes_written'], 0)
+    self.assertGreater(info['io']['bytes_read'], 0)
+    tour, info = lkh.solver.lkh_solver(problem_file, params, scratch=scratch,
+                                                                  timeout=0.)
+    self.assertTrue(info['timed_out'])
+    self.assertEqual(os.listdir(scratch), [])
+    shutil.rmtree(scratch)
+
+  def test_AsyncSolver(self):
+    import asyncio
+    folder = 'package://lkh_solver/tsplib'
+    path = resource_retriever.get_filename(folder, use_protocol=False)
+    problem_file = os.path.join(path, 'eil51.tsp')
+    params = lkh.solver.SolverParameters()
+    params.trace_level = 0
+    async_solver = lkh.aio.AsyncSolver(concurrency=2)
+    events = []
+    loop = asyncio.new_event_loop()
+    try:
+      tour, info = loop.run_until_complete(async_solver.solve(problem_file,
+                                              params, progress=events.append))
+    finally:
+      loop.close()
+    self.assertEqual(len(tour[0]), 51)
+    self.assertIn('run', [event['event'] for event in events])
+    self.assertEqual(events[-1]['cost'], info['cost'])
+
+  def test_benchmark(self):
+    instances = [instance for instance in lkh.benchmark.bundled_instances()
+                  if instance['name'] == 'burma14']
+    results = lkh.benchmark.run_benchmark(instances)
+    result = results['instances']['burma14']
+    self.assertEqual(result['returncode'], 0)
+    self.assertEqual(result['gap'], 0.)
+    baseline = json.loads(json.dumps(results))
+    self.assertEqual(lkh.benchmark.compare(results, baseline), [])
+    result['cost'] += 1
+    result['wall_time'] += 1.
+    regressions = lkh.benchmark.compare(results, baseline)
+    metrics = set(regression['metric'] for regression in regressions)
+    self.assertEqual(metrics, set(['cost', 'wall_time']))
+
+  def test_read_tsplib_problem(self):
+    folder = 'package://lkh_solver/tsplib'
+    path = resource_retriever.get_filename(folder, use_protocol=False)
+    problem = lkh.parser.read_tsplib_problem(os.path.join(path, 'hk48.tsp'))
+    weights = problem['weights']
+    self.assertEqual(weights.shape, (48, 48))
+    np.testing.assert_array_equal(weights, weights.T)
+    self.assertEqual(weights[0,1], 273)
+    # Round trip through the writer
+    np.random.seed(1)
+    coords = np.random.rand(10, 2)
+    clusters = np.array([1, 1, 2, 2, 2, 3, 3, 1, 2, 3])
+    filename = os.path.join(tempfile.mkdtemp(), 'problem.gtsp')
+    lkh.parser.write_tsplib_problem(filename, coords=coords, clusters=clusters)
+    problem = lkh.parser.read_tsplib_problem(filename)
+    np.testing.assert_allclose(problem['coords'], coords, atol=1e-6)
+    np.testing.assert_array_equal(problem['clusters'], clusters)
+    shutil.rmtree(os.path.dirname(filename))
+
+  def test_write_tsplib_problem_binary(self):
+    np.random.seed(1)
+    coords = 1000*np.random.rand(30, 2)
+    weights = np.rint(np.linalg.norm(coords[:,np.newaxis] - coords,
+                                                      axis=2)).astype(int)
+    weights[0,1] += 7     # Asymmetric
+    params = lkh.solver.SolverParameters()
+    params.trace_level = 0
+    params.runs = 1
+    folder = tempfile.mkdtemp()
+    for kwargs in [dict(coords=coords), dict(weights=weights)]:
+      costs = []
+      for binary in [False, True]:
+        filename = os.path.join(folder, 'problem.tsp')
+        lkh.parser.write_tsplib_problem(filename, binary=binary, **kwargs)
+        problem = lkh.parser.read_tsplib_problem(filename)
+        for key, value in kwargs.items():
+          np.testing.assert_allclose(problem[key], value, atol=1e-6)
+        tour, info = lkh.solver.lkh_solver(filename, params,
+                                                      working_path=folder)
+        costs.append(info['cost'])
+      self.assertEqual(costs[0], costs[1])
+    shutil.rmtree(folder)
+
+  def test_exact(self):
+    folder = 'package://lkh_solver/tsplib'
+    path = resource_retriever.get_filename(folder, use_protocol=False)
+    problem_file = os.path.join(path, 'burma14.tsp')
+    params = lkh.solver.SolverParameters()
+    params.trace_level = 0
+    tour, info = lkh.solver.lkh_solver(problem_file, params)
+    self.assertTrue(info['exact'])
+    self.assertEqual(info['cost'], 3323)
+    self.assertIsNone(info['timings'])
+    np.testing.assert_array_equal(np.sort(tour[0]), np.arange(1, 15))
+    # Too small for LKH
+    weights = np.array([[0, 1, 5], [5, 0, 1], [1, 5, 0]])
+    tour, info = lkh.solver.solve_matrix(weights, params)
+    self.assertEqual(info['cost'], 3)
+    # Against the solver
+    np.random.seed(1)
+    coords = 1000*np.random.rand(12, 2)
+    clusters = np.arange(12) % 4
+    for kwargs in [dict(), dict(clusters=clusters)]:
+      tour, info = lkh.solver.solve_coords(coords, params, **kwargs)
+      self.assertTrue(info['exact'])
+      _, solver_info = lkh.solver.solve_coords(coords, params,
+                                                exact_threshold=0, **kwargs)
+      self.assertEqual(info['cost'], solver_info['cost'])
+
+  def test_evaluate(self):
+    folder = 'package://lkh_solver/tsplib'
+    path = resource_retriever.get_filename(folder, use_protocol=False)
+    problem_file = os.path.join(path, 'eil51.tsp')
+    params = lkh.solver.SolverParameters()
+    params.trace_level = 0
+    tour, info = lkh.solver.lkh_solver(problem_file, params)
+    problem = lkh.parser.read_tsplib_problem(problem_file)
+    data = lkh.evaluate.problem_data(problem)
+    invalid = tour[0] - 1
+    invalid[0] = invalid[1]
+    result = lkh.evaluate.evaluate_tours([tour[0] - 1, invalid], optimum=426,
+                                                                      **data)
+    np.testing.assert_array_equal(result['valid'], [True, False])
+    self.assertEqual(result['costs'][0], info['cost'])
+    self.assertEqual(result['gaps'][0], 100. * (info['cost'] - 426) / 426)
+    # GTSP
+    clusters = np.arange(51) % 5
+    self.assertTrue(lkh.evaluate.validate_tours([0, 1, 2, 3, 4], 51, clusters))
+    self.assertFalse(lkh.evaluate.validate_tours([0, 1, 2, 3, 5], 51,
+                                                                    clusters))
+
+  def test_PenaltyCache(self):
+    folder = 'package://lkh_solver/tsplib'
+    path = resource_retriever.get_filename(folder, use_protocol=False)
+    problem_file = os.path.join(path, 'berlin52.tsp')
+    cache_path = tempfile.mkdtemp()
+    pi_cache = lkh.cache.PenaltyCache(cache_path)
+    params = lkh.solver.SolverParameters()
+    params.trace_level = 0
+    tour, info = lkh.solver.lkh_solver(problem_file, params, pi_cache=pi_cache)
+    self.assertEqual(info['pi_cache'], 'miss')
+    params.seed = 2
+    tour, info = lkh.solver.lkh_solver(problem_file, params, pi_cache=pi_cache)
+    self.assertEqual(info['pi_cache'], 'hit')
+    params.precision = 100
+    tour, info = lkh.solver.lkh_solver(problem_file, params, pi_cache=pi_cache)
+    self.assertEqual(info['pi_cache'], 'miss')
+    self.assertEqual(pi_cache.stats()['entries'], 2)
+    # Parameters read by the ascent
+    key = pi_cache.key(problem_file, params)
+    for name, value in [('max_candidates', 0), ('extra_candidates', 5),
+                        ('optimum', 7542)]:
+      other = copy.copy(params)
+      setattr(other, name, value)
+      self.assertNotEqual(pi_cache.key(problem_file, other), key)
+    # A size bound smaller than any entry evicts them all
+    pi_cache.max_size = 1
+    pi_cache.evict()
+    self.assertEqual(pi_cache.stats()['entries'], 0)
+    shutil.rmtree(cache_path)
+
+  def test_CandidateCache(self):
+    folder = 'package://lkh_solver/tsplib'
+    path = resource_retriever.get_filename(folder, use_protocol=False)
+    problem_file = os.path.join(path, 'eil51.tsp')
+    cache_path = tempfile.mkdtemp()
+    pi_cache = lkh.cache.PenaltyCache(os.path.join(cache_path, 'pi'))
+    candidate_cache = lkh.cache.CandidateCache(os.path.join(cache_path, 'cand'))
+    params = lkh.solver.SolverParameters()
+    params.trace_level = 0
+    tour, info = lkh.solver.lkh_solver(problem_file, params, pi_cache=pi_cache,
+                                      candidate_cache=candidate_cache)
+    self.assertEqual(info['candidate_cache'], 'miss')
+    cost = info['cost']
+    tour, info = lkh.solver.lkh_solver(problem_file, params, pi_cache=pi_cache,
+                                      candidate_cache=candidate_cache)
+    self.assertEqual(info['candidate_cache'], 'hit')
+    self.assertEqual(info['cost'], cost)
+    self.assertEqual(candidate_cache.stats()['hits'], 1)
+    params.max_candidates = 4
+    key = candidate_cache.key(problem_file, params)
+    tour, info = lkh.solver.lkh_solver(problem_file, params, pi_cache=pi_cache,
+                                      candidate_cache=candidate_cache)
+    self.assertEqual(info['candidate_cache'], 'miss')
+    self.assertTrue(candidate_cache.remove(key))
+    self.assertEqual(candidate_cache.stats()['entries'], 1)
+    # The optimum bounds the alpha-values of the candidates
+    params = lkh.solver.SolverParameters()
+    params.trace_level = 0
+    params.optimum = 426
+    tour, info = lkh.solver.lkh_solver(problem_file, params, pi_cache=pi_cache,
+                                      candidate_cache=candidate_cache)
+    self.assertEqual(info['candidate_cache'], 'miss')
+    shutil.rmtree(cache_path)
+
+  def test_ResultCache(self):
+    folder = 'package://lkh_solver/tsplib'
+    path = resource_retriever.get_filename(folder, use_protocol=False)
+    problem_file = os.path.join(path, 'berlin52.tsp')
+    cache_path = tempfile.mkdtemp()
+    result_cache = lkh.cache.ResultCache(cache_path)
+    params = lkh.solver.SolverParameters()
+    params.trace_level = 0
+    tour, info = lkh.solver.lkh_solver(problem_file, params,
+                                        result_cache=result_cache)
+    self.assertEqual(info['result_cache'], 'miss')
+    cached_tour, cached_info = lkh.solver.lkh_solver(problem_file, params,
+                                                  result_cache=result_cache)
+    self.assertEqual(cached_info['result_cache'], 'hit')
+    self.assertEqual(cached_info['cost'], info['cost'])
+    self.assertEqual(set(info) - set(cached_info), set())
+    np.testing.assert_array_equal(cached_tour[0], tour[0])
+    self.assertEqual(result_cache.stats()['memory_hits'], 1)
+    # The on-disk tier is shared with other instances (or processes)
+    other_cache = lkh.cache.ResultCache(cache_path)
+    _, cached_info = lkh.solver.lkh_solver(problem_file, params,
+                                                  result_cache=other_cache)
+    self.assertEqual(cached_info['result_cache'], 'hit')
+    params.seed = 2
+    _, info = lkh.solver.lkh_solver(problem_file, params,
+                                                  result_cache=result_cache)
+    self.assertEqual(info['result_cache'], 'miss')
+    # The solver writes a missing pi_file, it is not skipped
+    pi_file = os.path.join(cache_path, 'berlin52.pi')
+    _, info = lkh.solver.lkh_solver(problem_file, params, pi_file=pi_file,
+                                                  result_cache=result_cache)
+    self.assertNotIn('result_cache', info)
+    self.assertTrue(os.path.isfile(pi_file))
+    # Through the helpers that write the problem file
+    np.random.seed(1)
+    weights = np.random.randint(1, 100, (20, 20))
+    for status in ('miss', 'hit'):
+      tour, info = lkh.solver.solve_matrix(weights, params,
+                                                  result_cache=result_cache)
+      self.assertEqual(info['result_cache'], status)
+    # Expired results are discarded
+    result_cache.ttl = 0.
+    _, info = lkh.solver.lkh_solver(problem_file, params,
+                                                  result_cache=result_cache)
+    self.assertEqual(info['result_cache'], 'miss')
+    shutil.rmtree(cache_path)
+
+  def test_SolverLibrary(self):
+    folder = 'package://lkh_solver/tsplib'
+    path = resource_retriever.get_filename(folder, use_protocol=False)
+    problem_file = os.path.join(path, 'berlin52.tsp')
+    library = lkh.library.SolverLibrary('lkh')
+    params = lkh.solver.SolverParameters()
+    params.trace_level = 0
+    for i in range(2):
+      tour, info = library.solve(params, problem_file=problem_file)
+      np.testing.assert_array_equal(np.sort(tour), np.arange(52))
+      self.assertEqual(info['cost'], 7542)
+
+  def test_Session(self):
+    folder = 'package://lkh_solver/tsplib'
+    path = resource_retriever.get_filename(folder, use_protocol=False)
+    problem_file = os.path.join(path, 'berlin52.tsp')
+    library = lkh.library.SolverLibrary('lkh')
+    params = lkh.solver.SolverParameters()
+    params.trace_level = 0
+    params.max_trials = 10
+    with library.session(params, problem_file=problem_file) as session:
+      for seed in (1, 2):
+        params.seed = seed
+        expected, _ = library.solve(params, problem_file=problem_file)
+        tour, info = session.solve(params)
+        # The other solve displaced the problem, therefore it was reloaded
+        self.assertTrue(info['reloaded'])
+        np.testing.assert_array_equal(tour, expected)
+        tour, info = session.solve(params)
+        self.assertFalse(info['reloaded'])
+        np.testing.assert_array_equal(tour, expected)
+      params.max_candidates = 5
+      self.assertRaises(ValueError, session.solve, params)
+    params.max_candidates = lkh.solver.SolverParameters.max_candidates
+    results = lkh.library.solve_sweep([params, params],
+                                      problem_file=problem_file, workers=2)
+    self.assertEqual(len(results), 2)
+    np.testing.assert_array_equal(results[0][0], results[1][0])
+
+  def test_solve_coords(self):
+    np.random.seed(1)
+    coords = 1000*np.random.rand(20, 2)
+    params = lkh.solver.SolverParameters()
+    params.trace_level = 0
+    tour, info = lkh.solver.solve_coords(coords, params)
+    np.testing.assert_array_equal(np.sort(tour), np.arange(20))
+    weights = np.linalg.norm(coords[:,np.newaxis] - coords, axis=2)
+    tour, info = lkh.solver.solve_matrix(weights, params)
+    np.testing.assert_array_equal(np.sort(tour), np.arange(20))
+
+  def test_solve_many(self):
+    folder = 'package://lkh_solver/tsplib'
+    path = resource_retriever.get_filename(folder, use_protocol=False)
+    files = [os.path.join(path, name) for name in sorted(os.listdir(path))
+                                                    if name.endswith('.tsp')]
+    params = lkh.solver.SolverParameters()
+    params.trace_level = 0
+    stats = dict()
+    indices = []
+    for index, tour, info in lkh.solver.solve_many(files, params, workers=2,
+                                                                stats=stats):
+      self.assertIsNotNone(tour)
+      indices.append(index)
+    self.assertEqual(sorted(indices), list(range(len(files))))
+    self.assertEqual(stats['jobs'], len(files))
+
+  def test_solve_multistart(self):
+    folder = 'package://lkh_solver/tsplib'
+    path = resource_retriever.get_filename(folder, use_protocol=False)
+    problem_file = os.path.join(path, 'berlin52.tsp')
+    params = lkh.solver.SolverParameters()
+    params.runs = 4
+    params.trace_level = 0
+    tour, info = lkh.solver.solve_multistart(problem_file, params, workers=2,
+                                                                    merge=True)
+    self.assertEqual(len(tour[0]), 52)
+    self.assertEqual(info['seeds'], [params.seed, params.seed+2])
+    self.assertEqual(info['cost'], min(info['costs']+[info['merge_cost']]))
+
+  def test_solve_decomposed(self):
+    np.random.seed(1)
+    coords = np.random.randint(0, 1000, (300, 2))
+    params = lkh.solver.SolverParameters.preset('fast', 100)
+    params.trace_level = 0
+    for partitioning in ['hilbert', 'k-means']:
+      tour, info = lkh.solver.solve_decomposed(coords, params,
+                    subproblem_size=100, partitioning=partitioning, workers=2)
+      self.assertEqual(sorted(tour), list(range(300)))
+      self.assertEqual(len(info['costs']), 3)
+      self.assertTrue(np.all(np.diff(info['costs']) <= 0))
+
+  def test_resolve(self):
+    np.random.seed(1)
+    coords = np.random.rand(60, 2) * 1000
+    params = lkh.solver.SolverParameters()
+    params.trace_level = 0
+    tour, info = lkh.solver.resolve(None, params, coords=coords)
+    self.assertFalse(info['warm_start'])
+    # Remove two nodes and add two new ones
+    ids = list(range(2, 62))
+    new_coords = np.vstack((coords[2:], np.random.rand(2, 2) * 1000))
+    tour, info = lkh.solver.resolve(tour, params, coords=new_coords, ids=ids,
+                  pi_file=info['pi_file'], candidate_file=info['candidate_file'])
+    self.assertTrue(info['warm_start'])
+    self.assertEqual(sorted(tour.tolist()), list(range(60)))
 
   def test_SolverParameters(self):
     params = lkh.solver.SolverParameters()
@@ -39,3 +466,21 @@ class Test_lkh_solver_Modules(unittest.TestCase):
     params.seed = 1
     params.trace_level = 1
     self.assertRaises(TypeError, setattr, args=(params, 123, 'non_existent'))
+
+  def test_SolverParameters_keywords(self):
+    params = lkh.solver.SolverParameters()
+    params.subproblem_size = 1000
+    params.subproblem_partitioning = 'KARP'
+    params.subproblem_borders = True
+    params.time_limit = 2.5
+    keywords = dict(params.keywords())
+    self.assertEqual(keywords['SUBPROBLEM_SIZE'], '1000 KARP BORDERS')
+    self.assertEqual(keywords['TIME_LIMIT'], '2.5')
+    self.assertNotIn('OPTIMUM', keywords)
+    params.candidate_set_type = 'POPMUSIC'
+    self.assertRaises(ValueError, params.validate)
+    for name in ['fast', 'balanced', 'large-instance']:
+      params = lkh.solver.SolverParameters.preset(name, dimension=100000)
+      self.assertTrue(params.initialized())
+      self.assertEqual(params.candidate_set_type, 'DELAUNAY')
+    self.assertRaises(ValueError, lkh.solver.SolverParameters.preset, 'slow')